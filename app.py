@@ -1,21 +1,60 @@
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 load_dotenv()
 
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.2,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# The LLM client is created lazily and shared process-wide by src.agents.get_llm(),
+# so Streamlit reruns of this script don't rebuild it.
 
 import streamlit as st
+import threading
 import time
+from collections import deque
 
 from data.customer import personas
-from src.agents import behavior_analysis_agent, decision_agent
-from src.simulation import simulate_user_behavior, evaluate_agent_action
+from src.day_worker import DayWorker, simulate_day
 from src.memory_store import StrategyMemory
+from src.durable_memory import DurableStrategyMemory
+from src.decision_cache import DecisionCache
+from src.story_store import SidebarSummary, StoryStore
+from src.scheduler import DecisionScheduler
+from src.day_engine import DayEngine
+from src.history import HISTORY_WINDOW, HistoryArchive, bound_history
+from src import metrics
+
+# Concurrent decision calls per day and per-call timeout (seconds)
+DECISION_CONCURRENCY = int(os.getenv("DECISION_CONCURRENCY", "8"))
+DECISION_TIMEOUT = float(os.getenv("DECISION_TIMEOUT", "30"))
+# Directory for durable strategy memory (empty = in-memory only, lost on restart)
+MEMORY_DIR = os.getenv("MEMORY_DIR", "")
+# Per-customer history window, and optional file for events that fall out of it
+HISTORY_WINDOW_SIZE = int(os.getenv("HISTORY_WINDOW", str(HISTORY_WINDOW)))
+HISTORY_ARCHIVE = os.getenv("HISTORY_ARCHIVE", "")
+# Root seed for per-customer random streams (empty = unseeded global random)
+SIMULATION_SEED = os.getenv("SIMULATION_SEED", "")
+# Directory for the columnar event log (empty = off); one Parquet part per session and day
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "")
+# Customers packed into one LLM request (1 = one request per customer)
+DECISION_BATCH_SIZE = int(os.getenv("DECISION_BATCH_SIZE", "1"))
+# Stage metrics (METRICS_ENABLED=1): Prometheus text on METRICS_PORT and/or METRICS_FILE
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+# Stories kept in memory, optional directory to spill every story to (for older pages), page size
+STORY_LOG_CAPACITY = int(os.getenv("STORY_LOG_CAPACITY", "500"))
+STORY_SPILL_DIR = os.getenv("STORY_SPILL_DIR", "")
+STORY_PAGE_SIZE = int(os.getenv("STORY_PAGE_SIZE", "5"))
+MEMORY_UPDATES_KEPT = 50
+# Run days on a background thread (the page stays responsive and can cancel);
+# customers are decided in chunks of DAY_CHUNK_SIZE, progress polled every DAY_POLL_SECONDS
+BACKGROUND_DAYS = os.getenv("BACKGROUND_DAYS", "0") == "1"
+DAY_CHUNK_SIZE = int(os.getenv("DAY_CHUNK_SIZE", str(DECISION_CONCURRENCY * DECISION_BATCH_SIZE)))
+DAY_POLL_SECONDS = float(os.getenv("DAY_POLL_SECONDS", "0.5"))
+# Daily LLM budget (0 = unlimited): only the most urgent customers get an LLM
+# decision, the rest the rules-only policy
+DAILY_LLM_CALLS = int(os.getenv("DAILY_LLM_CALLS", "0"))
+DAILY_LLM_TOKENS = int(os.getenv("DAILY_LLM_TOKENS", "0"))
+if METRICS_PORT:
+    metrics.enable()
+    metrics.serve(METRICS_PORT)
 
 # ─────────────────────────────────────────────
 # STREAMLIT CONFIG
@@ -98,20 +137,47 @@ st.markdown("""
 # ─────────────────────────────────────────────
 # SESSION STATE INIT
 # ─────────────────────────────────────────────
+def new_story_state():
+    """Fresh bounded story log, learning-update feed and sidebar aggregates."""
+    if "story_log" in st.session_state:
+        st.session_state.story_log.close()
+    spill = os.path.join(STORY_SPILL_DIR, f"stories-{st.session_state.session_id}.jsonl") if STORY_SPILL_DIR else None
+    st.session_state.story_log = StoryStore(STORY_LOG_CAPACITY, spill)
+    st.session_state.memory_updates = deque(maxlen=MEMORY_UPDATES_KEPT)
+    st.session_state.sidebar_summary = SidebarSummary(st.session_state.memory)
+    st.session_state.memory.add_listener(st.session_state.sidebar_summary)
+
 if "customers" not in st.session_state:
-    st.session_state.customers = personas
+    archive = HistoryArchive(HISTORY_ARCHIVE) if HISTORY_ARCHIVE else None
+    st.session_state.customers = [bound_history(c, HISTORY_WINDOW_SIZE, archive) for c in personas]
 
 if "memory" not in st.session_state:
-    st.session_state.memory = StrategyMemory()
+    st.session_state.memory = DurableStrategyMemory(MEMORY_DIR) if MEMORY_DIR else StrategyMemory()
 
-if "story_log" not in st.session_state:
-    st.session_state.story_log = []
+if "decision_cache" not in st.session_state:
+    st.session_state.decision_cache = DecisionCache()
+    st.session_state.memory.add_listener(st.session_state.decision_cache)
+
+if "scheduler" not in st.session_state:
+    st.session_state.scheduler = DecisionScheduler(st.session_state.customers, DAILY_LLM_CALLS, DAILY_LLM_TOKENS)
+
+if "day_engine" not in st.session_state:
+    st.session_state.day_engine = DayEngine(st.session_state.customers)
 
 if "day_count" not in st.session_state:
     st.session_state.day_count = 0
 
-if "memory_updates" not in st.session_state:
-    st.session_state.memory_updates = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = time.time_ns()  # Event log part name
+
+if "story_log" not in st.session_state:
+    new_story_state()
+
+if "day_worker" not in st.session_state:
+    st.session_state.day_worker = None  # Running DayWorker, if any
+    st.session_state.day_progress = (0, 0)
+    st.session_state.day_result = None  # Last finished background day, shown once
+    st.session_state.state_lock = threading.Lock()  # Worker mutations vs. page reads
 
 # ─────────────────────────────────────────────
 # HELPER FUNCTIONS
@@ -139,97 +205,188 @@ def get_impact_color(impact):
         return ":red"
     return ":gray"
 
-def count_personas_evaluated(memory):
-    """Count unique persona types that have been evaluated"""
-    evaluated_personas = set()
-    for key in memory.registry.keys():
-        # Extract persona from key like "Onboarding_Sam"
-        persona = key.split('_')[-1]
-        evaluated_personas.add(persona)
-    return len(evaluated_personas)
+def format_strategy(action, stats):
+    """Sidebar line for one learned action: ✅ while it has never failed."""
+    status_icon = "✅" if stats["FAILED"] == 0 else "❌"
+    return f"{status_icon} {get_action_icon(action)} `{action}` → S:{stats['SUCCESS']}, F:{stats['FAILED']}"
 
-# ─────────────────────────────────────────────
-# SIDEBAR: LEARNING LEDGER & STATS
-# ─────────────────────────────────────────────
-with st.sidebar:
-    st.markdown("## 🧠 Agent Learning Ledger")
-    st.markdown("---")
+def render_story(story):
+    """One decision story card."""
+    customer = story["customer"]
+    thought = story["thought"]
+    action = story["action"]
+    impact = story["impact"]
+    status = customer.get("status", "Active")
     
-    # Day Counter
-    st.metric("📅 Day", st.session_state.day_count)
-    
-    # Learning Status (Dynamic)
-    personas_evaluated = count_personas_evaluated(st.session_state.memory)
-    total_registry_entries = sum(len(strategies) for strategies in st.session_state.memory.registry.values())
-    
-    if st.session_state.day_count == 0:
-        st.info("🔍 **Agent is exploring...**\n\nNo simulation run yet. The agent hasn't learned any patterns.")
-    elif personas_evaluated < 5:
-        st.warning(f"🔍 **Agent is exploring...**\n\nEvaluated {personas_evaluated}/5+ persona types. Learning in progress.")
+    # Determine card class based on impact and status
+    if status == "Churned":
+        card_class = "story-card-danger"
+    elif impact > 0:
+        card_class = "story-card-success"
+    elif impact < 0:
+        card_class = "story-card-warning"
     else:
-        st.success(f"✅ **Agent has learned!**\n\nEvaluated {personas_evaluated} persona types with {total_registry_entries} strategy memories.")
+        card_class = "story-card-neutral"
     
-    st.markdown("---")
+    action_icon = get_action_icon(action)
+    impact_text = format_impact(impact)
     
-    # Learning Registry (Show action results per persona)
-    if st.session_state.memory.registry:
-        st.markdown("### 🎓 Strategy Memory by Persona")
-        for key, strategies in st.session_state.memory.registry.items():
-            # Format: "Onboarding_Sam" -> "Sam (Onboarding)"
-            parts = key.split('_', 1)
-            if len(parts) == 2:
-                persona_name = parts[1]
-                lifecycle_stage = parts[0]
-                st.markdown(f"**{persona_name}** ({lifecycle_stage})")
-            else:
-                st.markdown(f"**{key}**")
-            
-            for action, status in strategies.items():
-                status_icon = "✅" if status == "SUCCESS" else "❌"
-                action_icon = get_action_icon(action)
-                st.markdown(f"  {status_icon} {action_icon} `{action}` → {status}")
-            st.markdown("")
-    else:
-        st.info("🎓 No learning entries yet.")
-    
-    st.markdown("---")
+    # Build story card HTML (all in one block to avoid HTML display)
+    status_badge = "💀" if status == "Churned" else "✅"
+    impact_color_class = get_impact_color(impact).replace(":", "")
     
-    # Recent Memory Updates (Last 5)
-    if st.session_state.memory_updates:
-        st.markdown("### 🔔 Recent Learning Updates")
-        for update in st.session_state.memory_updates[-5:]:
-            with st.container():
-                st.markdown(f"""
-                <div class="memory-update-dialog">
-                    <strong style="color: #1a1a1a;">{update['status_icon']} {update['action']}</strong><br>
-                    <small style="color: #555555;">{update['message']}</small>
+    card_html = f'''
+    <div class="{card_class}" style="margin: 1.5rem 0;">
+        <div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 1rem;">
+            <div>
+                <h3 style="margin: 0; color: #333;">{status_badge} {customer['name']}</h3>
+                <p style="margin: 0.3rem 0; color: #666; font-size: 0.9rem;">{customer.get('persona', '')}</p>
+            </div>
+            <div style="text-align: right;">
+                <div style="font-size: 1.1rem; font-weight: bold; color: #333;">{customer.get('engagement_score', 0)}/100</div>
+                <div style="width: 100px; height: 8px; background: rgba(0,0,0,0.1); border-radius: 4px; margin-top: 0.3rem;">
+                    <div style="width: {customer.get('engagement_score', 0)}%; height: 100%; background: #4caf50; border-radius: 4px;"></div>
                 </div>
-                """, unsafe_allow_html=True)
-    else:
-        st.markdown("### 🔔 Recent Learning Updates")
-        st.caption("No learning updates yet. Run simulation to see agent learning.")
+            </div>
+        </div>
+        
+        
+                🧠 Agent Thought:
+                {thought}
+
+            
+                {action_icon} Action Taken:
+                {action}
+            
+            
+               📊 Impact:
+                {impact_text} engagement
+               
+        
+        {f'<div style="background: rgba(220,53,69,0.1); padding: 0.8rem; border-radius: 6px; margin-top: 1rem; text-align: center; border: 1px solid rgba(220,53,69,0.3);"><strong style="color: #dc3545;">💀 CUSTOMER CHURNED</strong></div>' if status == "Churned" else ''}
+    </div>
+    '''
     
+    st.markdown(card_html, unsafe_allow_html=True)
+
+def day_config():
+    return {
+        "concurrency": DECISION_CONCURRENCY,
+        "timeout": DECISION_TIMEOUT,
+        "batch_size": DECISION_BATCH_SIZE,
+        "seed": int(SIMULATION_SEED) if SIMULATION_SEED else None,
+        "event_log_dir": EVENT_LOG_DIR,
+        "session_id": st.session_state.session_id,
+    }
+
+def quiet_note():
+    """Mentions the customers the last day advanced in bulk (no story cards)."""
+    quiet = st.session_state.day_engine.last_quiet
+    return f" {quiet} quiescent customers were advanced in bulk (no story cards)." if quiet else ""
+
+def stop_day_worker():
+    """Cancel a running background day and wait for it to stop."""
+    worker = st.session_state.day_worker
+    if worker is not None:
+        worker.cancel()
+        worker.join()
+        st.session_state.day_worker = None
+
+# ─────────────────────────────────────────────
+# SIDEBAR: LEARNING LEDGER & STATS
+# ─────────────────────────────────────────────
+with st.sidebar:
+    st.markdown("## 🧠 Agent Learning Ledger")
     st.markdown("---")
     
-    # Customer Status Summary
-    st.markdown("### 👥 Customer Status")
-    active_count = sum(1 for c in st.session_state.customers if c.get("status") == "Active")
-    churned_count = sum(1 for c in st.session_state.customers if c.get("status") == "Churned")
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        st.metric("✅ Active", active_count)
-    with col2:
-        st.metric("💀 Churned", churned_count)
+    # Read under the lock: a background day may be updating memory / customers
+    with st.session_state.state_lock:
+        # Day Counter
+        st.metric("📅 Day", st.session_state.day_count)
+        
+        # Learning Status (Dynamic) — aggregates maintained incrementally
+        summary = st.session_state.sidebar_summary
+        registry_lines = summary.registry_lines(format_strategy)
+        personas_evaluated = len(summary.personas)
+        total_registry_entries = summary.entries
+        
+        if st.session_state.day_count == 0:
+            st.info("🔍 **Agent is exploring...**\n\nNo simulation run yet. The agent hasn't learned any patterns.")
+        elif personas_evaluated < 5:
+            st.warning(f"🔍 **Agent is exploring...**\n\nEvaluated {personas_evaluated}/5+ persona types. Learning in progress.")
+        else:
+            st.success(f"✅ **Agent has learned!**\n\nEvaluated {personas_evaluated} persona types with {total_registry_entries} strategy memories.")
+        
+        st.markdown("---")
+        
+        # Learning Registry (Show action results per persona)
+        if registry_lines:
+            st.markdown("### 🎓 Strategy Memory by Persona")
+            for header, lines in registry_lines.values():
+                # One element per persona: "Sam (Onboarding)" + its action lines
+                st.markdown("  \n".join([header] + lines))
+        else:
+            st.info("🎓 No learning entries yet.")
+        
+        st.markdown("---")
+        
+        # Recent Memory Updates (Last 5)
+        if st.session_state.memory_updates:
+            st.markdown("### 🔔 Recent Learning Updates")
+            for update in list(st.session_state.memory_updates)[-5:]:
+                with st.container():
+                    st.markdown(f"""
+                    <div class="memory-update-dialog">
+                        <strong style="color: #1a1a1a;">{update['status_icon']} {update['action']}</strong><br>
+                        <small style="color: #555555;">{update['message']}</small>
+                    </div>
+                    """, unsafe_allow_html=True)
+        else:
+            st.markdown("### 🔔 Recent Learning Updates")
+            st.caption("No learning updates yet. Run simulation to see agent learning.")
+        
+        st.markdown("---")
+        
+        # Customer Status Summary
+        st.markdown("### 👥 Customer Status")
+        active_count = len(st.session_state.day_engine.active)
+        churned_count = len(st.session_state.day_engine.churned)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("✅ Active", active_count)
+        with col2:
+            st.metric("💀 Churned", churned_count)
+        
+        cache_stats = st.session_state.decision_cache.stats()
+        st.caption(
+            f"⚡ Decision cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%})"
+        )
+        
+    st.markdown("---")
+    st.toggle("🧵 Run days in background", value=BACKGROUND_DAYS, key="background_days",
+              help="Keep the page responsive while the agent decides; results stream in and the day can be cancelled.")
     
     # Reset Button
-    st.markdown("---")
     if st.button("🔄 Reset Simulation", use_container_width=True):
-        st.session_state.customers = personas
-        st.session_state.memory = StrategyMemory()
-        st.session_state.story_log = []
+        stop_day_worker()
+        archive = HistoryArchive(HISTORY_ARCHIVE) if HISTORY_ARCHIVE else None
+        st.session_state.customers = [bound_history(c, HISTORY_WINDOW_SIZE, archive) for c in personas]
+        if MEMORY_DIR:
+            st.session_state.memory.registry = {}  # Logged, so the reset survives restarts too
+            st.session_state.memory.listeners.clear()
+        else:
+            st.session_state.memory = StrategyMemory()
+        st.session_state.decision_cache = DecisionCache()
+        st.session_state.memory.add_listener(st.session_state.decision_cache)
+        st.session_state.scheduler = DecisionScheduler(st.session_state.customers, DAILY_LLM_CALLS, DAILY_LLM_TOKENS)
+        st.session_state.day_engine = DayEngine(st.session_state.customers)
         st.session_state.day_count = 0
-        st.session_state.memory_updates = []
+        st.session_state.session_id = time.time_ns()
+        new_story_state()
+        st.session_state.day_progress = (0, 0)
+        st.session_state.day_result = None
         st.rerun()
 
 # ─────────────────────────────────────────────
@@ -246,146 +403,121 @@ st.markdown("---")
 # ─────────────────────────────────────────────
 # BIG ACTION BUTTON (CLEAR AUTONOMY STEP)
 # ─────────────────────────────────────────────
+@st.fragment(run_every=DAY_POLL_SECONDS)
+def day_progress():
+    """Polls the background day: drains its queue, shows progress and partial stories."""
+    worker = st.session_state.day_worker
+    if worker is None:
+        return
+    finished = None
+    for message in worker.drain():
+        if message[0] == "story":
+            st.session_state.story_log.append(message[1])
+            if message[2] is not None:
+                st.session_state.memory_updates.append(message[2])
+        elif message[0] == "progress":
+            st.session_state.day_progress = message[1:]
+        else:
+            finished = message
+    
+    if finished is not None:
+        worker.join()
+        st.session_state.day_worker = None
+        st.session_state.day_result = (worker.day,) + finished
+        if METRICS_FILE:
+            metrics.write_file(METRICS_FILE)
+        st.rerun()  # Full rerun: sidebar and stories pick up the finished day
+    
+    done, total = st.session_state.day_progress
+    if worker.cancel_event.is_set():
+        st.progress(done / total if total else 1.0, text=f"⏹️ Cancelling day {worker.day} after the current customers...")
+    else:
+        st.progress(done / total if total else 1.0, text=f"🧠 Day {worker.day}: {done}/{total} customers decided")
+        if st.button("⏹️ Cancel", use_container_width=True):
+            worker.cancel()  # Takes effect before the next chunk; shown on the next poll
+    
+    for story in st.session_state.story_log.latest(min(done, STORY_PAGE_SIZE)):
+        render_story(story)
+
 col_btn1, col_btn2, col_btn3 = st.columns([1, 2, 1])
 with col_btn2:
-    if st.button("▶️ **Run Next Day Simulation**", use_container_width=True, type="primary"):
+    running = st.session_state.day_worker is not None
+    if st.button("▶️ **Run Next Day Simulation**", use_container_width=True, type="primary", disabled=running):
         st.session_state.day_count += 1
+        
+        if st.session_state.background_days:
+            # Decide off the script thread; day_progress() polls for results
+            st.session_state.day_progress = (0, 0)
+            st.session_state.day_worker = DayWorker(
+                st.session_state.customers,
+                st.session_state.memory,
+                st.session_state.day_count,
+                day_config(),
+                cache=st.session_state.decision_cache,
+                chunk_size=DAY_CHUNK_SIZE,
+                lock=st.session_state.state_lock,
+                scheduler=st.session_state.scheduler,
+                engine=st.session_state.day_engine
+            ).start()
+            st.rerun()
+        
         daily_stories = []
         day_memory_updates = []
-        
         with st.spinner("🧠 Agent is thinking and making decisions..."):
-            # Track learning logs before
-            learning_logs_before = len(st.session_state.memory.learning_logs)
-            
-            for customer in st.session_state.customers:
-                
-                # Skip churned customers
-                if customer.get("status") == "Churned":
-                    continue
-                
-                # 1. ENVIRONMENT: Simulate behavior
-                behavior_log = simulate_user_behavior(customer)
-                
-                # 2. OBSERVE
-                _ = behavior_analysis_agent(customer)
-                
-                # 3. DECIDE (returns dict with thought + action)
-                decision = decision_agent(customer, st.session_state.memory)
-                action = decision.get("action")
-                thought = decision.get("thought", "No reasoning provided.")
-                
-                # 4. ACT + EVALUATE
-                impact = evaluate_agent_action(
-                    customer,
-                    action,
-                    st.session_state.memory
-                )
-                
-                # 5. Track memory updates (check if new learning log was added)
-                if action != "DO_NOTHING" and len(st.session_state.memory.learning_logs) > learning_logs_before:
-                    # New learning occurred - get the latest log entry
-                    latest_log = st.session_state.memory.learning_logs[-1]
-                    # Format: "Learned: SEND_DISCOUNT was a SUCCESS for Onboarding_Sam"
-                    if "SUCCESS" in latest_log:
-                        status_icon = "✅"
-                        status = "SUCCESS"
-                    else:
-                        status_icon = "❌"
-                        status = "FAILED"
-                    
-                    update_msg = latest_log.replace("Learned: ", "")
-                    day_memory_updates.append({
-                        "status_icon": status_icon,
-                        "action": action,
-                        "message": update_msg
-                    })
-                    learning_logs_before = len(st.session_state.memory.learning_logs)
-                
-                # 6. BUILD STORY
-                daily_stories.append({
-                    "customer": customer.copy(),  # Copy to preserve state at decision time
-                    "thought": thought,
-                    "action": action,
-                    "impact": impact,
-                    "behavior": behavior_log
-                })
+            for story, update in simulate_day(
+                st.session_state.customers,
+                st.session_state.memory,
+                st.session_state.day_count,
+                day_config(),
+                cache=st.session_state.decision_cache,
+                scheduler=st.session_state.scheduler,
+                engine=st.session_state.day_engine
+            ):
+                daily_stories.append(story)
+                if update is not None:
+                    day_memory_updates.append(update)
         
         # Add to story log and memory updates
         st.session_state.story_log.extend(daily_stories)
         st.session_state.memory_updates.extend(day_memory_updates)
         
+        if METRICS_FILE:
+            metrics.write_file(METRICS_FILE)
+        
         # Show success message
-        st.success(f"✨ Day {st.session_state.day_count} completed! {len(daily_stories)} decisions made.")
+        st.success(f"✨ Day {st.session_state.day_count} completed! "
+                   f"{len(daily_stories) + st.session_state.day_engine.last_quiet} decisions made.{quiet_note()}")
+    
+    if running:
+        day_progress()
+    elif st.session_state.day_result is not None:
+        day, outcome, detail = st.session_state.day_result
+        st.session_state.day_result = None
+        if outcome == "done":
+            st.success(f"✨ Day {day} completed! {detail} decisions made.{quiet_note()}")
+        elif outcome == "cancelled":
+            st.warning(f"⏹️ Day {day} cancelled after {detail} decisions.")
+        else:
+            st.error(f"Day {day} failed: {detail}")
 
 st.markdown("---")
 
 # ─────────────────────────────────────────────
 # STORY TELLING UI: Show Recent Stories (No HTML code displayed)
 # ─────────────────────────────────────────────
-if st.session_state.story_log:
+# (while a background day runs, its stories stream in under the button instead)
+if st.session_state.story_log and st.session_state.day_worker is None:
     st.markdown("### 📖 Agent Decision Stories")
     
-    # Show latest day's stories (or all if less than 5)
-    recent_stories = st.session_state.story_log[-5:] if len(st.session_state.story_log) > 5 else st.session_state.story_log
+    # Newest page first; older pages come from memory or the spill file
+    pages = st.session_state.story_log.pages(STORY_PAGE_SIZE)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (1 = latest, of {pages})", min_value=1, max_value=pages, value=1, step=1)
     
-    for story in recent_stories:
-        customer = story["customer"]
-        thought = story["thought"]
-        action = story["action"]
-        impact = story["impact"]
-        status = customer.get("status", "Active")
-        
-        # Determine card class based on impact and status
-        if status == "Churned":
-            card_class = "story-card-danger"
-        elif impact > 0:
-            card_class = "story-card-success"
-        elif impact < 0:
-            card_class = "story-card-warning"
-        else:
-            card_class = "story-card-neutral"
-        
-        action_icon = get_action_icon(action)
-        impact_text = format_impact(impact)
-        
-        # Build story card HTML (all in one block to avoid HTML display)
-        status_badge = "💀" if status == "Churned" else "✅"
-        impact_color_class = get_impact_color(impact).replace(":", "")
-        
-        card_html = f'''
-        <div class="{card_class}" style="margin: 1.5rem 0;">
-            <div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 1rem;">
-                <div>
-                    <h3 style="margin: 0; color: #333;">{status_badge} {customer['name']}</h3>
-                    <p style="margin: 0.3rem 0; color: #666; font-size: 0.9rem;">{customer.get('persona', '')}</p>
-                </div>
-                <div style="text-align: right;">
-                    <div style="font-size: 1.1rem; font-weight: bold; color: #333;">{customer.get('engagement_score', 0)}/100</div>
-                    <div style="width: 100px; height: 8px; background: rgba(0,0,0,0.1); border-radius: 4px; margin-top: 0.3rem;">
-                        <div style="width: {customer.get('engagement_score', 0)}%; height: 100%; background: #4caf50; border-radius: 4px;"></div>
-                    </div>
-                </div>
-            </div>
-            
-            
-                    🧠 Agent Thought:
-                    {thought}
-
-                
-                    {action_icon} Action Taken:
-                    {action}
-                
-                
-                   📊 Impact:
-                    {impact_text} engagement
-                   
-            
-            {f'<div style="background: rgba(220,53,69,0.1); padding: 0.8rem; border-radius: 6px; margin-top: 1rem; text-align: center; border: 1px solid rgba(220,53,69,0.3);"><strong style="color: #dc3545;">💀 CUSTOMER CHURNED</strong></div>' if status == "Churned" else ''}
-        </div>
-        '''
-        
-        st.markdown(card_html, unsafe_allow_html=True)
-else:
+    for story in st.session_state.story_log.page(page - 1, STORY_PAGE_SIZE):
+        render_story(story)
+elif st.session_state.day_worker is None:
     st.info("👈 Click 'Run Next Day Simulation' to start the agent's autonomous decision-making journey!")
 
 # ─────────────────────────────────────────────
@@ -0,0 +1,214 @@
+"""
+Offline benchmark suite for the OODA loop.
+
+Measures throughput and per-item latency of each stage:
+simulate_time_step, behavior_analysis_agent, decision_agent (stub LLM
+with configurable latency), evaluate_outcome and StrategyMemory
+operations, plus the vectorized Population engine, at population sizes
+from the 5 personas up to 1M synthetic customers.
+
+    python benchmark.py                              # 5, 1k, 100k, 1M
+    python benchmark.py --sizes 5 10000 --llm-latency 0.05 --out bench.json
+
+Results are printed and written as JSON (one record per stage and size)
+so runs can be compared across commits. No network access needed.
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+import numpy as np
+
+from data.customer import personas
+from src import agents
+from src.agents import behavior_analysis_agent, behavior_analysis_batch, decision_agent, decision_agent_batch
+from src.memory_store import CompactStrategyMemory, StrategyMemory
+from src.population import ACTIONS, Population
+from src.simulation import evaluate_outcome, simulate_time_step
+from src.stub_llm import StubLLM
+
+DEFAULT_SIZES = [5, 1_000, 100_000, 1_000_000]
+STAGES = ["Onboarding", "Retention", "Churn Risk", "Upsell Candidate"]
+
+
+# ─────────────────────────────────────────────
+# SYNTHETIC POPULATION
+# ─────────────────────────────────────────────
+def synthetic_customers(n, seed=0):
+    """The 5 personas for n=5, otherwise n perturbed copies of them."""
+    if n <= len(personas):
+        return copy.deepcopy(personas[:n])
+
+    rng = random.Random(seed)
+    customers = []
+    for i in range(n):
+        base = personas[i % len(personas)]
+        customers.append({
+            **base,
+            "id": f"S{i:07d}",
+            "name": f"Synthetic {base['name'].split()[-1]}{i % 1000}",
+            "engagement_score": rng.randint(0, 100),
+            "lifecycle_stage": rng.choice(STAGES),
+            "sensitivity": {"discount": rng.random(), "content": rng.random()},
+            "time_since_last_event": rng.randint(0, 15),
+            "history": list(base["history"]),
+            "action_history": [],
+        })
+    return customers
+
+
+# ─────────────────────────────────────────────
+# TIMING HELPERS
+# ─────────────────────────────────────────────
+def time_each(fn, items):
+    """Calls fn(item) for every item; returns (total seconds, per-call latencies)."""
+    latencies = []
+    clock = time.perf_counter
+    start = clock()
+    for item in items:
+        t = clock()
+        fn(item)
+        latencies.append(clock() - t)
+    return clock() - start, latencies
+
+
+def record(results, stage, size, n, total, latencies=None, **extra):
+    row = {
+        "stage": stage,
+        "population": size,
+        "items": n,
+        "total_s": round(total, 6),
+        "throughput_per_s": round(n / total, 1) if total else None,
+    }
+    if latencies:
+        ordered = sorted(latencies)
+        row["p50_us"] = round(statistics.median(ordered) * 1e6, 2)
+        row["p99_us"] = round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 2)
+    row.update(extra)
+    results.append(row)
+
+
+# ─────────────────────────────────────────────
+# STAGES
+# ─────────────────────────────────────────────
+def bench_size(size, args, results):
+    customers = synthetic_customers(size, args.seed)
+    memory = StrategyMemory()
+    random.seed(args.seed)
+
+    # Per-dict environment + observe
+    total, lat = time_each(simulate_time_step, customers)
+    record(results, "simulate_time_step", size, size, total, lat)
+
+    total, lat = time_each(behavior_analysis_agent, customers)
+    record(results, "behavior_analysis_agent", size, size, total, lat)
+
+    start = time.perf_counter()
+    behavior_analysis_batch(customers)
+    record(results, "behavior_analysis_batch", size, size, time.perf_counter() - start)
+
+    # Decide (stub LLM), on a sample so large populations finish
+    sample = customers[:min(size, args.decision_sample)]
+    stub = StubLLM(latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed)
+    agents.set_llm(stub)
+    agents._messages("")  # Warm up the lazy langchain_core import outside the timed loop
+
+    total, lat = time_each(lambda c: decision_agent(c, memory), sample)
+    record(results, "decision_agent", size, len(sample), total, lat, llm_latency_s=args.llm_latency)
+
+    start = time.perf_counter()
+    asyncio.run(decision_agent_batch(
+        [(c, memory) for c in sample], max_concurrency=args.concurrency
+    ))
+    record(results, "decision_agent_batch", size, len(sample), time.perf_counter() - start,
+           llm_latency_s=args.llm_latency, concurrency=args.concurrency)
+    agents.set_llm(None)
+
+    # Act + evaluate (with learning)
+    actions = [random.choice(ACTIONS) for _ in customers]
+    total, lat = time_each(lambda pair: evaluate_outcome(pair[0], pair[1], memory), zip(customers, actions))
+    record(results, "evaluate_outcome", size, size, total, lat)
+
+    # StrategyMemory operations
+    for backend in (StrategyMemory(), CompactStrategyMemory(keep_logs=False, verbose=False)):
+        name = type(backend).__name__
+        total, lat = time_each(lambda c: backend.update(c, random.choice(ACTIONS), "FAILED"), customers)
+        record(results, f"{name}.update", size, size, total, lat)
+        total, lat = time_each(backend.get_forbidden_actions, customers)
+        record(results, f"{name}.get_forbidden_actions", size, size, total, lat)
+        total, lat = time_each(backend.get_success_hints, customers)
+        record(results, f"{name}.get_success_hints", size, size, total, lat)
+
+    # Vectorized engine
+    start = time.perf_counter()
+    population = Population.from_customers(customers)
+    record(results, "Population.from_customers", size, size, time.perf_counter() - start)
+
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    population.time_step(rng)
+    record(results, "Population.time_step", size, size, time.perf_counter() - start)
+
+    codes = rng.integers(0, len(ACTIONS), size=size)
+    start = time.perf_counter()
+    population.apply_actions(codes)
+    record(results, "Population.apply_actions", size, size, time.perf_counter() - start)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline OODA loop benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Stub LLM seconds per call")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Extra uniform random seconds per call")
+    parser.add_argument("--decision-sample", type=int, default=2_000, help="Max customers sent to decision_agent per size")
+    parser.add_argument("--concurrency", type=int, default=64, help="decision_agent_batch concurrency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    results = []
+    # StrategyMemory.update prints every learning; keep the benchmark output readable
+    with open(os.devnull, "w") as devnull:
+        for size in args.sizes:
+            rows = []
+            with contextlib.redirect_stdout(devnull):
+                bench_size(size, args, rows)
+            results.extend(rows)
+
+            print(f"\nPopulation {size:,}")
+            for row in rows:
+                extra = f"  p50={row['p50_us']}us p99={row['p99_us']}us" if "p50_us" in row else ""
+                print(f"  {row['stage']:<44} n={row['items']:<9} {row['throughput_per_s'] or 0:>14,.0f}/s{extra}")
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
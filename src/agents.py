@@ -1,36 +1,103 @@
+import asyncio
 import os
-from dotenv import load_dotenv
-import json
 import random
-from langchain_core.messages import HumanMessage
-# Load variables from .env
-load_dotenv()
-
-# Now the agent can see the key automatically
-from langchain_openai import ChatOpenAI
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.2,
-    api_key=os.getenv("OPENAI_API_KEY")
+import threading
+import time
+
+from src import llm_router, metrics, resilience
+from src.features import customer_features, score_population
+from src.prompt_builder import action_summary, assemble, fit_context
+from src.structured_output import (
+    REPAIR_ATTEMPTS, DecodeError, batch_schema, decision_schema, decode_batch,
+    decode_decision, invoke_options, repair_prompt
 )
+
+# ─────────────────────────────────────────────
+# LLM CLIENT (lazy, process-wide)
+# ─────────────────────────────────────────────
+# Building the chat client (and importing langchain_openai) is slow, so it only
+# happens on the first real decision. The client then lives for the whole
+# process, which also means Streamlit reruns reuse it. Tests, benchmarks
+# and load tests can swap in a stub with set_llm().
+llm = None
+_llm_lock = threading.Lock()
+DEADLINE_MARGIN = 1.0  # Seconds an outer timeout waits beyond the client's deadline
+
+
+def _build_llm():
+    from dotenv import load_dotenv
+
+    # Load variables from .env
+    load_dotenv()
+    # One provider (default: OpenAI LLM_MODEL) or an LLMRouter over several
+    return llm_router.from_env()
+
+
+def get_llm():
+    """The shared LLM client, created on first use."""
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                llm = _build_llm()
+    return llm
+
+
+def set_llm(client):
+    """Replace the shared LLM client (e.g. with a stub). None resets to lazy creation."""
+    global llm
+    llm = client
+
+
+def _call_timeout(timeout):
+    """
+    Caller's per-call timeout, but at least the client's own deadline plus
+    DEADLINE_MARGIN (if it has one), so the resilience layer times the call
+    out first and its retries and circuit breaker see the failure.
+    """
+    deadline = getattr(get_llm(), "deadline", None)
+    if deadline is None:
+        return timeout
+    return max(timeout, deadline + DEADLINE_MARGIN)
+
+
+def _messages(prompt):
+    from langchain_core.messages import HumanMessage
+    return [HumanMessage(content=prompt)]
+
+
 # 1. BEHAVIOR ANALYSIS AGENT (Deterministic Logic)
 def behavior_analysis_agent(customer):
-    """Analyzes raw history to create a 'Vibe Check' for the LLM."""
-    last_3_events = customer['history'][-3:]
+    """
+    Analyzes recent behavior to create a 'Vibe Check' for the LLM.
+    Reads the customer's incremental FeatureTracker (src/features.py)
+    instead of rescanning history; "features" is that tracker (call
+    .snapshot() for a flat dict of counts, rates and flags).
+    """
+    features = customer_features(customer)
     score_change = customer['engagement_score']
-    
-    status = "Healthy"
-    if "Inactive" in last_3_events:
-        status = "At Risk"
-    if "Visited Pricing Page" in last_3_events:
-        status = "Upsell Opportunity"
-        
+    status = features.status()
+
     return {
         "customer_id": customer['id'],
         "status": status,
-        "summary": f"User is {status} with a score of {score_change}."
+        "summary": f"User is {status} with a score of {score_change}.",
+        "features": features
     }
 
+
+def behavior_analysis_batch(customers):
+    """behavior_analysis_agent for a whole population, scored in one vectorized pass."""
+    scored = score_population(customers)
+    return [
+        {
+            "customer_id": customer['id'],
+            "status": status,
+            "summary": f"User is {status} with a score of {customer['engagement_score']}."
+        }
+        for customer, status in zip(customers, scored["status"].tolist())
+    ]
+
 # 2. DECISION AGENT (The LLM Brain)
 # This uses the 'Observe' and 'Memory' to decide the 'Action'
 DECISION_PROMPT = """
@@ -55,15 +122,20 @@ OUTPUT JSON FORMAT:
 
 
 ACTIONS = ["SEND_DISCOUNT", "SEND_TUTORIAL", "ASK_INTEREST", "DO_NOTHING"]
+MAX_DISCOUNTS = 2
+FORCE_ACTION_AFTER = 2  # Days without an event after which DO_NOTHING is forbidden
+
 
-def decision_agent(customer, memory):
+DIVIDER = "━━━━━━━━━━━━━━━━━━━━━━"
+
+
+def plan_decision(customer, memory):
     """
-    Strategic Decision Agent.
-    ALWAYS returns:
-    {
-        "thought": str,
-        "action": str
-    }
+    Everything decision_agent does before the LLM call.
+
+    Returns (decision, allowed_actions, forbidden). When a hard rule
+    already settles the outcome, decision is filled in and no LLM call
+    is needed.
     """
 
     # ─────────────────────────────
@@ -73,9 +145,7 @@ def decision_agent(customer, memory):
         return {
             "thought": "Customer already churned. No further investment.",
             "action": "DO_NOTHING"
-        }
-
-    MAX_DISCOUNTS = 2
+        }, [], []
 
     forbidden = memory.get_forbidden_actions(customer)
 
@@ -88,7 +158,7 @@ def decision_agent(customer, memory):
         pass  # ASK_INTEREST becomes the natural next option
 
     # Force action when inactive
-    if customer["time_since_last_event"] >= 2 and "DO_NOTHING" not in forbidden:
+    if customer["time_since_last_event"] >= FORCE_ACTION_AFTER and "DO_NOTHING" not in forbidden:
         forbidden.append("DO_NOTHING")
 
     # Business policy example
@@ -102,80 +172,382 @@ def decision_agent(customer, memory):
         return {
             "thought": "All actions are constrained. Defaulting to safe inaction.",
             "action": "DO_NOTHING"
-        }
+        }, [], forbidden
 
-    # ─────────────────────────────
-    # LLM STRATEGIC REASONING
-    # ─────────────────────────────
-    prompt = f"""
+    return None, allowed_actions, forbidden
+
+
+# ─────────────────────────────
+# PROMPTS
+# ─────────────────────────────
+DECISION_RULES = f"""
+{DIVIDER}
+DECISION RULES
+{DIVIDER}
+- Inaction causes engagement decay.
+- Avoid repeating failed strategies.
+- Prefer actions aligned with the customer segment.
+- Choose exactly ONE action.
+"""
+
+
+# Static part of the single-customer prompt: identical for every call, so it
+# goes first and providers can cache it
+SINGLE_PREFIX = f"""
 You are an Autonomous Customer Lifecycle Decision Agent.
 
 Your objective is to choose the NEXT BEST ACTION that maximizes customer engagement.
+{DECISION_RULES}
+{DIVIDER}
+OUTPUT FORMAT (STRICT JSON ONLY)
+{DIVIDER}
+{{
+  "thought": "Briefly explain WHY this action is chosen.",
+  "action": "ONE_ACTION_FROM_AVAILABLE_ACTIONS"
+}}
+"""
+
+BATCH_PREFIX = f"""
+You are an Autonomous Customer Lifecycle Decision Agent.
 
-━━━━━━━━━━━━━━━━━━━━━━
+Your objective is to choose, for EACH customer below, the NEXT BEST ACTION
+that maximizes that customer's engagement. Only choose from that customer's
+own Available Actions.
+{DECISION_RULES}
+{DIVIDER}
+OUTPUT FORMAT (STRICT JSON ONLY)
+{DIVIDER}
+A JSON object whose "decisions" array has exactly one entry per customer:
+{{
+  "decisions": [
+    {{
+      "customer_id": "ID_FROM_THE_CUSTOMER_HEADER",
+      "thought": "Briefly explain WHY this action is chosen.",
+      "action": "ONE_ACTION_FROM_THAT_CUSTOMERS_AVAILABLE_ACTIONS"
+    }}
+  ]
+}}
+"""
+
+
+def build_prompt(customer, memory, forbidden, allowed_actions):
+    """Single-customer LLM prompt: static instructions, then this customer's context."""
+    hints = memory.get_success_hints(customer)
+
+    def render(last_k):
+        return f"""
+{DIVIDER}
 CUSTOMER CONTEXT
-━━━━━━━━━━━━━━━━━━━━━━
+{DIVIDER}
 Name: {customer['name']}
 Segment: {customer.get('segment', 'N/A')}
 Lifecycle Stage: {customer['lifecycle_stage']}
 Engagement Score: {customer['engagement_score']}
 Time Since Last Event: {customer['time_since_last_event']}
 Last Action: {customer['last_action']}
-Action History: {customer['action_history']}
+Action History: {action_summary(customer['action_history'], last_k)}
 
-━━━━━━━━━━━━━━━━━━━━━━
+{DIVIDER}
 PAST LEARNINGS
-━━━━━━━━━━━━━━━━━━━━━━
-{memory.get_success_hints(customer)}
+{DIVIDER}
+{hints}
 
 Forbidden Actions (must NOT choose):
 {forbidden}
 
-━━━━━━━━━━━━━━━━━━━━━━
-DECISION RULES
-━━━━━━━━━━━━━━━━━━━━━━
-- Inaction causes engagement decay.
-- Avoid repeating failed strategies.
-- Prefer actions aligned with the customer segment.
-- Choose exactly ONE action.
-
-━━━━━━━━━━━━━━━━━━━━━━
+{DIVIDER}
 AVAILABLE ACTIONS
-━━━━━━━━━━━━━━━━━━━━━━
+{DIVIDER}
 {allowed_actions}
+"""
 
-━━━━━━━━━━━━━━━━━━━━━━
-OUTPUT FORMAT (STRICT JSON ONLY)
-━━━━━━━━━━━━━━━━━━━━━━
-{{
-  "thought": "Briefly explain WHY this action is chosen.",
-  "action": "ONE_ACTION_FROM_AVAILABLE_ACTIONS"
-}}
+    return assemble(SINGLE_PREFIX, [fit_context(render)])
+
+
+def build_batch_prompt(entries):
+    """
+    One prompt for several customers: the static header, rules and output
+    format are sent once, followed by a short block per customer.
+    entries: [(customer, memory, forbidden, allowed_actions), ...]
+    """
+    blocks = []
+    for customer, memory, forbidden, allowed_actions in entries:
+        hints = memory.get_success_hints(customer)
+
+        def render(last_k):
+            return f"""
+{DIVIDER}
+CUSTOMER {customer['id']}
+{DIVIDER}
+Name: {customer['name']}
+Segment: {customer.get('segment', 'N/A')}
+Lifecycle Stage: {customer['lifecycle_stage']}
+Engagement Score: {customer['engagement_score']}
+Time Since Last Event: {customer['time_since_last_event']}
+Last Action: {customer['last_action']}
+Action History: {action_summary(customer['action_history'], last_k)}
+Past Learnings: {hints}
+Forbidden Actions (must NOT choose): {forbidden}
+Available Actions: {allowed_actions}
 """
 
-    try:
-        response = llm.invoke([HumanMessage(content=prompt)])
-        content = response.content.replace("```json", "").replace("```", "").strip()
-        result = json.loads(content)
+        blocks.append(fit_context(render))
 
-        action = result.get("action")
-        thought = result.get("thought", "No explicit reasoning provided.")
+    return assemble(BATCH_PREFIX, blocks)
 
-        # Validate action
-        if action not in allowed_actions:
-            return {
-                "thought": f"Model suggested invalid action '{action}'. Falling back to first allowed option.",
-                "action": allowed_actions[0]
-            }
 
-        return {
-            "thought": thought,
-            "action": action
-        }
+def fallback_decision(allowed_actions, reason="exception", error=None):
+    """
+    Deterministic allowed_actions[0] when no usable LLM decision was
+    obtained. allowed_actions already reflects the hard rules and learned
+    forbidden actions, so this is the rules-only policy.
+    """
+    if isinstance(error, resilience.CircuitOpen):
+        reason = "circuit_open"
+    metrics.record_fallback(reason)
+    if reason == "circuit_open":
+        thought = "LLM provider unavailable (circuit open). Using the rules-only policy."
+    elif reason == "invalid_action":
+        thought = f"Model suggested invalid action '{error.action}'. Falling back to first allowed option."
+    elif reason == "parse_failure":
+        thought = "Model reply could not be parsed. Falling back to first allowed option."
+    else:
+        thought = "LLM call failed. Falling back to deterministic safe action."
+    return {
+        "thought": thought,
+        "action": allowed_actions[0],
+        "fallback": reason
+    }
+
+
+def rules_decision(customer, memory):
+    """
+    Rules-only decision without an LLM call (hard rules and memory, then
+    allowed_actions[0]), for customers outside the day's LLM budget.
+    """
+    decision, allowed_actions, _ = plan_decision(customer, memory)
+    if decision is not None:
+        return decision
+    metrics.inc("decisions_rules_only_total")
+    return {
+        "thought": "Lower urgency today (outside the LLM budget). Using the rules-only policy.",
+        "action": allowed_actions[0],
+        "policy": "rules"
+    }
+
+
+def _decide(prompt, allowed_actions):
+    """One decision call plus up to REPAIR_ATTEMPTS short re-asks."""
+    options = invoke_options(decision_schema(allowed_actions))
+    mode = "single"
+    for _ in range(1 + REPAIR_ATTEMPTS):
+        start = time.perf_counter()
+        response = get_llm().invoke(_messages(prompt), **options)
+        metrics.record_llm_call(mode, prompt, response, time.perf_counter() - start)
+        try:
+            return decode_decision(response.content, allowed_actions)
+        except DecodeError as e:
+            error = e
+            prompt, mode = repair_prompt(response.content, e, allowed_actions), "repair"
+    return fallback_decision(allowed_actions, error.reason, error)
+
+
+async def _adecide(prompt, allowed_actions, timeout):
+    """_decide on the async client; timeout applies to each call."""
+    options = invoke_options(decision_schema(allowed_actions))
+    mode = "single"
+    for _ in range(1 + REPAIR_ATTEMPTS):
+        start = time.perf_counter()
+        response = await asyncio.wait_for(get_llm().ainvoke(_messages(prompt), **options), _call_timeout(timeout))
+        metrics.record_llm_call(mode, prompt, response, time.perf_counter() - start)
+        try:
+            return decode_decision(response.content, allowed_actions)
+        except DecodeError as e:
+            error = e
+            prompt, mode = repair_prompt(response.content, e, allowed_actions), "repair"
+    return fallback_decision(allowed_actions, error.reason, error)
+
+
+def decision_agent(customer, memory, cache=None):
+    """
+    Strategic Decision Agent.
+    ALWAYS returns:
+    {
+        "thought": str,
+        "action": str
+    }
+    Fallback decisions also carry "fallback": "invalid_action" | "parse_failure" |
+    "exception" | "circuit_open" (rules-only while the LLM circuit is open).
+    With a DecisionCache, customers in the same normalized state reuse one LLM decision.
+    """
+    decision, allowed_actions, forbidden = plan_decision(customer, memory)
+    if decision is not None:
+        return decision
+
+    if cache is not None:
+        signature = cache.signature(customer, memory, allowed_actions)
+        registry_key = memory._get_key(customer)
+        cached = cache.get(signature, registry_key)
+        if cached is not None:
+            return cached
+
+    try:
+        prompt = build_prompt(customer, memory, forbidden, allowed_actions)
+        decision = _decide(prompt, allowed_actions)
 
     except Exception as e:
-        print("Decision Agent Error:", e)
-        return {
-            "thought": "LLM call failed. Falling back to deterministic safe action.",
-            "action": allowed_actions[0]
-        }
+        if not isinstance(e, resilience.CircuitOpen):  # Expected while the provider is down
+            print("Decision Agent Error:", e)
+        return fallback_decision(allowed_actions, error=e)
+
+    if cache is not None and "fallback" not in decision:
+        cache.put(signature, decision, registry_key)
+    return decision
+
+
+# 3. BATCHED DECISION AGENT (Concurrent LLM calls)
+async def decision_agent_batch(pairs, max_concurrency=8, timeout=30.0, cache=None, batch_size=1):
+    """
+    Decide for many (customer, memory) pairs at once.
+
+    Forbidden/allowed actions are computed for every customer up front
+    (so memory updates made later the same day do not affect this batch),
+    then at most max_concurrency LLM calls run at a time, each bounded by
+    timeout seconds. Decisions come back in input order, with the same
+    allowed_actions[0] fallback as decision_agent on failure.
+
+    With a DecisionCache, cached states skip the LLM and customers that
+    share a state within the batch wait on a single call.
+
+    batch_size > 1 packs up to that many customers into one request
+    (build_batch_prompt); customers whose entry comes back missing or
+    invalid are retried individually (which includes the repair step).
+    """
+    decisions = [None] * len(pairs)
+    plans = {}           # index -> (allowed_actions, forbidden, signature, registry_key)
+    leaders = []         # indexes that need an LLM call
+    leader_by_signature = {}
+    followers = []       # (index, signature) sharing a leader's decision
+
+    for i, (customer, memory) in enumerate(pairs):
+        decision, allowed_actions, forbidden = plan_decision(customer, memory)
+        if decision is not None:
+            decisions[i] = decision
+            continue
+
+        signature = registry_key = None
+        if cache is not None:
+            signature = cache.signature(customer, memory, allowed_actions)
+            if signature in leader_by_signature:
+                cache.coalesced += 1
+                followers.append((i, signature))
+                continue
+
+            registry_key = memory._get_key(customer)
+            cached = cache.get(signature, registry_key)
+            if cached is not None:
+                decisions[i] = cached
+                continue
+            leader_by_signature[signature] = i
+
+        plans[i] = (allowed_actions, forbidden, signature, registry_key)
+        leaders.append(i)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def decide_one(i):
+        customer, memory = pairs[i]
+        allowed_actions, forbidden = plans[i][:2]
+        async with semaphore:
+            try:
+                prompt = build_prompt(customer, memory, forbidden, allowed_actions)
+                decisions[i] = await _adecide(prompt, allowed_actions, timeout)
+
+            except Exception as e:
+                if not isinstance(e, resilience.CircuitOpen):
+                    print("Decision Agent Error:", repr(e))
+                decisions[i] = fallback_decision(allowed_actions, error=e)
+
+    async def decide_group(group):
+        if len(group) == 1:
+            return await decide_one(group[0])
+
+        ids = {i: str(pairs[i][0]["id"]) for i in group}
+        parsed = {}
+        async with semaphore:
+            try:
+                prompt = build_batch_prompt(
+                    [(*pairs[i], plans[i][1], plans[i][0]) for i in group]
+                )
+                allowed_by_id = {ids[i]: plans[i][0] for i in group}
+                start = time.perf_counter()
+                response = await asyncio.wait_for(
+                    get_llm().ainvoke(_messages(prompt), **invoke_options(batch_schema(allowed_by_id), "decisions")),
+                    _call_timeout(timeout)
+                )
+                metrics.record_llm_call("batch", prompt, response, time.perf_counter() - start)
+                parsed = decode_batch(response.content, allowed_by_id)
+
+            except Exception as e:
+                if not isinstance(e, resilience.CircuitOpen):
+                    print("Decision Agent Batch Error:", repr(e))
+
+        retry = []
+        for i in group:
+            if ids[i] in parsed:
+                decisions[i] = parsed[ids[i]]
+            else:
+                retry.append(i)
+        await asyncio.gather(*(decide_one(i) for i in retry))
+
+    await asyncio.gather(*(decide_group(g) for g in _group_by_id(pairs, leaders, batch_size)))
+
+    if cache is not None:
+        for i in leaders:
+            if "fallback" not in decisions[i]:
+                cache.put(plans[i][2], decisions[i], plans[i][3])
+        for i, signature in followers:
+            decisions[i] = dict(decisions[leader_by_signature[signature]])
+
+    return decisions
+
+
+# One long-lived event loop for batched decisions. The async LLM client
+# keeps its connection pool bound to the loop it first ran on, so calling
+# asyncio.run() once per day fails from the second day on.
+_loop = None
+_loop_pid = None  # A forked child does not inherit the loop's thread
+_loop_lock = threading.Lock()
+
+
+def _decision_loop():
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="decision-loop", daemon=True).start()
+    return _loop
+
+
+def run_decision_batch(pairs, **options):
+    """Blocking decision_agent_batch(pairs, **options); safe to call from any thread, any number of times."""
+    return asyncio.run_coroutine_threadsafe(
+        decision_agent_batch(pairs, **options), _decision_loop()
+    ).result()
+
+
+def _group_by_id(pairs, indexes, batch_size):
+    """Split indexes into groups of at most batch_size with unique customer ids."""
+    groups = []
+    group, ids = [], set()
+    for i in indexes:
+        customer_id = str(pairs[i][0]["id"])
+        if len(group) >= max(1, batch_size) or customer_id in ids:
+            groups.append(group)
+            group, ids = [], set()
+        group.append(i)
+        ids.add(customer_id)
+    if group:
+        groups.append(group)
+    return groups
@@ -0,0 +1,384 @@
+"""
+Headless batch runner for the OODA loop.
+
+Runs the same observe → decide → act → learn loop as the Streamlit
+"Run Next Day Simulation" button, for N days, without a browser:
+
+    python -m src.batch_runner --days 30 --workers 8 --copies 2000 --out runs/nightly
+
+Customers are split across a process pool. Each worker starts the day
+with a copy of the shared StrategyMemory; at the day boundary every
+worker's new learnings are merged back before the next day starts.
+Behavior is drawn from per-customer, per-day random streams (src/rng.py),
+so --workers does not change the simulated outcomes.
+
+CSV / Parquet customer tables (--customers people.parquet) are streamed
+instead: each day reads the table in chunks, runs every chunk through the
+loop and writes updated state back chunk by chunk (src/customer_stream.py),
+so memory use does not grow with the population.
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.history import HISTORY_WINDOW, HistoryArchive, bound_history, events_since, flush_archives, history_mark
+from src.memory_store import CompactStrategyMemory, StrategyMemory
+from src.rng import DayStreams
+
+
+# ─────────────────────────────────────────────
+# POPULATION LOADING
+# ─────────────────────────────────────────────
+def load_customers(path=None, copies=1, window=HISTORY_WINDOW, archive=None):
+    """
+    Customers from a JSON file (list of customer dicts) or, by default,
+    the personas in data/customer.py. copies > 1 replicates the list with
+    unique ids ("C001-0", "C001-1", ...). Histories are bounded to the
+    last `window` events (older ones go to `archive` if given).
+    """
+    if path:
+        with open(path) as f:
+            base = json.load(f)
+    else:
+        from data.customer import personas
+        base = personas
+
+    if copies <= 1:
+        customers = copy.deepcopy(base)
+    else:
+        customers = []
+        for n in range(copies):
+            for customer in base:
+                clone = copy.deepcopy(customer)
+                clone["id"] = f"{customer['id']}-{n}"
+                customers.append(clone)
+
+    return [bound_history(customer, window, archive) for customer in customers]
+
+
+def split_shards(customers, workers):
+    """Contiguous, roughly equal shards (empty shards are dropped)."""
+    size = -(-len(customers) // max(1, workers))
+    return [customers[i:i + size] for i in range(0, len(customers), size)] if customers else []
+
+
+def new_memory(options):
+    if options.get("compact_memory"):
+        return CompactStrategyMemory(keep_logs=False, verbose=False)
+    return StrategyMemory()
+
+
+# ─────────────────────────────────────────────
+# WORKER: ONE DAY FOR ONE SHARD
+# ─────────────────────────────────────────────
+def run_shard_day(customers, registry, day, seed, options, part=0):
+    """
+    Runs one day for a shard of active customers. seed is the run's root
+    seed; every customer draws from its own stream for (seed, id, day).
+
+    Returns (customers, memory delta, story rows). Executed in a worker
+    process, so everything in and out is plain picklable data. With
+    options["event_dir"], the day's events are also written to
+    event_dir/day=NNN/part-<part>.parquet.
+    """
+    from src.agents import behavior_analysis_batch, run_decision_batch
+    from src.simulation import simulate_user_behavior, evaluate_agent_action
+
+    memory = new_memory(options)
+    memory.registry = copy.deepcopy(registry)  # In-process callers may share one snapshot
+    baseline = memory.snapshot()
+
+    event_log = None
+    if options.get("event_dir"):
+        from src.event_log import EventLog, part_path
+        event_log = EventLog(part_path(options["event_dir"], day, part))
+        marks = [history_mark(customer["history"]) for customer in customers]
+
+    # 1. ENVIRONMENT + 2. OBSERVE
+    streams = DayStreams(seed, day)
+    behavior_logs = [simulate_user_behavior(customer, streams.for_customer(customer["id"])) for customer in customers]
+    analyses = behavior_analysis_batch(customers)
+
+    # 3. DECIDE
+    decisions = run_decision_batch(
+        [(customer, memory) for customer in customers],
+        max_concurrency=options["concurrency"],
+        timeout=options["timeout"],
+        batch_size=options["batch_size"]
+    )
+
+    # 4. ACT + EVALUATE (+ LEARN)
+    rows = []
+    for n, (customer, behavior_log, analysis, decision) in enumerate(zip(customers, behavior_logs, analyses, decisions)):
+        impact = evaluate_agent_action(customer, decision["action"], memory)
+        if event_log is not None:
+            event_log.record(day, customer, events_since(customer["history"], marks[n]), decision["action"], impact)
+        rows.append({
+            "day": day,
+            "customer_id": customer["id"],
+            "name": customer["name"],
+            "behavior": behavior_log,
+            "analysis": analysis["status"],
+            "action": decision["action"],
+            "thought": decision.get("thought", ""),
+            "fallback": decision.get("fallback"),
+            "impact": impact,
+            "engagement_score": customer["engagement_score"],
+            "status": customer["status"],
+        })
+
+    if event_log is not None:
+        event_log.close()
+    return customers, memory.diff(baseline), rows
+
+
+# ─────────────────────────────────────────────
+# DRIVER
+# ─────────────────────────────────────────────
+def run(customers, days, out_dir, workers=1, seed=0, memory=None, options=None):
+    """
+    Runs `days` simulated days and writes, under out_dir:
+      day_001.jsonl ...  one row per customer decision
+      summary.jsonl      one line of aggregates per day
+      customers.json     final customer state
+      memory.json        final StrategyMemory registry
+    Returns the StrategyMemory.
+    """
+    options = {"concurrency": 8, "timeout": 30.0, "batch_size": 1, "compact_memory": False, **(options or {})}
+    memory = memory or new_memory(options)
+    prepare_out_dir(out_dir, options)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for day in range(1, days + 1):
+            active_idx = [i for i, c in enumerate(customers) if c.get("status") != "Churned"]
+            shards = split_shards([customers[i] for i in active_idx], workers)
+            jobs = [
+                (shard, memory.snapshot(), day, seed, options, n)
+                for n, shard in enumerate(shards)
+            ]
+
+            if pool is None:
+                results = [run_shard_day(*job) for job in jobs]
+            else:
+                results = list(pool.map(run_shard_day, *zip(*jobs))) if jobs else []
+
+            # Day boundary: put updated customers back, merge every worker's learnings
+            updated = [c for shard_customers, _, _ in results for c in shard_customers]
+            for i, customer in zip(active_idx, updated):
+                customers[i] = customer
+            rows = []
+            for _, delta, shard_rows in results:
+                memory.merge(delta)
+                rows.extend(shard_rows)
+
+            write_day(out_dir, day, rows, customers)
+            flush_archives(customers)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    with open(os.path.join(out_dir, "customers.json"), "w") as f:
+        json.dump(customers, f, default=list)  # EventHistory -> list of strings
+    write_memory(out_dir, memory)
+
+    return memory
+
+
+# ─────────────────────────────────────────────
+# STREAMING DRIVER (CSV / Parquet tables)
+# ─────────────────────────────────────────────
+def run_streaming(path, days, out_dir, workers=1, seed=0, memory=None, options=None,
+                  chunk_size=10000, window=HISTORY_WINDOW, archive=None):
+    """
+    Like run(), for a customer table too large to hold in memory.
+
+    Day 1 reads `path`; every day writes the updated table to
+    out_dir/customers.<ext> (same format as the input) and the next day
+    reads it back. At most `workers` chunks are in flight at a time.
+    Every chunk starts from the day-start memory and learnings are merged
+    as chunks finish, so chunk size and worker count do not change results.
+    """
+    from src.customer_stream import CustomerWriter, read_chunks, table_format
+
+    options = {"concurrency": 8, "timeout": 30.0, "batch_size": 1, "compact_memory": False, **(options or {})}
+    memory = memory or new_memory(options)
+    prepare_out_dir(out_dir, options)
+    state_path = os.path.join(out_dir, "customers." + table_format(path))
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for day in range(1, days + 1):
+            source = path if day == 1 else state_path
+            chunks = read_chunks(source, chunk_size, window=window, archive=archive)
+            with DayWriter(out_dir, day) as day_writer, CustomerWriter(state_path) as state:
+                for customers, rows in run_day_chunks(chunks, memory, day, seed, options, pool, workers):
+                    day_writer.add(rows, customers)
+                    state.write(customers)
+                    flush_archives(customers)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    write_memory(out_dir, memory)
+    return memory
+
+
+def run_day_chunks(chunks, memory, day, seed, options, pool=None, workers=1):
+    """
+    Generator: (customers, story rows) for every chunk, in input order,
+    after running the day on the chunk's active customers.
+    """
+    registry = memory.snapshot()  # Day-start memory for every chunk
+
+    def submit(n, customers):
+        active_idx = [i for i, c in enumerate(customers) if c.get("status") != "Churned"]
+        job = ([customers[i] for i in active_idx], registry, day, seed, options, n)
+        result = run_shard_day(*job) if pool is None else pool.submit(run_shard_day, *job)
+        return customers, active_idx, result
+
+    def finish(customers, active_idx, result):
+        if pool is not None:
+            result = result.result()
+        updated, delta, rows = result
+        memory.merge(delta)
+        for i, customer in zip(active_idx, updated):
+            customers[i] = customer
+        return customers, rows
+
+    in_flight = deque()
+    for n, customers in enumerate(chunks):
+        in_flight.append(submit(n, customers))
+        if len(in_flight) >= max(1, workers):
+            yield finish(*in_flight.popleft())
+    while in_flight:
+        yield finish(*in_flight.popleft())
+
+
+# ─────────────────────────────────────────────
+# OUTPUT
+# ─────────────────────────────────────────────
+class DayWriter:
+    """Streams one day's story rows to day_NNN.jsonl and appends its summary line."""
+
+    def __init__(self, out_dir, day):
+        self.out_dir = out_dir
+        self.day = day
+        self._file = open(os.path.join(out_dir, f"day_{day:03d}.jsonl"), "w")
+        self.decisions = 0
+        self.fallbacks = 0
+        self.actions = {}
+        self.active = 0
+        self.churned = 0
+        self.engagement = 0
+
+    def add(self, rows, customers):
+        for row in rows:
+            self._file.write(json.dumps(row) + "\n")
+            self.actions[row["action"]] = self.actions.get(row["action"], 0) + 1
+            if row["fallback"]:
+                self.fallbacks += 1
+        self.decisions += len(rows)
+        for c in customers:
+            if c.get("status") != "Churned":
+                self.active += 1
+                self.engagement += c["engagement_score"]
+            else:
+                self.churned += 1
+
+    def close(self):
+        self._file.close()
+        summary = {
+            "day": self.day,
+            "decisions": self.decisions,
+            "active": self.active,
+            "churned": self.churned,
+            "mean_engagement": self.engagement / self.active if self.active else 0.0,
+            "actions": self.actions,
+            "fallbacks": self.fallbacks,
+        }
+        with open(os.path.join(self.out_dir, "summary.jsonl"), "a") as f:
+            f.write(json.dumps(summary) + "\n")
+        print(f"Day {self.day}: {summary['decisions']} decisions, "
+              f"{summary['active']} active, {summary['churned']} churned")
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def prepare_out_dir(out_dir, options):
+    """Create out_dir and clear outputs of a previous run (summary, event parts)."""
+    os.makedirs(out_dir, exist_ok=True)
+    open(os.path.join(out_dir, "summary.jsonl"), "w").close()
+    if options.get("event_dir"):
+        shutil.rmtree(options["event_dir"], ignore_errors=True)
+
+
+def write_day(out_dir, day, rows, customers):
+    with DayWriter(out_dir, day) as day_writer:
+        day_writer.add(rows, customers)
+
+
+def write_memory(out_dir, memory):
+    with open(os.path.join(out_dir, "memory.json"), "w") as f:
+        json.dump(memory.registry, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless multi-process OODA batch simulation.")
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--customers", help="JSON file with a list of customer dicts, or a .csv / .parquet table to stream "
+                                            "(default: data/customer.py personas)")
+    parser.add_argument("--copies", type=int, default=1, help="Replicate the population this many times (JSON / personas only)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Customers per chunk when streaming a table")
+    parser.add_argument("--out", default="runs/latest", help="Output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent LLM calls per worker")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per LLM call timeout (seconds)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Customers per LLM request")
+    parser.add_argument("--compact-memory", action="store_true", help="Use the array-backed CompactStrategyMemory")
+    parser.add_argument("--history-window", type=int, default=HISTORY_WINDOW, help="Events kept per customer")
+    parser.add_argument("--history-archive", help="File for events that fall out of the window")
+    parser.add_argument("--event-log", action="store_true",
+                        help="Write every event to <out>/events/day=NNN/part-NNN.parquet")
+    args = parser.parse_args(argv)
+
+    archive = HistoryArchive(args.history_archive) if args.history_archive else None
+    options = {
+        "concurrency": args.concurrency,
+        "timeout": args.timeout,
+        "batch_size": args.batch_size,
+        "compact_memory": args.compact_memory,
+        "event_dir": os.path.join(args.out, "events") if args.event_log else None,
+    }
+
+    if args.customers and args.customers.lower().endswith((".csv", ".parquet", ".pq")):
+        if args.copies > 1:
+            parser.error("--copies is not supported when streaming a customer table")
+        run_streaming(
+            args.customers, args.days, args.out,
+            workers=args.workers, seed=args.seed, options=options,
+            chunk_size=args.chunk_size, window=args.history_window, archive=archive
+        )
+        return
+
+    customers = load_customers(args.customers, args.copies, args.history_window, archive)
+    run(
+        customers, args.days, args.out,
+        workers=args.workers, seed=args.seed,
+        options=options
+    )
+
+
+if __name__ == "__main__":
+    main()
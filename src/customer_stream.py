@@ -0,0 +1,239 @@
+"""
+Streaming customer ingestion from CSV / Parquet.
+
+Customer tables larger than memory are read in chunks, mapped onto the
+customer dict schema used everywhere else, run through the day loop as a
+generator pipeline and written back chunk by chunk, so peak memory is a
+few chunks regardless of population size:
+
+    read_chunks(path) -> run_day_chunks(...) -> CustomerWriter
+
+Table layout (one row per customer; id and name are required, missing
+optional columns get persona-neutral defaults):
+
+    id, name, persona, segment, lifecycle_stage, status, engagement_score,
+    discount_sensitivity, content_sensitivity, time_since_last_event,
+    discount_count, not_interested_count, last_action,
+    history, action_history        ("|"-separated event lists)
+
+Other column names can be mapped with column_map={"table_col": "schema_col"}.
+CSV uses the stdlib csv module; Parquet needs pyarrow.
+"""
+import csv
+import os
+from itertools import islice
+
+from src.history import HISTORY_WINDOW, bound_history
+
+LIST_SEPARATOR = "|"
+
+# (column, type, default)
+COLUMNS = [
+    ("id", str, None),
+    ("name", str, None),
+    ("persona", str, ""),
+    ("segment", str, ""),
+    ("lifecycle_stage", str, "Onboarding"),
+    ("status", str, "Active"),
+    ("engagement_score", int, 50),
+    ("discount_sensitivity", float, 0.5),
+    ("content_sensitivity", float, 0.5),
+    ("time_since_last_event", int, 0),
+    ("discount_count", int, 0),
+    ("not_interested_count", int, 0),
+    ("last_action", str, None),
+    ("history", list, ()),
+    ("action_history", list, ()),
+]
+COLUMN_NAMES = [name for name, _, _ in COLUMNS]
+
+
+# ─────────────────────────────────────────────
+# ROW <-> CUSTOMER MAPPING
+# ─────────────────────────────────────────────
+def _missing(value):
+    return value is None or value == "" or (isinstance(value, float) and value != value)
+
+
+def _convert(value, kind, default):
+    if _missing(value):
+        return list(default) if kind is list else default
+    if kind is list:
+        if isinstance(value, str):
+            return value.split(LIST_SEPARATOR)
+        return list(value)
+    if kind is int:
+        return int(float(value))
+    return kind(value)
+
+
+def row_to_customer(row, column_map=None, window=HISTORY_WINDOW, archive=None):
+    """One table row (dict) -> customer dict with bounded histories."""
+    if column_map:
+        row = {column_map.get(k, k): v for k, v in row.items()}
+    values = {name: _convert(row.get(name), kind, default) for name, kind, default in COLUMNS}
+    if values["id"] is None:
+        raise ValueError(f"Customer row without an id: {row}")
+    if values["name"] is None:
+        # Memory keys use the last name token as the persona (Sam, Clara, Betty)
+        raise ValueError(f"Customer row without a name: {row}")
+
+    customer = {
+        "id": values["id"],
+        "name": values["name"],
+        "persona": values["persona"],
+        "engagement_score": values["engagement_score"],
+        "lifecycle_stage": values["lifecycle_stage"],
+        "sensitivity": {
+            "discount": values["discount_sensitivity"],
+            "content": values["content_sensitivity"],
+        },
+        "last_action": values["last_action"],
+        "action_history": values["action_history"],
+        "time_since_last_event": values["time_since_last_event"],
+        "not_interested_count": values["not_interested_count"],
+        "status": values["status"],
+        "history": values["history"],
+        "discount_count": values["discount_count"],
+        "segment": values["segment"],
+    }
+    return bound_history(customer, window, archive)
+
+
+def customer_to_row(customer):
+    """Customer dict -> flat row in COLUMN_NAMES order."""
+    sensitivity = customer.get("sensitivity", {})
+    return {
+        "id": str(customer["id"]),
+        "name": customer.get("name", ""),
+        "persona": customer.get("persona", ""),
+        "segment": customer.get("segment", ""),
+        "lifecycle_stage": customer.get("lifecycle_stage", ""),
+        "status": customer.get("status", "Active"),
+        "engagement_score": int(customer.get("engagement_score", 0)),
+        "discount_sensitivity": float(sensitivity.get("discount", 0.0)),
+        "content_sensitivity": float(sensitivity.get("content", 0.0)),
+        "time_since_last_event": int(customer.get("time_since_last_event", 0)),
+        "discount_count": int(customer.get("discount_count", 0)),
+        "not_interested_count": int(customer.get("not_interested_count", 0)),
+        "last_action": customer.get("last_action"),
+        "history": LIST_SEPARATOR.join(customer.get("history", [])),
+        "action_history": LIST_SEPARATOR.join(customer.get("action_history", [])),
+    }
+
+
+# ─────────────────────────────────────────────
+# READING
+# ─────────────────────────────────────────────
+def table_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".csv", ".txt"):
+        return "csv"
+    raise ValueError(f"Unsupported customer table '{path}' (use .csv or .parquet)")
+
+
+def _raw_row_chunks(path, chunk_size):
+    if table_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            yield rows
+
+
+def read_chunks(path, chunk_size=10000, column_map=None, window=HISTORY_WINDOW, archive=None):
+    """Yields lists of at most chunk_size customer dicts."""
+    for rows in _raw_row_chunks(path, chunk_size):
+        yield [row_to_customer(row, column_map, window, archive) for row in rows]
+
+
+# ─────────────────────────────────────────────
+# WRITING
+# ─────────────────────────────────────────────
+class CustomerWriter:
+    """
+    Appends customer chunks to a CSV or Parquet file. The file is written
+    under a temporary name and moved into place by close(), so a reader
+    never sees a half-written table.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = table_format(path)
+        self._tmp = path + ".tmp"
+        self._file = None
+        self._writer = None
+        self.rows = 0
+
+    def write(self, customers):
+        rows = [customer_to_row(c) for c in customers]
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self._tmp, _parquet_schema(), compression="zstd")
+            self._writer.write_table(pa.Table.from_pylist(rows, schema=_parquet_schema()))
+        else:
+            if self._writer is None:
+                self._file = open(self._tmp, "w", newline="", encoding="utf-8")
+                self._writer = csv.DictWriter(self._file, fieldnames=COLUMN_NAMES)
+                self._writer.writeheader()
+            self._writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        if self._writer is None:
+            # Empty input: still produce a valid (header-only) table
+            self.write([])
+        if self.format == "parquet":
+            self._writer.close()
+        else:
+            self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            if self._file is not None:
+                self._file.close()
+            elif self._writer is not None and self.format == "parquet":
+                self._writer.close()
+            if os.path.exists(self._tmp):
+                os.remove(self._tmp)
+        return False
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64(), list: pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind, _ in COLUMNS])
+
+
+def write_customers(path, customers, chunk_size=10000):
+    """Write an iterable of customers to a table, chunk by chunk."""
+    with CustomerWriter(path) as writer:
+        chunk = []
+        for customer in customers:
+            chunk.append(customer)
+            if len(chunk) >= chunk_size:
+                writer.write(chunk)
+                chunk = []
+        if chunk:
+            writer.write(chunk)
+    return writer.rows
@@ -0,0 +1,180 @@
+"""
+Event-driven bookkeeping for the day loop.
+
+DayEngine keeps active and churned customers in separate indexes (a day
+walks only the active ones; a customer moves once, when it churns) and a
+dirty set: customers that changed state or crossed a threshold the
+decision rules or outcomes look at since their last per-customer step:
+
+- status or lifecycle stage,
+- FORCE_ACTION_AFTER days without an event (DO_NOTHING becomes forbidden),
+- the discount cap,
+- a "not interested" reply (the second one churns),
+- engagement crossing INTEREST_SCORE (where ASK_INTEREST starts failing).
+
+Customers that are not dirty (and, under a daily LLM budget from
+src.scheduler, were not picked for an LLM decision) are quiescent: their
+situation has not changed, so the rules decide for them every day, with
+or without a budget. advance_quiet() moves all of them through
+the day in one vectorized Population step: time step, rules-only actions
+from per-key forbidden masks (the same result as agents.rules_decision),
+outcomes and learning. There are no per-customer agent calls or story cards;
+only the columns and history lines are written back. Quiet customers
+whose day crossed a threshold are dirty for the next one.
+"""
+import numpy as np
+
+from src import metrics
+from src.agents import FORCE_ACTION_AFTER, MAX_DISCOUNTS
+from src.history import events_since, history_mark
+from src.population import (
+    ACTIONS, ACTIVITY_EVENTS, ASK_INTEREST, DO_NOTHING, NO_EVENT, SEND_DISCOUNT,
+    SEND_TUTORIAL, STATUS_CHURNED, Population
+)
+
+INTEREST_SCORE = 40  # evaluate_outcome: ASK_INTEREST succeeds above this
+
+# History lines evaluate_outcome writes: action -> (sent, (failed, succeeded))
+OUTCOME_EVENTS = {
+    SEND_DISCOUNT: ("Discount Email Sent", ("Discount Ignored", "Discount Accepted")),
+    SEND_TUTORIAL: ("Tutorial Email Sent", ("Tutorial Skipped", "Tutorial Completed")),
+    ASK_INTEREST: ("Interest Check Sent", ("Responded: Not Interested", "Responded: Interested")),
+}
+IDLE_EVENT = "No Action Taken"
+CHURN_EVENT = "Agent stopped investing due to low ROI"
+
+
+def state_key(customer):
+    """The thresholds a customer sits on; a change makes it dirty."""
+    return (
+        customer.get("status"),
+        customer["lifecycle_stage"],
+        customer["time_since_last_event"] >= FORCE_ACTION_AFTER,
+        customer["discount_count"] >= MAX_DISCOUNTS,
+        customer["not_interested_count"],
+        customer["engagement_score"] > INTEREST_SCORE,
+    )
+
+
+def _state_columns(population):
+    """state_key for every row of a Population, as one int matrix."""
+    return np.stack([
+        population.status,
+        population.lifecycle_stage,
+        population.time_since_last_event >= FORCE_ACTION_AFTER,
+        population.discount_count >= MAX_DISCOUNTS,
+        population.not_interested_count,
+        population.engagement_score > INTEREST_SCORE,
+    ], axis=1).astype(np.int64)
+
+
+def rules_actions(population, customers, memory):
+    """
+    Vectorized agents.rules_decision for active rows: hard rules and
+    learned forbidden actions (looked up once per memory key), then the
+    first allowed action. Returns action codes.
+    """
+    key_rows = {}
+    key_index = np.empty(len(customers), dtype=np.int64)
+    high_value = np.zeros(len(customers), dtype=bool)
+    for i, customer in enumerate(customers):
+        key = memory._get_key(customer)
+        if key not in key_rows:
+            key_rows[key] = (len(key_rows), np.isin(ACTIONS, memory.get_forbidden_actions(customer)))
+        key_index[i] = key_rows[key][0]
+        high_value[i] = customer.get("segment") == "High-Value"
+
+    by_key = np.array([row for _, row in key_rows.values()], dtype=bool).reshape(-1, len(ACTIONS))
+    forbidden = by_key[key_index]
+    forbidden[:, SEND_DISCOUNT] |= (population.discount_count >= MAX_DISCOUNTS) | high_value
+    forbidden[:, DO_NOTHING] |= population.time_since_last_event >= FORCE_ACTION_AFTER
+
+    actions = np.argmin(forbidden, axis=1).astype(np.int8)  # First allowed
+    constrained = forbidden.all(axis=1)
+    actions[constrained] = DO_NOTHING  # "All actions are constrained" hard rule
+    metrics.inc("decisions_rules_only_total", int((~constrained).sum()))
+    return actions
+
+
+class DayEngine:
+    """Active / churned indexes and the dirty set for simulate_day."""
+
+    def __init__(self, customers=()):
+        self.active = {}        # id -> customer, in list order
+        self.churned = {}
+        self.dirty = set()      # ids that need the per-customer path
+        self.last_quiet = 0     # customers advanced in bulk on the last day
+        for customer in customers:
+            self.add(customer)
+
+    def add(self, customer):
+        """New customers start dirty (their first day is a full step)."""
+        if customer.get("status") == "Churned":
+            self.churned[customer["id"]] = customer
+        else:
+            self.active[customer["id"]] = customer
+            self.dirty.add(customer["id"])
+
+    def split(self, customers, llm_ids):
+        """(full, quiet): customers needing the per-customer path, and the rest."""
+        full, quiet = [], []
+        for customer in customers:
+            needs_step = customer["id"] in llm_ids or customer["id"] in self.dirty
+            (full if needs_step else quiet).append(customer)
+        return full, quiet
+
+    def touch(self, customer, before):
+        """After a per-customer step: before is state_key() from its start."""
+        if customer.get("status") == "Churned":
+            self._churn(customer)
+        elif state_key(customer) != before:
+            self.dirty.add(customer["id"])
+        else:
+            self.dirty.discard(customer["id"])
+
+    def _churn(self, customer):
+        self.active.pop(customer["id"], None)
+        self.churned[customer["id"]] = customer
+        self.dirty.discard(customer["id"])
+
+    def advance_quiet(self, customers, memory, streams=None, event_log=None, day=None):
+        """
+        One day for quiescent customers in a single vectorized step
+        (streams: src.rng.DayStreams, or None for the global random module).
+        """
+        self.last_quiet = len(customers)
+        if not customers:
+            return
+        metrics.inc("quiet_customers_total", len(customers))
+
+        population = Population.from_customers(customers)
+        before = _state_columns(population)
+        events = population.time_step(streams)
+        actions = rules_actions(population, customers, memory)
+        impact = population.apply_actions(actions, memory)
+        changed = (_state_columns(population) != before).any(axis=1)
+        population.write_back(customers)
+
+        # History lines, as simulate_time_step + evaluate_outcome write them
+        churned = population.status == STATUS_CHURNED
+        for i, customer in enumerate(customers):
+            history = customer["history"]
+            mark = history_mark(history)
+            if events[i] != NO_EVENT:
+                history.append(ACTIVITY_EVENTS[events[i]])
+            if actions[i] == DO_NOTHING:
+                history.append(IDLE_EVENT)
+            else:
+                sent, outcomes = OUTCOME_EVENTS[actions[i]]
+                history.append(sent)
+                history.append(outcomes[int(impact[i] > 0)])
+            if churned[i]:
+                history.append(CHURN_EVENT)
+            customer["action_history"].append(ACTIONS[actions[i]])
+
+            if event_log is not None:
+                event_log.record(day, customer, events_since(history, mark), ACTIONS[actions[i]], int(impact[i]))
+            if churned[i]:
+                self._churn(customer)
+            elif changed[i]:
+                self.dirty.add(customer["id"])
@@ -0,0 +1,227 @@
+"""
+One simulated day of the app loop, runnable inline or on a background thread.
+
+simulate_day() is the day loop from app.py as a generator: customers are
+processed in chunks (simulate -> observe -> decide -> act + learn) and a
+(story, memory_update) pair is yielded per customer as soon as it is done.
+With one chunk it behaves exactly like the original blocking loop.
+
+DayWorker runs simulate_day off the Streamlit script thread and reports
+through a thread-safe queue, so the page can poll, render partial
+results and cancel between chunks:
+
+    ("progress", done, total)
+    ("story", story, memory_update_or_None)
+    ("done", n) | ("cancelled", n) | ("error", message)   # n customers finished
+"""
+import contextlib
+import queue
+import threading
+
+from src import metrics
+from src.agents import behavior_analysis_batch, rules_decision, run_decision_batch
+from src.day_engine import state_key
+from src.event_log import EventLog, part_path
+from src.history import events_since, history_mark
+from src.rng import DayStreams
+from src.simulation import evaluate_agent_action, simulate_user_behavior
+from src.story_store import story_card
+
+
+def simulate_day(customers, memory, day, config, cache=None, chunk_size=None, cancel=None, lock=None,
+                 scheduler=None, engine=None):
+    """
+    Runs day `day` for the non-churned customers and yields
+    (story, memory_update) per customer.
+
+    config keys: concurrency, timeout, batch_size, seed (None = global
+    random), event_log_dir, session_id. chunk_size=None decides for
+    everyone at once; smaller chunks stream results sooner and let later
+    chunks see learnings from earlier ones. cancel (threading.Event) is
+    checked before each chunk; lock guards the customer / memory mutations.
+
+    With a DecisionScheduler, only the most urgent customers within its
+    daily budget (picked at the start of the day) get an LLM decision;
+    the rest get rules_decision. Customers are re-scored after acting.
+
+    With a DayEngine, the day walks its active index instead of every
+    customer, and the quiescent customers (not dirty, no LLM decision
+    picked by the scheduler) are advanced in one bulk step before the
+    chunks, budget or not, without stories; engine.last_quiet counts them.
+    """
+    lock = lock or contextlib.nullcontext()
+    with lock:
+        if engine is not None:
+            active = list(engine.active.values())
+        else:
+            active = [c for c in customers if c.get("status") != "Churned"]
+    streams = DayStreams(config["seed"], day) if config.get("seed") is not None else None
+
+    llm_ids = None
+    if scheduler is not None:
+        with lock:
+            budget = scheduler.budget()
+            if budget is not None:
+                llm_ids = scheduler.select(budget)
+                metrics.inc("scheduled_llm_decisions_total", len(llm_ids))
+
+    event_log = None
+    if config.get("event_log_dir"):
+        event_log = EventLog(part_path(config["event_log_dir"], day, config.get("session_id", 0)))
+
+    try:
+        if engine is not None:
+            engine.last_quiet = 0
+            if not (cancel is not None and cancel.is_set()):
+                active, quiet = engine.split(active, llm_ids or ())
+                with lock, metrics.span("quiet"):
+                    engine.advance_quiet(quiet, memory, streams, event_log, day)
+                    if scheduler is not None:
+                        for customer in quiet:
+                            scheduler.update(customer)
+
+        chunk_size = chunk_size or max(1, len(active))
+        for start in range(0, len(active), chunk_size):
+            if cancel is not None and cancel.is_set():
+                return
+            chunk = active[start:start + chunk_size]
+
+            with lock:
+                marks = [history_mark(customer["history"]) for customer in chunk]
+                if engine is not None:
+                    states = [state_key(customer) for customer in chunk]
+
+                # 1. ENVIRONMENT: Simulate behavior
+                with metrics.span("simulate"):
+                    if streams is not None:
+                        behavior_logs = [simulate_user_behavior(c, streams.for_customer(c["id"])) for c in chunk]
+                    else:
+                        behavior_logs = [simulate_user_behavior(c) for c in chunk]
+
+                # 2. OBSERVE
+                with metrics.span("observe"):
+                    behavior_analysis_batch(chunk)
+
+            # 3. DECIDE (concurrent LLM calls, results in customer order)
+            with metrics.span("decide"):
+                decisions = [None] * len(chunk)
+                selected = list(range(len(chunk)))
+                if llm_ids is not None:
+                    selected = [n for n, customer in enumerate(chunk) if customer["id"] in llm_ids]
+                    with lock:
+                        for n, customer in enumerate(chunk):
+                            if customer["id"] not in llm_ids:
+                                decisions[n] = rules_decision(customer, memory)
+                results = run_decision_batch(
+                    [(chunk[n], memory) for n in selected],
+                    max_concurrency=config["concurrency"],
+                    timeout=config["timeout"],
+                    cache=cache,
+                    batch_size=config["batch_size"]
+                ) if selected else []
+                for n, decision in zip(selected, results):
+                    decisions[n] = decision
+
+            for n, (customer, behavior_log, decision) in enumerate(zip(chunk, behavior_logs, decisions)):
+                with lock:
+                    story, update = act(customer, behavior_log, decision, memory)
+                    if scheduler is not None:
+                        scheduler.update(customer)
+                    if engine is not None:
+                        engine.touch(customer, states[n])
+                if event_log is not None:
+                    event_log.record(day, customer, events_since(customer["history"], marks[n]), story["action"], story["impact"])
+                yield story, update
+    finally:
+        if event_log is not None:
+            event_log.close()
+
+
+def act(customer, behavior_log, decision, memory):
+    """ACT + EVALUATE one decision; returns (story, memory_update or None)."""
+    action = decision.get("action")
+    thought = decision.get("thought", "No reasoning provided.")
+    learning_logs_before = len(memory.learning_logs)
+
+    # 4. ACT + EVALUATE (learning is timed separately as "learn")
+    with metrics.span("act"):
+        impact = evaluate_agent_action(customer, action, memory)
+
+    # 5. Track memory updates (check if new learning log was added)
+    update = None
+    if action != "DO_NOTHING" and len(memory.learning_logs) > learning_logs_before:
+        # Format: "Learned: SEND_DISCOUNT → SUCCESS (S:1, F:0) for Onboarding_Sam"
+        latest_log = memory.learning_logs[-1]
+        update = {
+            "status_icon": "✅" if "SUCCESS" in latest_log else "❌",
+            "action": action,
+            "message": latest_log.replace("Learned: ", "")
+        }
+
+    # 6. BUILD STORY
+    story = {
+        "customer": story_card(customer),  # Card fields at decision time (no shared history)
+        "thought": thought,
+        "action": action,
+        "impact": impact,
+        "behavior": behavior_log
+    }
+    return story, update
+
+
+class DayWorker:
+    """Runs simulate_day on a daemon thread; read results from .queue."""
+
+    def __init__(self, customers, memory, day, config, cache=None, chunk_size=8, lock=None, scheduler=None,
+                 engine=None):
+        self.day = day
+        self.queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        if engine is not None:
+            self.total = len(engine.active)
+        else:
+            self.total = sum(1 for c in customers if c.get("status") != "Churned")
+        self._engine = engine
+        self._args = (customers, memory, day, config, cache, chunk_size, self.cancel_event, lock, scheduler, engine)
+        self._thread = threading.Thread(target=self._run, name=f"day-{day}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        stories = 0
+        try:
+            self.queue.put(("progress", 0, self.total))
+            for story, update in simulate_day(*self._args):
+                stories += 1
+                self.queue.put(("story", story, update))
+                self.queue.put(("progress", self._done(stories), self.total))
+        except Exception as e:
+            print("Day Worker Error:", repr(e))
+            self.queue.put(("error", repr(e)))
+            return
+        done = self._done(stories)
+        self.queue.put(("cancelled" if self.cancel_event.is_set() and done < self.total else "done", done))
+
+    def _done(self, stories):
+        """Customers finished: one per story plus any advanced in bulk (DayEngine)."""
+        return stories + (self._engine.last_quiet if self._engine is not None else 0)
+
+    def drain(self):
+        """All messages queued so far (non-blocking)."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
@@ -0,0 +1,123 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class DecisionCache:
+    """
+    LRU + TTL cache of LLM decisions keyed on a normalized customer state.
+
+    Customers in practically the same state (same segment, stage, allowed
+    actions and memory hints, similar score / inactivity) share one
+    decision instead of paying one LLM round trip each.
+
+    Register it on a StrategyMemory with memory.add_listener(cache) so
+    entries are dropped whenever that memory learns something new for a
+    registry key they were looked up under.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600.0, score_bucket=10):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.score_bucket = score_bucket
+
+        self._entries = OrderedDict()  # signature -> (expires_at, decision)
+        self._by_registry_key = {}     # registry key -> {signature, ...}
+        self._registry_keys = {}       # signature -> {registry key, ...}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ─────────────────────────────
+    # STATE SIGNATURE
+    # ─────────────────────────────
+    def signature(self, customer, memory, allowed_actions):
+        """Normalized state key for one customer's decision."""
+        hints = memory.get_success_hints(customer)
+        return (
+            customer.get("segment"),
+            customer["lifecycle_stage"],
+            customer["engagement_score"] // self.score_bucket,
+            # 0, 1, 2-3, 4-7, 8-15, ... (2 is where DO_NOTHING becomes forbidden)
+            int(customer["time_since_last_event"]).bit_length(),
+            tuple(sorted(allowed_actions)),
+            hashlib.blake2b(hints.encode(), digest_size=8).hexdigest(),
+        )
+
+    # ─────────────────────────────
+    # LOOKUP / STORE
+    # ─────────────────────────────
+    def get(self, signature, registry_key=None):
+        """Cached decision (a copy) or None. Counts a hit or a miss."""
+        entry = self._entries.get(signature)
+        if entry is not None and entry[0] < time.monotonic():
+            self._remove(signature)
+            self.evictions += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(signature)
+        self._link(signature, registry_key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, signature, decision, registry_key=None):
+        self._entries[signature] = (time.monotonic() + self.ttl, dict(decision))
+        self._entries.move_to_end(signature)
+        self._link(signature, registry_key)
+
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    # ─────────────────────────────
+    # INVALIDATION (StrategyMemory listener)
+    # ─────────────────────────────
+    def invalidate(self, registry_key):
+        """Drop every entry looked up under this StrategyMemory key."""
+        for signature in list(self._by_registry_key.get(registry_key, ())):
+            self._remove(signature)
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_registry_key.clear()
+        self._registry_keys.clear()
+
+    def _link(self, signature, registry_key):
+        if registry_key is not None:
+            self._by_registry_key.setdefault(registry_key, set()).add(signature)
+            self._registry_keys.setdefault(signature, set()).add(registry_key)
+
+    def _remove(self, signature):
+        """Drop an entry and its registry-key links (LRU, TTL or invalidation)."""
+        del self._entries[signature]
+        for registry_key in self._registry_keys.pop(signature, ()):
+            signatures = self._by_registry_key[registry_key]
+            signatures.discard(signature)
+            if not signatures:
+                del self._by_registry_key[registry_key]
+
+    def stats(self):
+        # Requests that waited on an identical in-flight call count as hits
+        hits = self.hits + self.coalesced
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,248 @@
+"""
+Durable StrategyMemory: append-only binary update log + compact snapshots.
+
+Layout of a memory directory:
+
+    meta.json            {"generation": g}  (replaced atomically, written last)
+    snapshot.<g>.npy     counts array (keys × actions × [SUCCESS, FAILED]), int32
+    stages.<g>.txt       key id -> lifecycle stage, one per line
+    personas.<g>.txt     key id -> persona, one per line
+    keys.<g>.txt         key id -> registry key ("Stage_Persona"), one per line
+    actions.<g>.txt      action id -> action name, one per line
+    updates.<g>.log      every change made after snapshot g, in binary records
+
+Loading reads the snapshot array and replays the log written after
+it, so restarts and crashes recover the last flushed state without
+re-parsing JSON. A torn record at the end of the log (crash mid-write) is
+dropped.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from src.memory_store import FAILED, CompactStrategyMemory
+
+# Record types
+DEFINE_KEY = 1     # key id, then "stage\tpersona"
+DEFINE_ACTION = 2  # action id, then action name
+UPDATE = 3         # key id, action id, status index, amount
+RESET = 4          # registry replaced wholesale (followed by new definitions)
+
+HEADER = struct.Struct("<BI")        # type, id / key id
+DEFINE_LEN = struct.Struct("<H")     # name length in bytes
+UPDATE_BODY = struct.Struct("<HBi")  # action id, status index, amount
+
+
+class DurableStrategyMemory(CompactStrategyMemory):
+    """
+    CompactStrategyMemory that survives restarts.
+
+    Every change is appended to the update log (flushed to the OS per
+    record; fsync on snapshot / close). After snapshot_every logged
+    updates a new snapshot is written and a fresh log generation starts.
+    """
+
+    def __init__(self, path, snapshot_every=100000, keep_logs=True, verbose=True):
+        super().__init__(keep_logs=keep_logs, verbose=verbose)
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.generation = 0
+        self._log = None
+        self._since_snapshot = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ─────────────────────────────
+    # LOGGING HOOKS
+    # ─────────────────────────────
+    def _intern_key(self, stage, persona):
+        key_id = super()._intern_key(stage, persona)
+        self._append_define(DEFINE_KEY, key_id, f"{stage}\t{persona}")
+        return key_id
+
+    def _action_id(self, action):
+        known = action in self._action_ids
+        action_id = super()._action_id(action)
+        if not known:
+            self._append_define(DEFINE_ACTION, action_id, action)
+        return action_id
+
+    def _record(self, key_id, action_id, status_index, amount):
+        super()._record(key_id, action_id, status_index, amount)
+        if self._log is not None and amount:
+            self._append(HEADER.pack(UPDATE, key_id) + UPDATE_BODY.pack(action_id, status_index, amount))
+            self._since_snapshot += 1
+            if self._since_snapshot >= self.snapshot_every:
+                self.snapshot_to_disk()
+
+    @CompactStrategyMemory.registry.setter
+    def registry(self, registry):
+        if self._log is not None:
+            self._append(HEADER.pack(RESET, 0))
+        CompactStrategyMemory.registry.fset(self, registry)
+
+    def _append_define(self, kind, item_id, name):
+        if self._log is None:
+            return
+        data = name.encode()
+        self._append(HEADER.pack(kind, item_id) + DEFINE_LEN.pack(len(data)) + data)
+
+    def _append(self, record):
+        """Every log write goes through here: one record, flushed to the OS."""
+        self._log.write(record)
+        self._log.flush()
+
+    # ─────────────────────────────
+    # SNAPSHOTS
+    # ─────────────────────────────
+    def snapshot_to_disk(self):
+        """Write a compact snapshot of the current state and start a new log generation."""
+        generation = self.generation + 1
+        n_keys, n_actions = len(self._key_names), len(self.actions)
+
+        np.save(self._file("snapshot", generation, "npy"), self._counts[:n_keys, :n_actions])
+        stages, personas = zip(*self._key_pairs) if n_keys else ((), ())
+        self._write_lines(self._file("stages", generation, "txt"), stages)
+        self._write_lines(self._file("personas", generation, "txt"), personas)
+        self._write_lines(self._file("keys", generation, "txt"), self._key_names)
+        self._write_lines(self._file("actions", generation, "txt"), self.actions)
+
+        # Commit point: meta.json names the new generation
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"generation": generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+        old = self.generation
+        self.generation = generation
+        self._open_log()
+        self._remove_generation(old)
+
+    def close(self):
+        if self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log.close()
+            self._log = None
+
+    # ─────────────────────────────
+    # LOADING
+    # ─────────────────────────────
+    def _load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.generation = json.load(f)["generation"]
+            self._load_snapshot(self.generation)
+        self._replay(self._file("updates", self.generation, "log"))
+        self._open_log()
+
+    def _load_snapshot(self, generation):
+        counts = np.load(self._file("snapshot", generation, "npy"))  # Copied into growable arrays below
+        stages = self._read_lines(self._file("stages", generation, "txt"))
+        personas = self._read_lines(self._file("personas", generation, "txt"))
+        self.actions[:] = self._read_lines(self._file("actions", generation, "txt"))
+
+        self._action_ids.update(zip(self.actions, range(len(self.actions))))
+        self._key_pairs[:] = zip(stages, personas)
+        self._key_ids.update(zip(self._key_pairs, range(len(stages))))
+        self._key_names[:] = self._read_lines(self._file("keys", generation, "txt"))
+        self._key_by_name.update(zip(self._key_names, range(len(stages))))
+
+        n_keys, n_actions = counts.shape[:2]
+        capacity = max(64, 1 << max(n_keys, 1).bit_length())
+        self._counts = np.zeros((capacity, max(8, n_actions), 2), dtype=np.int32)
+        self._counts[:n_keys, :n_actions] = counts
+        self._forbidden = np.zeros(capacity, dtype=np.uint64)
+        failed = self._counts[:n_keys, :n_actions, FAILED] >= 1
+        weights = np.left_shift(np.uint64(1), np.arange(n_actions, dtype=np.uint64))
+        self._forbidden[:n_keys] = (failed * weights).sum(axis=1)
+
+    def _replay(self, log_path):
+        if not os.path.exists(log_path):
+            return
+
+        with open(log_path, "rb") as f:
+            data = f.read()
+
+        pos, valid = 0, 0
+        while pos + HEADER.size <= len(data):
+            kind, item_id = HEADER.unpack_from(data, pos)
+            body = pos + HEADER.size
+
+            if kind == UPDATE:
+                end = body + UPDATE_BODY.size
+                if end > len(data):
+                    break
+                action_id, status_index, amount = UPDATE_BODY.unpack_from(data, body)
+                super()._record(item_id, action_id, status_index, amount)
+
+            elif kind in (DEFINE_KEY, DEFINE_ACTION):
+                if body + DEFINE_LEN.size > len(data):
+                    break
+                (length,) = DEFINE_LEN.unpack_from(data, body)
+                end = body + DEFINE_LEN.size + length
+                if end > len(data):
+                    break
+                name = data[body + DEFINE_LEN.size:end].decode()
+                if kind == DEFINE_KEY:
+                    super()._intern_key(*name.split("\t"))
+                else:
+                    super()._action_id(name)
+
+            elif kind == RESET:
+                end = body
+                self._key_ids.clear()
+                self._key_names.clear()
+                self._key_pairs.clear()
+                self._key_by_name.clear()
+                self._counts[:] = 0
+                self._forbidden[:] = 0
+
+            else:
+                break  # Garbage: treat as a torn tail
+
+            pos = valid = end
+
+        if valid < len(data):
+            # Drop a torn tail so new records are appended after the last good one
+            with open(log_path, "r+b") as f:
+                f.truncate(valid)
+
+    # ─────────────────────────────
+    # FILE HELPERS
+    # ─────────────────────────────
+    def _open_log(self):
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self._file("updates", self.generation, "log"), "ab")
+        self._since_snapshot = 0
+
+    def _remove_generation(self, generation):
+        for name in ("snapshot", "stages", "personas", "keys", "actions", "updates"):
+            ext = {"snapshot": "npy", "updates": "log"}.get(name, "txt")
+            try:
+                os.remove(self._file(name, generation, ext))
+            except FileNotFoundError:
+                pass
+
+    def _file(self, name, generation, ext):
+        return os.path.join(self.path, f"{name}.{generation}.{ext}")
+
+    @staticmethod
+    def _write_lines(path, lines):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _read_lines(path):
+        with open(path, encoding="utf-8") as f:
+            data = f.read()
+        return data.split("\n") if data else []
@@ -0,0 +1,175 @@
+"""
+Columnar on-disk event log.
+
+Every event a customer produces in a day (activity from
+simulate_time_step, outcomes from evaluate_outcome) becomes one row:
+
+    day, customer_id, event_code, action, impact, engagement_after
+
+where action / impact / engagement_after describe that customer's
+decision and result for the day. Rows are buffered column-wise and
+written as zstd-compressed Parquet row groups by a background thread,
+so the loop never waits on disk.
+
+Files are laid out as a hive-partitioned dataset, one part per writer:
+
+    events/day=001/part-000.parquet
+
+Event codes are the uint16 codes of src.history; the code -> name table
+of the writing process is stored in each file's metadata and
+read_events() decodes every part with its own table:
+
+    read_events("runs/nightly/events", columns=["customer_id", "event"])
+"""
+import json
+import os
+import queue
+import threading
+
+from src.history import EVENT_NAMES, event_code
+
+FIELDS = ["day", "customer_id", "event_code", "action", "impact", "engagement_after"]
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("day", pa.uint16()),
+        ("customer_id", pa.string()),
+        ("event_code", pa.uint16()),
+        ("action", pa.string()),
+        ("impact", pa.int16()),
+        ("engagement_after", pa.uint8()),
+    ])
+
+
+def part_path(root, day, part):
+    return os.path.join(root, f"day={day:03d}", f"part-{part:03d}.parquet")
+
+
+class EventLog:
+    """
+    Buffered Parquet writer for one part file.
+
+    append()/record() only touch in-memory column lists; every
+    batch_size rows the buffer is handed to a background thread that
+    writes it as a row group. close() drains the queue and writes the
+    footer (the file is readable only after close()).
+    """
+
+    def __init__(self, path, batch_size=65536, compression="zstd"):
+        self.path = path
+        self.batch_size = batch_size
+        self.compression = compression
+        self.rows = 0
+        self._columns = {field: [] for field in FIELDS}
+        self._queue = queue.Queue(maxsize=4)  # back-pressure if disk falls behind
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    # ─────────────────────────────
+    # HOT PATH
+    # ─────────────────────────────
+    def append(self, day, customer_id, event, action, impact, engagement_after):
+        columns = self._columns
+        columns["day"].append(day)
+        columns["customer_id"].append(customer_id)
+        columns["event_code"].append(event_code(event))
+        columns["action"].append(action)
+        columns["impact"].append(impact)
+        columns["engagement_after"].append(engagement_after)
+        if len(columns["day"]) >= self.batch_size:
+            self.flush()
+
+    def record(self, day, customer, events, action, impact):
+        """One row per event the customer produced today."""
+        customer_id = str(customer["id"])
+        engagement = customer["engagement_score"]
+        for event in events:
+            self.append(day, customer_id, event, action, impact, engagement)
+
+    def flush(self):
+        """Hand the buffered rows to the writer thread."""
+        if self._error is not None:
+            raise self._error
+        if not self._columns["day"]:
+            return
+        batch, self._columns = self._columns, {field: [] for field in FIELDS}
+        self.rows += len(batch["day"])
+        self._queue.put(batch)
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # ─────────────────────────────
+    # WRITER THREAD
+    # ─────────────────────────────
+    def _drain(self):
+        writer = None
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = _schema()
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    break
+                if writer is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    writer = pq.ParquetWriter(self.path + ".tmp", schema, compression=self.compression)
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+        except Exception as e:  # Surface on the next flush()/close()
+            self._error = e
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if writer is not None:
+                # Code table at close, so it covers every code written
+                writer.add_key_value_metadata({"event_names": json.dumps(EVENT_NAMES)})
+                writer.close()
+                if self._error is None:
+                    os.replace(self.path + ".tmp", self.path)
+
+
+def read_events(root, columns=None, filter=None):
+    """
+    All event parts under root as one pyarrow Table, with an "event"
+    column decoded from event_code. filter is a pyarrow.dataset
+    expression, e.g. pyarrow.dataset.field("day") >= 10.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    columns = list(columns or FIELDS + ["event"])
+    wanted = [c for c in columns if c != "event"]
+    if "event" in columns and "event_code" not in wanted:
+        wanted.append("event_code")
+
+    dataset = ds.dataset(root, format="parquet", schema=_schema())
+    tables = []
+    for fragment in dataset.get_fragments(filter=filter):
+        table = fragment.to_table(columns=wanted, filter=filter, schema=dataset.schema)
+        if "event" in columns:
+            metadata = fragment.physical_schema.metadata or {}
+            names = pa.array(json.loads(metadata.get(b"event_names", b"null")) or EVENT_NAMES)
+            table = table.append_column("event", pc.take(names, table["event_code"]))
+        tables.append(table.select(columns))
+
+    if not tables:
+        return _schema().empty_table().append_column("event", pa.array([], pa.string())).select(columns)
+    return pa.concat_tables(tables)
@@ -0,0 +1,189 @@
+"""
+Incremental behavior features.
+
+A FeatureTracker keeps rolling per-customer counters of event categories
+(activity, inactivity, pricing-page visits, outreach, positive / negative
+responses) over the last N events for each configured window. It is
+attached to the customer's EventHistory and updated in O(1) on every
+append, so behavior_analysis_agent never re-reads history.
+
+score_population() is the vectorized path: it stacks every tracker's
+counters into one NumPy array and derives statuses and rates for a whole
+population at once.
+"""
+from array import array
+
+from src.history import EVENT_NAMES, EventHistory, event_code
+
+FEATURE_WINDOWS = (3, 10, 30)
+STATUS_WINDOW = 3  # behavior_analysis_agent's "last 3 events"
+
+# Category -> events in it (an event may belong to several)
+CATEGORIES = {
+    "activity": ("Login", "Feature Use", "Search"),
+    "inactive": ("Inactive",),
+    "pricing": ("Visited Pricing Page",),
+    "outreach": ("Discount Email Sent", "Tutorial Email Sent", "Interest Check Sent"),
+    "positive": ("Discount Accepted", "Tutorial Completed", "Responded: Interested"),
+    "negative": ("Discount Ignored", "Tutorial Skipped", "Responded: Not Interested"),
+}
+CATEGORY_NAMES = list(CATEGORIES)
+INACTIVE = CATEGORY_NAMES.index("inactive")
+PRICING = CATEGORY_NAMES.index("pricing")
+
+_category_masks = []  # event code -> bitmask of categories
+
+
+def category_mask(code):
+    while code >= len(_category_masks):
+        name = EVENT_NAMES[len(_category_masks)]
+        _category_masks.append(sum(
+            1 << k for k, events in enumerate(CATEGORIES.values()) if name in events
+        ))
+    return _category_masks[code]
+
+
+# ─────────────────────────────────────────────
+# PER-CUSTOMER TRACKER
+# ─────────────────────────────────────────────
+class FeatureTracker:
+    """
+    Rolling category counts over the last w events, for every w in windows.
+
+    counts[k * len(CATEGORY_NAMES) + c] is the number of events of
+    category c among the last windows[k] events.
+    """
+
+    __slots__ = ("windows", "counts", "seen", "_ring", "_pos", "_status_base")
+
+    def __init__(self, windows=FEATURE_WINDOWS):
+        self.windows = tuple(sorted(set(windows) | {STATUS_WINDOW}))
+        self._status_base = self.windows.index(STATUS_WINDOW) * len(CATEGORY_NAMES)
+        self.counts = [0] * (len(self.windows) * len(CATEGORY_NAMES))
+        self.seen = 0
+        self._ring = array("H", [0]) * self.windows[-1]
+        self._pos = 0
+
+    def push(self, code):
+        """Account for one appended event (by code)."""
+        ring, size = self._ring, len(self._ring)
+        counts, width = self.counts, len(CATEGORY_NAMES)
+
+        mask = category_mask(code)
+        for k, window in enumerate(self.windows):
+            base = k * width
+            # Event leaving this window
+            if self.seen >= window:
+                old = category_mask(ring[(self._pos - window) % size])
+                c = 0
+                while old:
+                    if old & 1:
+                        counts[base + c] -= 1
+                    old >>= 1
+                    c += 1
+            bits, c = mask, 0
+            while bits:
+                if bits & 1:
+                    counts[base + c] += 1
+                bits >>= 1
+                c += 1
+
+        ring[self._pos] = code
+        self._pos = (self._pos + 1) % size
+        self.seen += 1
+
+    def count(self, category, window=STATUS_WINDOW):
+        return self.counts[self.windows.index(window) * len(CATEGORY_NAMES) + CATEGORY_NAMES.index(category)]
+
+    def rate(self, category, window):
+        seen = min(window, self.seen)
+        return self.count(category, window) / seen if seen else 0.0
+
+    def status(self):
+        """Same rule as behavior_analysis_agent always used, on the last 3 events."""
+        base = self._status_base
+        if self.counts[base + PRICING]:
+            return "Upsell Opportunity"
+        if self.counts[base + INACTIVE]:
+            return "At Risk"
+        return "Healthy"
+
+    def snapshot(self):
+        """Flat dict of every counter and rate, plus the status flags."""
+        features = {"events_seen": self.seen}
+        width = len(CATEGORY_NAMES)
+        for k, window in enumerate(self.windows):
+            seen = min(window, self.seen)
+            for c, category in enumerate(CATEGORY_NAMES):
+                count = self.counts[k * width + c]
+                features[f"{category}_{window}"] = count
+                features[f"{category}_rate_{window}"] = count / seen if seen else 0.0
+        features["recent_inactivity"] = features[f"inactive_{STATUS_WINDOW}"] > 0
+        features["pricing_visit"] = features[f"pricing_{STATUS_WINDOW}"] > 0
+        return features
+
+
+def customer_features(customer, windows=FEATURE_WINDOWS):
+    """
+    The customer's FeatureTracker. The first call seeds it from the events
+    still in the history window and attaches it to the EventHistory, which
+    keeps it current from then on. Plain list histories get a fresh
+    tracker over their most recent events on every call.
+    """
+    history = customer["history"]
+    tracker = getattr(history, "features", None)
+    if tracker is not None:
+        return tracker
+
+    tracker = FeatureTracker(windows)
+    if isinstance(history, EventHistory):
+        recent = history.codes()
+    else:
+        recent = [event_code(e) for e in history[-tracker.windows[-1]:]]
+    for code in recent:
+        tracker.push(code)
+    if isinstance(history, EventHistory):
+        history.features = tracker
+    return tracker
+
+
+# ─────────────────────────────────────────────
+# VECTORIZED PATH
+# ─────────────────────────────────────────────
+STATUS_NAMES = ("Healthy", "At Risk", "Upsell Opportunity")
+
+
+def score_population(customers, windows=FEATURE_WINDOWS):
+    """
+    Features for many customers at once.
+
+    Returns a dict of NumPy arrays:
+      counts      (n, len(windows), len(CATEGORY_NAMES)) rolling counts
+      rates       counts / events seen in each window
+      status      status string per customer (same rule as behavior_analysis_agent)
+      engagement, time_since_last_event
+      windows, categories  axis labels
+    """
+    import numpy as np
+
+    trackers = [customer_features(c, windows) for c in customers]
+    windows = trackers[0].windows if trackers else tuple(sorted(set(windows) | {STATUS_WINDOW}))
+    n, width = len(trackers), len(CATEGORY_NAMES)
+
+    counts = np.array([t.counts for t in trackers], dtype=np.int32).reshape(n, len(windows), width)
+    seen = np.fromiter((t.seen for t in trackers), dtype=np.int64, count=n)
+    window_seen = np.minimum(seen[:, None], np.array(windows)[None, :])
+    rates = np.divide(counts, window_seen[:, :, None], out=np.zeros(counts.shape), where=window_seen[:, :, None] > 0)
+
+    status_counts = counts[:, windows.index(STATUS_WINDOW)]
+    codes = np.where(status_counts[:, PRICING] > 0, 2, np.where(status_counts[:, INACTIVE] > 0, 1, 0))
+
+    return {
+        "counts": counts,
+        "rates": rates,
+        "status": np.array(STATUS_NAMES)[codes],
+        "engagement": np.fromiter((c["engagement_score"] for c in customers), dtype=np.int64, count=n),
+        "time_since_last_event": np.fromiter((c["time_since_last_event"] for c in customers), dtype=np.int64, count=n),
+        "windows": windows,
+        "categories": CATEGORY_NAMES,
+    }
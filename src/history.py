@@ -0,0 +1,210 @@
+"""
+Bounded per-customer history.
+
+customer["history"] / customer["action_history"] used to be plain lists
+of strings that grew by a few entries every simulated day. EventHistory
+is a drop-in replacement: a fixed-capacity ring buffer of small integer
+event codes that still reads like the list it replaces (append, len,
+iteration, `in`, indexing and slices such as history[-3:] return the
+same strings). Events pushed out of the window can be spilled to an
+on-disk HistoryArchive.
+"""
+import os
+from array import array
+
+HISTORY_WINDOW = 32
+
+# ─────────────────────────────────────────────
+# EVENT CODE TABLE
+# ─────────────────────────────────────────────
+# Everything the simulation, agents and personas write today. Unknown
+# strings are interned on first use, so any event text still works.
+EVENT_NAMES = [
+    # Activity (simulate_time_step)
+    "Login", "Feature Use", "Search", "Inactive", "Visited Pricing Page",
+    # Outcomes (evaluate_outcome)
+    "Discount Email Sent", "Discount Accepted", "Discount Ignored",
+    "Tutorial Email Sent", "Tutorial Completed", "Tutorial Skipped",
+    "Interest Check Sent", "Responded: Interested", "Responded: Not Interested",
+    "No Action Taken", "Agent stopped investing due to low ROI",
+    # Actions (action_history)
+    "SEND_DISCOUNT", "SEND_TUTORIAL", "ASK_INTEREST", "DO_NOTHING",
+    # Persona seed history (data/customer.py)
+    "Account Created", "Logged in 5x", "API Setup", "Daily Use", "Stopped Access",
+    "Limit Warning Hit", "Coupon Used",
+]
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_NAMES)}
+
+
+def event_code(name):
+    """Code for an event string, interning it if it is new."""
+    code = EVENT_CODES.get(name)
+    if code is None:
+        code = len(EVENT_NAMES)
+        EVENT_NAMES.append(name)
+        EVENT_CODES[name] = code
+    return code
+
+
+# ─────────────────────────────────────────────
+# RING BUFFER
+# ─────────────────────────────────────────────
+class EventHistory:
+    """Last `capacity` events of one customer, stored as uint16 codes."""
+
+    __slots__ = ("capacity", "_codes", "_start", "_size", "archive", "owner", "appended", "features")
+
+    def __init__(self, events=(), capacity=HISTORY_WINDOW, archive=None, owner=None, features=None):
+        self.capacity = capacity
+        self._codes = array("H", [0]) * capacity
+        self._start = 0
+        self._size = 0
+        self.archive = archive
+        self.owner = owner  # customer id, written next to spilled events
+        self.appended = 0   # events ever appended (see events_since)
+        self.features = None
+        for event in events:
+            self.append(event)
+        self.features = features  # src.features.FeatureTracker, pushed on every append
+
+    def append(self, event):
+        code = event_code(event)
+        self.appended += 1
+        if self.features is not None:
+            self.features.push(code)
+        if self._size < self.capacity:
+            self._codes[(self._start + self._size) % self.capacity] = code
+            self._size += 1
+            return
+
+        # Full: overwrite the oldest slot (spilling it first if archived)
+        if self.archive is not None:
+            self.archive.write(self.owner, self._codes[self._start])
+        self._codes[self._start] = code
+        self._start = (self._start + 1) % self.capacity
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def codes(self):
+        """Event codes, oldest first."""
+        end = self._start + self._size
+        if end <= self.capacity:
+            return self._codes[self._start:end]
+        return self._codes[self._start:] + self._codes[:end - self.capacity]
+
+    def last(self, n):
+        """Last n events as strings (same as history[-n:] on a list)."""
+        return [EVENT_NAMES[c] for c in self.codes()[max(0, self._size - n):]]
+
+    # list-like reading
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (EVENT_NAMES[c] for c in self.codes())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [EVENT_NAMES[c] for c in self.codes()[index]]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        return EVENT_NAMES[self._codes[(self._start + index) % self.capacity]]
+
+    def __contains__(self, event):
+        code = EVENT_CODES.get(event)
+        return code is not None and code in self.codes()
+
+    def __eq__(self, other):
+        if not isinstance(other, (EventHistory, list, tuple)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    # Codes are process-local, so pickles / deep copies carry the strings
+    def __reduce__(self):
+        return (EventHistory, (list(self), self.capacity, self.archive, self.owner, self.features))
+
+
+# ─────────────────────────────────────────────
+# ON-DISK ARCHIVE (spill of older events)
+# ─────────────────────────────────────────────
+class HistoryArchive:
+    """
+    Append-only text archive of events that fell out of a customer's
+    window, one "customer_id<TAB>event" line each. Writes are buffered;
+    call flush() at the end of a run (or day).
+    """
+
+    def __init__(self, path, buffer_size=4096):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+
+    def write(self, owner, code):
+        self._buffer.append(f"{owner}\t{EVENT_NAMES[code]}\n")
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(self._buffer)
+        self._buffer.clear()
+
+    def read(self, owner=None):
+        """Archived (customer_id, event) pairs, optionally for one customer."""
+        self.flush()
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            rows = [line.rstrip("\n").split("\t", 1) for line in f]
+        return [(o, e) for o, e in rows if owner is None or o == str(owner)]
+
+    # Only the path travels to other processes; flush first so nothing is lost
+    def __reduce__(self):
+        self.flush()
+        return (HistoryArchive, (self.path, self.buffer_size))
+
+
+def bound_history(customer, window=HISTORY_WINDOW, archive=None):
+    """Swap a customer's history lists for bounded EventHistory buffers (in place)."""
+    for field in ("history", "action_history"):
+        events = customer.get(field, [])
+        if not isinstance(events, EventHistory):
+            customer[field] = EventHistory(events, window, archive, customer.get("id"))
+    return customer
+
+
+def history_mark(history):
+    """Position to pass to events_since() later (works for lists too)."""
+    return history.appended if isinstance(history, EventHistory) else len(history)
+
+
+def events_since(history, mark):
+    """Events appended after history_mark() returned mark (at most the window)."""
+    new = history_mark(history) - mark
+    if new <= 0:
+        return []
+    return history.last(new) if isinstance(history, EventHistory) else history[-new:]
+
+
+def flush_archives(customers):
+    """Flush every HistoryArchive referenced by these customers' histories."""
+    archives = {}
+    for customer in customers:
+        for field in ("history", "action_history"):
+            archive = getattr(customer.get(field), "archive", None)
+            if archive is not None:
+                archives[id(archive)] = archive
+    for archive in archives.values():
+        archive.flush()
@@ -0,0 +1,312 @@
+"""
+Routing decision calls across several LLM providers.
+
+LLM_PROVIDERS lists the backends, comma separated, each as
+provider:model[:max_concurrency[:weight[:cost]]], e.g.
+
+    LLM_PROVIDERS="openai:gpt-4o-mini:16:1:0.15,google:gemini-2.0-flash:8:1:0.10"
+
+provider is "openai" (honors LLM_BASE_URL, OPENAI_API_KEY) or "google"
+(GOOGLE_API_KEY). cost is the price per 1M input tokens in USD.
+OpenAI-only request options (the structured-output response_format)
+are dropped for google clients, whose replies are decoded defensively.
+Each backend gets its own ResilientLLM and CircuitBreaker (when
+LLM_RESILIENCE=1), so one provider's brownout opens only its breaker.
+
+LLMRouter keeps a rolling estimate per backend from the calls of the
+last LLM_ROUTER_WINDOW seconds (mean latency, error rate) and ranks
+backends by
+
+    (latency * (1 + ERROR_PENALTY * error_rate) + LLM_ROUTER_COST_WEIGHT * cost) / weight
+
+Backends with no recent calls start from PRIOR_LATENCY, so a recovered
+provider is tried again once its bad samples age out. A call goes to
+the best-ranked backend with a free slot (max_concurrency in flight);
+if it fails, the next one is tried (weighted fallback), and backends
+whose breaker is open come last. Only when every backend failed does
+the error reach the caller (CircuitOpen if all were open).
+
+    llm_router_calls_total{backend}      calls sent to a backend
+    llm_router_fallbacks_total{backend}  calls that failed there and moved on
+    llm_router_waits_total               every backend was at its cap
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from src import metrics, resilience
+
+# Seconds of call history behind each backend's latency / error estimate
+ROUTER_WINDOW = float(os.getenv("LLM_ROUTER_WINDOW", "120"))
+# Seconds of latency one USD per 1M input tokens is worth when ranking
+ROUTER_COST_WEIGHT = float(os.getenv("LLM_ROUTER_COST_WEIGHT", "0.1"))
+ERROR_PENALTY = 4.0
+PRIOR_LATENCY = 1.0
+# invoke() keyword arguments only the OpenAI API understands
+OPENAI_ONLY_OPTIONS = ("response_format",)
+
+
+class Backend:
+    """One provider client plus its rolling latency / error estimate."""
+
+    def __init__(self, name, client, max_concurrency=8, weight=1.0, cost=0.0, window=ROUTER_WINDOW):
+        self.name = name
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.weight = weight
+        self.cost = cost
+        self.window = window
+        self.breaker = getattr(client, "breaker", None)
+        self.in_flight = 0
+        self.samples = deque(maxlen=256)  # (finished at, seconds, ok)
+
+    @property
+    def healthy(self):
+        return self.breaker is None or self.breaker.available
+
+    def record(self, seconds, ok):
+        self.samples.append((time.monotonic(), seconds, ok))
+
+    def estimate(self):
+        """(mean latency, error rate) over the window; (PRIOR_LATENCY, 0) without samples."""
+        cutoff = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        if not self.samples:
+            return PRIOR_LATENCY, 0.0
+        latency = sum(s[1] for s in self.samples) / len(self.samples)
+        errors = sum(1 for s in self.samples if not s[2]) / len(self.samples)
+        return latency, errors
+
+    def score(self, cost_weight=ROUTER_COST_WEIGHT):
+        latency, errors = self.estimate()
+        return (latency * (1 + ERROR_PENALTY * errors) + cost_weight * self.cost) / self.weight
+
+
+class LLMRouter:
+    """invoke / ainvoke like a chat client, spread over Backends."""
+
+    def __init__(self, backends, cost_weight=ROUTER_COST_WEIGHT):
+        self.backends = list(backends)
+        self.cost_weight = cost_weight
+        self._cond = threading.Condition()
+        self._async_waiters = []  # (loop, future) of ainvoke calls waiting for a slot
+
+    @property
+    def deadline(self):
+        """Worst case for one call (every backend tried until its deadline), or None if any has none."""
+        deadlines = [getattr(b.client, "deadline", None) for b in self.backends]
+        return None if None in deadlines else sum(deadlines)
+
+    def ranked(self, exclude=()):
+        """Backends not yet tried, healthy ones best score first, open breakers last."""
+        candidates = [b for b in self.backends if b.name not in exclude]
+        return sorted(candidates, key=lambda b: (not b.healthy, b.score(self.cost_weight)))
+
+    def _try_acquire(self, exclude):
+        """
+        (backend, busy): the best-ranked untried backend with a free slot
+        (slot taken), or (None, True) if all are at their cap, or
+        (None, False) if none are left.
+        """
+        with self._cond:
+            candidates = self.ranked(exclude)
+            for backend in candidates:
+                if backend.in_flight < backend.max_concurrency:
+                    backend.in_flight += 1
+                    return backend, False
+            return None, bool(candidates)
+
+    def _release(self, backend, started, error):
+        seconds = time.monotonic() - started
+        with self._cond:
+            backend.in_flight -= 1
+            if not isinstance(error, resilience.CircuitOpen):
+                backend.record(seconds, error is None)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        # Callers may release from any thread; wake each waiter on its own loop
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:  # Loop already closed
+                pass
+
+    @staticmethod
+    def _final_error(errors):
+        # A real provider error says more than "circuit open"
+        for error in errors:
+            if not isinstance(error, resilience.CircuitOpen):
+                return error
+        return errors[-1] if errors else resilience.CircuitOpen("No LLM backend configured")
+
+    # ─────────────────────────────
+    # ASYNC
+    # ─────────────────────────────
+    async def _acquire(self, exclude):
+        """_try_acquire, waiting (without polling) until a slot frees up."""
+        loop = asyncio.get_running_loop()
+        counted = False
+        while True:
+            with self._cond:
+                backend, busy = self._try_acquire(exclude)
+                if not busy:
+                    return backend
+                # Registered under the lock, so a release cannot slip in unseen
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            if not counted:
+                metrics.inc("llm_router_waits_total")
+                counted = True
+            await waiter
+
+    async def ainvoke(self, messages, **kwargs):
+        tried, errors = set(), []
+        while True:
+            backend = await self._acquire(tried)
+            if backend is None:
+                raise self._final_error(errors)
+
+            metrics.inc("llm_router_calls_total", backend=backend.name)
+            started, error = time.monotonic(), None
+            try:
+                return await backend.client.ainvoke(messages, **kwargs)
+            except asyncio.CancelledError:
+                error = asyncio.TimeoutError()  # Caller's timeout: counts against this backend
+                raise
+            except Exception as e:
+                error = e
+                errors.append(e)
+                tried.add(backend.name)
+                metrics.inc("llm_router_fallbacks_total", backend=backend.name)
+            finally:
+                self._release(backend, started, error)
+
+    # ─────────────────────────────
+    # SYNC
+    # ─────────────────────────────
+    def invoke(self, messages, **kwargs):
+        tried, errors = set(), []
+        while True:
+            with self._cond:
+                backend, busy = self._try_acquire(tried)
+                if busy:
+                    metrics.inc("llm_router_waits_total")
+                while busy:
+                    self._cond.wait(0.1)
+                    backend, busy = self._try_acquire(tried)
+            if backend is None:
+                raise self._final_error(errors)
+
+            metrics.inc("llm_router_calls_total", backend=backend.name)
+            started, error = time.monotonic(), None
+            try:
+                return backend.client.invoke(messages, **kwargs)
+            except Exception as e:
+                error = e
+                errors.append(e)
+                tried.add(backend.name)
+                metrics.inc("llm_router_fallbacks_total", backend=backend.name)
+            finally:
+                self._release(backend, started, error)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class OptionFilter:
+    """A chat client minus the invoke() options its provider does not accept."""
+
+    def __init__(self, client, dropped=OPENAI_ONLY_OPTIONS):
+        self.client = client
+        self.dropped = dropped
+
+    def _options(self, kwargs):
+        return {k: v for k, v in kwargs.items() if k not in self.dropped}
+
+    def invoke(self, messages, **kwargs):
+        return self.client.invoke(messages, **self._options(kwargs))
+
+    async def ainvoke(self, messages, **kwargs):
+        return await self.client.ainvoke(messages, **self._options(kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+# ─────────────────────────────────────────────
+# CONFIGURATION
+# ─────────────────────────────────────────────
+def parse_providers(spec):
+    """[(provider, model, max_concurrency, weight, cost)] from an LLM_PROVIDERS string."""
+    defaults = {"openai": os.getenv("LLM_MODEL", "gpt-4o-mini"), "google": "gemini-2.0-flash"}
+    providers = []
+    for entry in spec.split(","):
+        fields = entry.strip().split(":")
+        if not fields[0]:
+            continue
+        provider = fields[0].lower()
+        if provider not in defaults:
+            raise ValueError(f"Unknown LLM provider '{provider}' (use openai or google)")
+        model = fields[1] if len(fields) > 1 and fields[1] else defaults[provider]
+        max_concurrency = int(fields[2]) if len(fields) > 2 else 8
+        weight = float(fields[3]) if len(fields) > 3 else 1.0
+        cost = float(fields[4]) if len(fields) > 4 else 0.0
+        providers.append((provider, model, max_concurrency, weight, cost))
+    return providers
+
+
+def build_client(provider, model, max_retries=None):
+    """A LangChain chat client for one provider (imports it lazily)."""
+    options = {} if max_retries is None else {"max_retries": max_retries}
+    if provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return OptionFilter(ChatGoogleGenerativeAI(
+            model=model,
+            temperature=0.2,
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            **options
+        ))
+
+    from langchain_openai import ChatOpenAI
+    # LLM_BASE_URL points the client at any OpenAI-compatible endpoint,
+    # e.g. the local mock server (python -m src.mock_llm_server)
+    if os.getenv("LLM_BASE_URL"):
+        options["base_url"] = os.getenv("LLM_BASE_URL")
+    return ChatOpenAI(
+        model=model,
+        temperature=0.2,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        **options
+    )
+
+
+def from_env():
+    """
+    The decision client from LLM_PROVIDERS (default: openai with LLM_MODEL):
+    one provider gives its (resilient) client as before, several an LLMRouter.
+    """
+    # Retries live in the resilience layer (LLM_RESILIENCE=0 restores the client's own)
+    resilient = os.getenv("LLM_RESILIENCE", "1") == "1"
+    max_retries = None
+    if os.getenv("LLM_MAX_RETRIES") or resilient:
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", "0"))
+
+    providers = parse_providers(os.getenv("LLM_PROVIDERS", "openai"))
+    backends = []
+    for n, (provider, model, max_concurrency, weight, cost) in enumerate(providers):
+        names = [b.name for b in backends]
+        name = provider if provider not in names else f"{provider}-{n}"
+        client = build_client(provider, model, max_retries)
+        if resilient:
+            # A single provider keeps the breaker name "llm"
+            client = resilience.from_env(client, name=name if len(providers) > 1 else "llm")
+        backends.append(Backend(name, client, max_concurrency, weight, cost))
+
+    if len(backends) == 1:
+        return backends[0].client
+    return LLMRouter(backends)
@@ -1,3 +1,8 @@
+from functools import lru_cache
+
+import numpy as np
+
+
 class StrategyMemory:
     def __init__(self):
         """
@@ -11,6 +16,11 @@ class StrategyMemory:
         """
         self.registry = {}
         self.learning_logs = []
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """Register an object whose invalidate(key) runs after every update (e.g. DecisionCache)."""
+        self.listeners.append(listener)
 
     def _get_key(self, customer):
         """Key based on lifecycle stage + persona name (demo-friendly)."""
@@ -38,6 +48,49 @@ class StrategyMemory:
         self.learning_logs.append(log_entry)
         print(f"🧠 MEMORY UPDATED: {log_entry}")
 
+        for listener in self.listeners:
+            listener.invalidate(key)
+
+    def strategies(self, key):
+        """{action: {"SUCCESS": n, "FAILED": n}} for one registry key ({} if unseen)."""
+        return self.registry.get(key, {})
+
+    def snapshot(self):
+        """Deep copy of the registry counts (used to diff a worker's learnings)."""
+        return {
+            key: {action: dict(stats) for action, stats in strategies.items()}
+            for key, strategies in self.registry.items()
+        }
+
+    def diff(self, baseline):
+        """Counts learned since baseline (a snapshot()), in snapshot() format."""
+        delta = {}
+        for key, strategies in self.snapshot().items():
+            for action, stats in strategies.items():
+                before = baseline.get(key, {}).get(action, {"SUCCESS": 0, "FAILED": 0})
+                change = {s: stats[s] - before[s] for s in ("SUCCESS", "FAILED")}
+                if change["SUCCESS"] or change["FAILED"]:
+                    delta.setdefault(key, {})[action] = change
+        return delta
+
+    def merge(self, delta):
+        """Adds counts learned elsewhere (e.g. another process) into this registry."""
+        for key, strategies in delta.items():
+            if isinstance(key, tuple):  # (stage, persona) from CompactStrategyMemory.snapshot()
+                key = "_".join(key)
+            for action, change in strategies.items():
+                stats = self.registry.setdefault(key, {}).setdefault(
+                    action, {"SUCCESS": 0, "FAILED": 0}
+                )
+                stats["SUCCESS"] += change["SUCCESS"]
+                stats["FAILED"] += change["FAILED"]
+                self.learning_logs.append(
+                    f"Merged: {action} (+S:{change['SUCCESS']}, +F:{change['FAILED']}) for {key}"
+                )
+
+            for listener in self.listeners:
+                listener.invalidate(key)
+
     def get_forbidden_actions(self, customer):
         """
         An action becomes forbidden if it has FAILED at least once.
@@ -70,3 +123,227 @@ class StrategyMemory:
             return "Previously successful: " + ", ".join(successes)
 
         return "No successful strategies yet."
+
+
+
+# ─────────────────────────────────────────────
+# COMPACT BACKEND (large populations)
+# ─────────────────────────────────────────────
+SUCCESS, FAILED = 0, 1
+STATUS_INDEX = {"SUCCESS": SUCCESS, "FAILED": FAILED}
+
+
+@lru_cache(maxsize=65536)
+def _persona_of(name):
+    return name.split()[-1]  # Sam, Clara, Betty
+
+
+class CompactStrategyMemory(StrategyMemory):
+    """
+    Same public API as StrategyMemory, backed by arrays.
+
+    (lifecycle_stage, persona) keys are interned to integer ids and the
+    SUCCESS/FAILED counts live in one int32 array indexed by
+    (key_id, action_id, status). Each key also keeps a bitmask of its
+    forbidden actions, updated on update(), so get_forbidden_actions is
+    a single array read. `registry` is still available as the familiar
+    nested dict, built on demand.
+
+    For very large runs, pass keep_logs=False / verbose=False to skip the
+    per-update log string and print.
+    """
+
+    def __init__(self, keep_logs=True, verbose=True, capacity=64):
+        self.learning_logs = []
+        self.listeners = []
+        self.keep_logs = keep_logs
+        self.verbose = verbose
+
+        self._key_ids = {}        # (stage, persona) -> key id
+        self._key_names = []      # key id -> "Stage_Persona"
+        self._key_pairs = []      # key id -> (stage, persona)
+        self._key_by_name = {}    # "Stage_Persona" -> key id
+        self.actions = []         # action id -> action name
+        self._action_ids = {}
+        self._counts = np.zeros((capacity, 8, 2), dtype=np.int32)
+        self._forbidden = np.zeros(capacity, dtype=np.uint64)  # Bit i = action id i forbidden
+        self._mask_actions = {0: ()}
+
+    # ─────────────────────────────
+    # INTERNING
+    # ─────────────────────────────
+    def _get_key(self, customer):
+        key_id = self._key_id(customer, create=False)
+        if key_id is not None:
+            return self._key_names[key_id]
+        return f"{customer['lifecycle_stage']}_{_persona_of(customer['name'])}"
+
+    def _key_id(self, customer, create=True):
+        pair = (customer["lifecycle_stage"], _persona_of(customer["name"]))
+        key_id = self._key_ids.get(pair)
+        if key_id is None and create:
+            key_id = self._intern_key(*pair)
+        return key_id
+
+    def _intern_key(self, stage, persona):
+        key_id = len(self._key_names)
+        self._key_ids[(stage, persona)] = key_id
+        self._key_names.append(f"{stage}_{persona}")
+        self._key_pairs.append((stage, persona))
+        self._key_by_name[self._key_names[key_id]] = key_id
+
+        if key_id >= len(self._counts):
+            grow = len(self._counts)
+            self._counts = np.concatenate([self._counts, np.zeros_like(self._counts[:grow])])
+            self._forbidden = np.concatenate([self._forbidden, np.zeros(grow, dtype=np.uint64)])
+        return key_id
+
+    def _lookup_key(self, key):
+        """Key id for a (stage, persona) pair or a "Stage_Persona" name (None if unknown)."""
+        if isinstance(key, tuple):
+            return self._key_ids.get(key)
+        return self._key_by_name.get(key)
+
+    def _action_id(self, action):
+        action_id = self._action_ids.get(action)
+        if action_id is None:
+            action_id = len(self.actions)
+            if action_id >= 64:
+                raise ValueError("CompactStrategyMemory supports at most 64 distinct actions")
+            self.actions.append(action)
+            self._action_ids[action] = action_id
+            if action_id >= self._counts.shape[1]:
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)], axis=1)
+        return action_id
+
+    # ─────────────────────────────
+    # LEARNING
+    # ─────────────────────────────
+    def update(self, customer, action, status):
+        """Accumulates learning instead of overwriting it."""
+        key_id = self._key_id(customer)
+        action_id = self._action_id(action)
+        self._record(key_id, action_id, STATUS_INDEX[status], 1)
+
+        key = self._key_names[key_id]
+        if self.keep_logs or self.verbose:
+            stats = self._counts[key_id, action_id]
+            log_entry = (
+                f"Learned: {action} → {status} "
+                f"(S:{stats[SUCCESS]}, F:{stats[FAILED]}) "
+                f"for {key}"
+            )
+            if self.keep_logs:
+                self.learning_logs.append(log_entry)
+            if self.verbose:
+                print(f"🧠 MEMORY UPDATED: {log_entry}")
+
+        for listener in self.listeners:
+            listener.invalidate(key)
+
+    def _record(self, key_id, action_id, status_index, amount):
+        self._counts[key_id, action_id, status_index] += amount
+        if self._counts[key_id, action_id, FAILED] >= 1:
+            self._forbidden[key_id] |= np.uint64(1) << np.uint64(action_id)
+
+    def merge(self, delta):
+        """
+        Adds counts learned elsewhere (e.g. another process) into this registry.
+        delta keys are (stage, persona) pairs (snapshot() / diff()) or
+        "Stage_Persona" names; a name this memory has not seen yet (e.g. from
+        memory.json) is split at its last "_".
+        """
+        for key, strategies in delta.items():
+            key_id = self._lookup_key(key)
+            if key_id is None:
+                key_id = self._intern_key(*(key if isinstance(key, tuple) else key.rsplit("_", 1)))
+            key = self._key_names[key_id]
+
+            for action, change in strategies.items():
+                action_id = self._action_id(action)
+                self._record(key_id, action_id, SUCCESS, change["SUCCESS"])
+                self._record(key_id, action_id, FAILED, change["FAILED"])
+                if self.keep_logs:
+                    self.learning_logs.append(
+                        f"Merged: {action} (+S:{change['SUCCESS']}, +F:{change['FAILED']}) for {key}"
+                    )
+
+            for listener in self.listeners:
+                listener.invalidate(key)
+
+    # ─────────────────────────────
+    # LOOKUPS
+    # ─────────────────────────────
+    def get_forbidden_actions(self, customer):
+        """An action becomes forbidden if it has FAILED at least once."""
+        key_id = self._key_id(customer, create=False)
+        if key_id is None:
+            return []
+
+        mask = int(self._forbidden[key_id])
+        actions = self._mask_actions.get(mask)
+        if actions is None:
+            actions = tuple(a for i, a in enumerate(self.actions) if mask >> i & 1)
+            self._mask_actions[mask] = actions
+        return list(actions)
+
+    def get_success_hints(self, customer):
+        """Returns successful strategies as human-readable hints."""
+        key_id = self._key_id(customer, create=False)
+        if key_id is None:
+            return "No prior learnings for this persona."
+
+        successes = [
+            f"{self.actions[i]} (x{count})"
+            for i, count in enumerate(self._counts[key_id, :len(self.actions), SUCCESS].tolist())
+            if count > 0
+        ]
+
+        if successes:
+            return "Previously successful: " + ", ".join(successes)
+
+        return "No successful strategies yet."
+
+    # ─────────────────────────────
+    # DICT VIEW (app sidebar, snapshots, JSON export)
+    # ─────────────────────────────
+    def strategies(self, key):
+        key_id = self._lookup_key(key)
+        if key_id is None:
+            return {}
+        counts = self._counts[key_id, :len(self.actions)]
+        return {
+            action: {"SUCCESS": int(counts[a, SUCCESS]), "FAILED": int(counts[a, FAILED])}
+            for a, action in enumerate(self.actions) if counts[a].any()
+        }
+
+    def _nested(self, keys):
+        """Nested count dict with keys[key_id] as the outer key."""
+        nested = {}
+        counts = self._counts[:len(self._key_names), :len(self.actions)]
+        for key_id, action_id in zip(*np.nonzero(counts.sum(axis=2))):
+            stats = counts[key_id, action_id]
+            nested.setdefault(keys[key_id], {})[self.actions[action_id]] = {
+                "SUCCESS": int(stats[SUCCESS]), "FAILED": int(stats[FAILED])
+            }
+        return nested
+
+    def snapshot(self):
+        """Like StrategyMemory.snapshot, keyed by (stage, persona) so merge() never splits names."""
+        return self._nested(self._key_pairs)
+
+    @property
+    def registry(self):
+        return self._nested(self._key_names)
+
+    @registry.setter
+    def registry(self, registry):
+        self._key_ids.clear()
+        self._key_names.clear()
+        self._key_pairs.clear()
+        self._key_by_name.clear()
+        self._counts[:] = 0
+        self._forbidden[:] = 0
+        self.merge(registry)
+        if self.keep_logs:
+            self.learning_logs.clear()
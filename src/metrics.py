@@ -0,0 +1,218 @@
+"""
+Lightweight hot-path metrics for the day loop.
+
+Off by default. Enable with METRICS_ENABLED=1 (read at import) or
+metrics.enable(); while disabled every hook is a single bool check and
+span() hands back one shared no-op context manager.
+
+    with metrics.span("decide"):
+        ...
+    metrics.inc("decision_fallbacks_total", reason="exception")
+
+Recorded:
+    stage_seconds{stage=...}            histogram per loop stage
+    llm_calls_total{mode=...}           single / batch requests
+    llm_seconds{mode=...}               histogram of LLM round trips
+    llm_prompt_tokens / llm_response_tokens  histograms (usage metadata when
+                                        the client reports it, else chars / 4)
+    llm_cached_prompt_tokens            prompt-prefix cache hits, when reported
+    prompt_tokens{part=prefix|context}  estimated size of every built prompt
+    decision_fallbacks_total{reason=...} invalid_action / exception
+
+Export in Prometheus text format with export_text(), write_file(path)
+or serve(port) (GET /metrics).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGE_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+enabled = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> Histogram
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+# ─────────────────────────────────────────────
+# PRIMITIVES
+# ─────────────────────────────────────────────
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def inc(name, amount=1, **labels):
+    if not enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, buckets=STAGE_BUCKETS, **labels):
+    if not enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe("stage_seconds", time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage):
+    """Context manager timing one stage into stage_seconds{stage=...}."""
+    return _Span(stage) if enabled else _NO_SPAN
+
+
+# ─────────────────────────────────────────────
+# DECISION AGENT HOOKS
+# ─────────────────────────────────────────────
+def record_llm_call(mode, prompt, response, seconds):
+    """One LLM round trip: count, latency and prompt / response token sizes."""
+    if not enabled:
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    content = getattr(response, "content", "") or ""
+    inc("llm_calls_total", mode=mode)
+    observe("llm_seconds", seconds, mode=mode)
+    observe("llm_prompt_tokens", usage.get("input_tokens") or len(prompt) // 4, TOKEN_BUCKETS, mode=mode)
+    observe("llm_response_tokens", usage.get("output_tokens") or len(content) // 4, TOKEN_BUCKETS, mode=mode)
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached is not None:
+        observe("llm_cached_prompt_tokens", cached, TOKEN_BUCKETS, mode=mode)
+
+
+def record_fallback(reason):
+    inc("decision_fallbacks_total", reason=reason)
+
+
+# ─────────────────────────────────────────────
+# EXPORT
+# ─────────────────────────────────────────────
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def export_text():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+        snapshots = [(key, h.buckets, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), buckets, counts, total, count in snapshots:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path):
+    """Write export_text() atomically (e.g. for node_exporter's textfile collector)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(export_text())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = export_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+_server = None
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics on a background thread (once per process)."""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
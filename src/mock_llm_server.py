@@ -0,0 +1,233 @@
+"""
+Local OpenAI-compatible stand-in server for load testing decision_agent.
+
+Serves POST /v1/chat/completions with valid {"thought", "action"} JSON
+chosen from the actions allowed in the prompt (batched prompts get
+{"decisions": [...]}), after a delay drawn from a configurable latency distribution. It
+can also inject server errors, 429 rate-limit responses and malformed
+replies, so the concurrency, caching, retry and repair paths can be
+stress-tested offline.
+
+    python -m src.mock_llm_server --port 8011 --latency lognormal:-1.2,0.5 \\
+        --error-rate 0.01 --rate-limit-rate 0.02 --malformed-rate 0.05 --max-rps 200
+
+Point the app / batch runner at it:
+
+    LLM_BASE_URL=http://127.0.0.1:8011/v1 OPENAI_API_KEY=mock python -m src.batch_runner ...
+
+GET /stats returns request / error / rate-limit counters.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.stub_llm import choose_reply, malform
+
+
+# ─────────────────────────────────────────────
+# LATENCY DISTRIBUTIONS
+# ─────────────────────────────────────────────
+def parse_latency(spec):
+    """
+    "constant:0.2", "uniform:0.1,0.5", "normal:0.3,0.05",
+    "lognormal:mu,sigma" (of ln seconds), "exponential:mean".
+    Returns a function rng -> seconds (never negative).
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+
+    samplers = {
+        "constant": lambda rng: values[0],
+        "uniform": lambda rng: rng.uniform(values[0], values[1]),
+        "normal": lambda rng: rng.gauss(values[0], values[1]),
+        "lognormal": lambda rng: rng.lognormvariate(values[0], values[1]),
+        "exponential": lambda rng: rng.expovariate(1.0 / values[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution '{kind}' (use one of {sorted(samplers)})")
+    sample = samplers[kind]
+    return lambda rng: max(0.0, sample(rng))
+
+
+class TokenBucket:
+    """Requests-per-second cap; take() is False when the bucket is empty."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+# ─────────────────────────────────────────────
+# SERVER
+# ─────────────────────────────────────────────
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency="constant:0", error_rate=0.0,
+                 rate_limit_rate=0.0, max_rps=None, seed=None, malformed_rate=0.0):
+        super().__init__(address, MockLLMHandler)
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.bucket = TokenBucket(max_rps) if max_rps else None
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "malformed": 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, field):
+        with self.stats_lock:
+            self.stats[field] += 1
+
+    def draw(self):
+        """(latency seconds, fault) for one request; fault is None, "error" or "rate_limit"."""
+        with self.rng_lock:
+            latency = self.sample_latency(self.rng)
+            roll = self.rng.random()
+        if self.bucket is not None and not self.bucket.take():
+            return 0.0, "rate_limit"
+        if roll < self.rate_limit_rate:
+            return 0.0, "rate_limit"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, "error"
+        return latency, None
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            return self._send(200, {"object": "list", "data": [{"id": "mock-gpt", "object": "model"}]})
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.server.stats_lock:
+                return self._send(200, dict(self.server.stats))
+        self._send(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+        server = self.server
+        server.count("requests")
+        latency, fault = server.draw()
+
+        if fault == "rate_limit":
+            server.count("rate_limited")
+            return self._send(
+                429,
+                {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}},
+                headers={"Retry-After": "1"},
+            )
+
+        time.sleep(latency)
+        if fault == "error":
+            server.count("errors")
+            return self._send(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+
+        prompt = "\n".join(
+            m.get("content", "") if isinstance(m.get("content"), str) else ""
+            for m in body.get("messages", [])
+        )
+        with server.rng_lock:
+            content = choose_reply(prompt, server.rng)
+            if server.malformed_rate and server.rng.random() < server.malformed_rate:
+                content = malform(content, server.rng)
+                server.count("malformed")
+
+        server.count("ok")
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self._send(200, {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock-gpt"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client gave up (timeout, cancelled hedge)
+
+
+def serve(host="127.0.0.1", port=8011, **options):
+    """Start the server on a background thread; returns it (call .shutdown() to stop)."""
+    server = MockLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for decision_agent load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", default="constant:0", help="e.g. constant:0.2, uniform:0.1,0.5, lognormal:-1.2,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of replies that are broken JSON or prose")
+    parser.add_argument("--max-rps", type=float, help="Requests per second before 429s")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(
+        (args.host, args.port),
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        max_rps=args.max_rps,
+        seed=args.seed,
+        malformed_rate=args.malformed_rate,
+    )
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Monte Carlo policy evaluation.
+
+Runs R independent multi-day replicas of the OODA loop
+(simulate_time_step -> policy -> evaluate_outcome, with learning) on a
+process pool and reports how a decision policy performs on average:
+churn rate, mean engagement trajectory, discount spend and per-segment
+outcomes, each with a 95% confidence interval.
+
+    python -m src.monte_carlo --policy rules --days 30 --copies 20 --max-replicas 500 --workers 8
+
+Replica r draws from its own per-customer streams (src/rng.py, root seed
+derived from --seed and r), so results do not depend on --workers.
+Replicas are consumed in order and evaluation stops early once every
+tracked estimate's CI half-width is within tolerance.
+
+Policies are functions policy(customer, memory, rng) -> action name:
+"rules" (hard rules + memory, first allowed action, no LLM), "random"
+(uniform over allowed actions), "llm" (decision_agent), or any
+"package.module:function".
+"""
+import argparse
+import copy
+import importlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.rng import DayStreams, GOLDEN, MASK64, splitmix64
+
+# Two-sided 95% Student t critical values by degrees of freedom (1.96 beyond)
+T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+# ─────────────────────────────────────────────
+# POLICIES
+# ─────────────────────────────────────────────
+def rules_policy(customer, memory, rng):
+    """Hard rules and learned forbidden actions, then the first allowed action."""
+    from src.agents import plan_decision
+
+    decision, allowed, _ = plan_decision(customer, memory)
+    return decision["action"] if decision is not None else allowed[0]
+
+
+def random_policy(customer, memory, rng):
+    """Uniform over the actions the rules allow."""
+    from src.agents import plan_decision
+
+    decision, allowed, _ = plan_decision(customer, memory)
+    return decision["action"] if decision is not None else rng.choice(allowed)
+
+
+def llm_policy(customer, memory, rng):
+    """The real decision_agent (one LLM call per undecided customer)."""
+    from src.agents import decision_agent
+
+    return decision_agent(customer, memory)["action"]
+
+
+POLICIES = {"rules": rules_policy, "random": random_policy, "llm": llm_policy}
+
+
+def resolve_policy(name):
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, function = name.partition(":")
+    if not function:
+        raise ValueError(f"Unknown policy '{name}' (use {sorted(POLICIES)} or 'module:function')")
+    return getattr(importlib.import_module(module), function)
+
+
+# ─────────────────────────────────────────────
+# ONE REPLICA (worker process)
+# ─────────────────────────────────────────────
+def replica_seed(root_seed, replica):
+    return splitmix64((root_seed + (replica + 1) * GOLDEN) & MASK64)
+
+
+def run_replica(customers, days, policy_name, root_seed, replica):
+    """
+    Runs one independent replica and returns its metrics:
+    {"metrics": {name: float}, "trajectory": [mean engagement per day]}.
+    """
+    from src.memory_store import CompactStrategyMemory
+    from src.simulation import evaluate_outcome, simulate_time_step
+
+    policy = resolve_policy(policy_name)
+    customers = copy.deepcopy(customers)
+    memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    seed = replica_seed(root_seed, replica)
+    start_discounts = [c["discount_count"] for c in customers]
+
+    trajectory = []
+    for day in range(1, days + 1):
+        streams = DayStreams(seed, day)
+        active = [c for c in customers if c.get("status") != "Churned"]
+        rngs = [streams.for_customer(c["id"]) for c in active]
+        for customer, rng in zip(active, rngs):
+            simulate_time_step(customer, rng)
+        # Decide for everyone on the morning's memory, then act + learn
+        actions = [policy(customer, memory, rng) for customer, rng in zip(active, rngs)]
+        for customer, action in zip(active, actions):
+            evaluate_outcome(customer, action, memory)
+        trajectory.append(sum(c["engagement_score"] for c in customers) / len(customers))
+
+    metrics = _outcomes("", customers, start_discounts)
+    segments = {}
+    for customer, discounts in zip(customers, start_discounts):
+        members, starts = segments.setdefault(customer.get("segment", ""), ([], []))
+        members.append(customer)
+        starts.append(discounts)
+    for segment, (members, discounts) in sorted(segments.items()):
+        metrics.update(_outcomes(f"segment.{segment}.", members, discounts))
+
+    return {"metrics": metrics, "trajectory": trajectory}
+
+
+def _outcomes(prefix, customers, start_discounts):
+    n = len(customers)
+    churned = sum(1 for c in customers if c.get("status") == "Churned")
+    spend = sum(c["discount_count"] - d for c, d in zip(customers, start_discounts))
+    return {
+        f"{prefix}churn_rate": churned / n,
+        f"{prefix}final_engagement": sum(c["engagement_score"] for c in customers) / n,
+        f"{prefix}discount_spend": spend / n,  # discounts sent per customer
+    }
+
+
+# ─────────────────────────────────────────────
+# AGGREGATION
+# ─────────────────────────────────────────────
+class RunningStats:
+    """Welford mean / variance over scalars or equally shaped NumPy arrays."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        self.n += 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.n
+        self._m2 = self._m2 + delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else np.zeros_like(self.mean)
+
+    def half_width(self):
+        """95% confidence interval half-width of the mean."""
+        if self.n < 2:
+            return np.full_like(np.asarray(self.mean, dtype=np.float64), math.inf)
+        t = T95[self.n - 2] if self.n - 1 <= len(T95) else 1.96
+        return t * self.std / math.sqrt(self.n)
+
+    def summary(self):
+        half = self.half_width()
+        mean = np.asarray(self.mean)
+        return {
+            "mean": mean.tolist(),
+            "std": np.asarray(self.std).tolist(),
+            "ci_low": (mean - half).tolist(),
+            "ci_high": (mean + half).tolist(),
+        }
+
+
+def converged(stats, tolerance, relative_tolerance):
+    """Every CI half-width <= max(tolerance, relative_tolerance * |mean|)."""
+    for s in stats:
+        limit = np.maximum(tolerance, relative_tolerance * np.abs(s.mean))
+        if not np.all(s.half_width() <= limit):
+            return False
+    return True
+
+
+# ─────────────────────────────────────────────
+# DRIVER
+# ─────────────────────────────────────────────
+def evaluate_policy(customers, policy="rules", days=30, max_replicas=200, min_replicas=20,
+                    tolerance=0.01, relative_tolerance=0.01, workers=1, seed=0):
+    """
+    Runs replicas until every estimate is stable (or max_replicas) and
+    returns the aggregated report. Convergence is checked on the overall
+    churn rate, final engagement, discount spend and the engagement
+    trajectory; per-segment estimates are reported but not waited on.
+    """
+    resolve_policy(policy)  # Fail fast on a bad name
+    metric_stats = {}
+    trajectory = RunningStats()
+    stopped_early = False
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        pending = {}
+        next_replica = 0
+
+        def submit():
+            nonlocal next_replica
+            args = (customers, days, policy, seed, next_replica)
+            pending[next_replica] = run_replica(*args) if pool is None else pool.submit(run_replica, *args)
+            next_replica += 1
+
+        for _ in range(min(max_replicas, max(1, workers) * 2)):
+            submit()
+
+        done = 0
+        while done < max_replicas:
+            result = pending.pop(done)
+            if pool is not None:
+                result = result.result()
+            done += 1
+
+            for name, value in result["metrics"].items():
+                metric_stats.setdefault(name, RunningStats()).add(value)
+            trajectory.add(result["trajectory"])
+
+            tracked = [metric_stats[n] for n in ("churn_rate", "final_engagement", "discount_spend")]
+            if done >= min_replicas and converged(tracked + [trajectory], tolerance, relative_tolerance):
+                stopped_early = done < max_replicas
+                break
+            if next_replica < max_replicas:
+                submit()
+    finally:
+        if pool is not None:
+            for future in pending.values():
+                future.cancel()
+            pool.shutdown(cancel_futures=True)
+
+    overall = {n: s.summary() for n, s in metric_stats.items() if not n.startswith("segment.")}
+    segments = {}
+    for name, s in metric_stats.items():
+        if name.startswith("segment."):
+            _, segment, metric = name.split(".", 2)
+            segments.setdefault(segment, {})[metric] = s.summary()
+
+    return {
+        "policy": policy,
+        "days": days,
+        "customers": len(customers),
+        "replicas": done,
+        "stopped_early": stopped_early,
+        "metrics": overall,
+        "segments": segments,
+        "engagement_trajectory": trajectory.summary(),
+    }
+
+
+def main(argv=None):
+    from src.batch_runner import load_customers
+
+    parser = argparse.ArgumentParser(description="Monte Carlo evaluation of a decision policy.")
+    parser.add_argument("--policy", default="rules", help="rules, random, llm or module:function")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--customers", help="JSON file with a list of customer dicts (default: personas)")
+    parser.add_argument("--copies", type=int, default=1, help="Replicate the population this many times")
+    parser.add_argument("--max-replicas", type=int, default=200)
+    parser.add_argument("--min-replicas", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Absolute CI half-width target")
+    parser.add_argument("--relative-tolerance", type=float, default=0.01, help="CI half-width target relative to the mean")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    customers = load_customers(args.customers, args.copies)
+    report = evaluate_policy(
+        customers, args.policy, args.days, args.max_replicas, args.min_replicas,
+        args.tolerance, args.relative_tolerance, args.workers, args.seed
+    )
+
+    print(f"Policy {report['policy']}: {report['replicas']} replicas"
+          f"{' (converged early)' if report['stopped_early'] else ''}")
+    for name, s in report["metrics"].items():
+        print(f"  {name:<18} {s['mean']:.4f}  [{s['ci_low']:.4f}, {s['ci_high']:.4f}]")
+    for segment, metrics in report["segments"].items():
+        churn = metrics["churn_rate"]
+        print(f"  {segment:<18} churn {churn['mean']:.3f}  [{churn['ci_low']:.3f}, {churn['ci_high']:.3f}]")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
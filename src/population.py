@@ -0,0 +1,250 @@
+import random
+
+import numpy as np
+
+from src.rng import DayStreams, customer_keys
+
+# ─────────────────────────────────────────────
+# CODE TABLES
+# ─────────────────────────────────────────────
+# Same order as src.agents.ACTIONS, so codes line up with decision output.
+ACTIONS = ["SEND_DISCOUNT", "SEND_TUTORIAL", "ASK_INTEREST", "DO_NOTHING"]
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+NO_ACTION = -1
+
+SEND_DISCOUNT = ACTION_CODES["SEND_DISCOUNT"]
+SEND_TUTORIAL = ACTION_CODES["SEND_TUTORIAL"]
+ASK_INTEREST = ACTION_CODES["ASK_INTEREST"]
+DO_NOTHING = ACTION_CODES["DO_NOTHING"]
+
+# Same order as the choices in simulate_time_step, so seeded draws match.
+ACTIVITY_EVENTS = ["Login", "Feature Use", "Search"]
+NO_EVENT = -1
+
+STATUS_ACTIVE = 0
+STATUS_CHURNED = 1
+STATUSES = ["Active", "Churned"]
+
+
+class Population:
+    """
+    Columnar (NumPy) view of many customers.
+
+    Holds the numeric state that simulate_time_step / evaluate_outcome
+    touch as one array per field, and applies a whole day to every row at
+    once. Free-text fields (history, action_history) are not kept here;
+    use write_back() to push the columns into the customer dicts.
+    """
+
+    def __init__(self, size):
+        self.ids = [None] * size
+        self.names = [None] * size
+        self.engagement_score = np.zeros(size, dtype=np.int64)
+        self.time_since_last_event = np.zeros(size, dtype=np.int64)
+        self.discount_count = np.zeros(size, dtype=np.int64)
+        self.not_interested_count = np.zeros(size, dtype=np.int64)
+        self.discount_sensitivity = np.zeros(size, dtype=np.float64)
+        self.content_sensitivity = np.zeros(size, dtype=np.float64)
+        self.status = np.full(size, STATUS_ACTIVE, dtype=np.int8)
+        self.lifecycle_stage = np.zeros(size, dtype=np.int32)
+        self.last_action = np.full(size, NO_ACTION, dtype=np.int8)
+
+        # Lifecycle stages are interned to small ints ("Churned" is always present)
+        self.stages = ["Churned"]
+        self._stage_codes = {"Churned": 0}
+
+    def __len__(self):
+        return len(self.engagement_score)
+
+    # ─────────────────────────────
+    # CONVERSION
+    # ─────────────────────────────
+    @classmethod
+    def from_customers(cls, customers):
+        """Build the columns from a list of customer dicts (data/customer.py schema)."""
+        population = cls(len(customers))
+
+        for i, customer in enumerate(customers):
+            population.ids[i] = customer.get("id")
+            population.names[i] = customer["name"]
+            population.engagement_score[i] = customer["engagement_score"]
+            population.time_since_last_event[i] = customer["time_since_last_event"]
+            population.discount_count[i] = customer.get("discount_count", 0)
+            population.not_interested_count[i] = customer.get("not_interested_count", 0)
+            population.discount_sensitivity[i] = customer["sensitivity"]["discount"]
+            population.content_sensitivity[i] = customer["sensitivity"]["content"]
+            population.status[i] = (
+                STATUS_CHURNED if customer.get("status") == "Churned" else STATUS_ACTIVE
+            )
+            population.lifecycle_stage[i] = population.stage_code(customer["lifecycle_stage"])
+            population.last_action[i] = ACTION_CODES.get(customer.get("last_action"), NO_ACTION)
+
+        return population
+
+    def write_back(self, customers):
+        """Copy the column values back into the matching customer dicts."""
+        for i, customer in enumerate(customers):
+            customer["engagement_score"] = int(self.engagement_score[i])
+            customer["time_since_last_event"] = int(self.time_since_last_event[i])
+            customer["discount_count"] = int(self.discount_count[i])
+            customer["not_interested_count"] = int(self.not_interested_count[i])
+            customer["status"] = STATUSES[self.status[i]]
+            customer["lifecycle_stage"] = self.stages[self.lifecycle_stage[i]]
+            if self.last_action[i] != NO_ACTION:
+                customer["last_action"] = ACTIONS[self.last_action[i]]
+
+    def stage_code(self, stage):
+        """Intern a lifecycle stage name and return its code."""
+        code = self._stage_codes.get(stage)
+        if code is None:
+            code = len(self.stages)
+            self.stages.append(stage)
+            self._stage_codes[stage] = code
+        return code
+
+    def active_mask(self):
+        return self.status == STATUS_ACTIVE
+
+    # ─────────────────────────────
+    # ENVIRONMENT: TIME STEP
+    # ─────────────────────────────
+    def time_step(self, rng=None, mask=None):
+        """
+        Vectorized simulate_time_step over the rows selected by mask
+        (default: all non-churned rows, like the app.py day loop).
+
+        rng=None or a random.Random consumes draws in exactly the same
+        order as calling simulate_time_step row by row, so results match
+        the per-dict function for the same seed. A np.random.Generator
+        draws everything in bulk (fastest, but a different stream). A
+        src.rng.DayStreams draws each row from its own per-customer stream:
+        vectorized, independent of row order, and identical to
+        simulate_time_step(customer, streams.for_customer(id)).
+
+        Returns an int array of ACTIVITY_EVENTS codes (NO_EVENT = inactive).
+        """
+        if mask is None:
+            mask = self.active_mask()
+        rows = np.flatnonzero(mask)
+
+        self.time_since_last_event[rows] += 1
+        thresholds = self.engagement_score[rows] / 100.0
+
+        if isinstance(rng, DayStreams):
+            seeds = rng.seeds(self.rng_keys()[rows])
+            active = rng.uniforms(None, 0, seeds) < thresholds
+            choices = (rng.uniforms(None, 1, seeds) * len(ACTIVITY_EVENTS)).astype(np.int8)
+        elif isinstance(rng, np.random.Generator):
+            active = rng.random(len(rows)) < thresholds
+            choices = rng.integers(0, len(ACTIVITY_EVENTS), size=len(rows))
+        else:
+            active, choices = _sequential_draws(rng or random, thresholds)
+
+        events = np.full(len(self), NO_EVENT, dtype=np.int8)
+        active_rows = rows[active]
+        events[active_rows] = choices[active]
+        self.time_since_last_event[active_rows] = 0  # Reset on activity
+
+        return events
+
+    # ─────────────────────────────
+    # ENVIRONMENT: ACTION OUTCOMES
+    # ─────────────────────────────
+    def apply_actions(self, actions, memory=None):
+        """
+        Vectorized evaluate_outcome.
+
+        actions: one action per row, either codes (NO_ACTION = skip the
+        row) or action names (None = skip). Returns the impact array.
+        If memory is given, every non-DO_NOTHING outcome is recorded via
+        memory.update, in row order, same as the per-dict function.
+        """
+        actions = encode_actions(actions)
+        acted = actions != NO_ACTION
+        impact = np.zeros(len(self), dtype=np.int64)
+
+        # SEND_DISCOUNT
+        discount = actions == SEND_DISCOUNT
+        self.discount_count[discount] += 1
+        impact[discount] = np.where(self.discount_sensitivity[discount] > 0.6, 8, -4)
+
+        # SEND_TUTORIAL
+        tutorial = actions == SEND_TUTORIAL
+        impact[tutorial] = np.where(self.content_sensitivity[tutorial] > 0.6, 6, -3)
+
+        # ASK_INTEREST
+        ask = actions == ASK_INTEREST
+        interested = self.engagement_score > 40
+        impact[ask] = np.where(interested[ask], 3, -5)
+        self.not_interested_count[ask & ~interested] += 1
+
+        # DO_NOTHING
+        idle = actions == DO_NOTHING
+        impact[idle] = -5 - self.time_since_last_event[idle]
+
+        # APPLY IMPACT
+        self.engagement_score[acted] = np.clip(
+            self.engagement_score[acted] + impact[acted], 0, 100
+        )
+
+        # Time handling
+        self.time_since_last_event[idle] += 1
+        self.time_since_last_event[acted & ~idle] = 0
+
+        # CHURN ELIMINATION
+        churned = acted & (self.not_interested_count >= 2)
+        self.status[churned] = STATUS_CHURNED
+        self.lifecycle_stage[churned] = self._stage_codes["Churned"]
+        impact[churned] = 0
+
+        # LEARNING
+        if memory is not None:
+            learned = np.flatnonzero(acted & ~idle)
+            for i in learned:
+                status = "SUCCESS" if impact[i] > 0 else "FAILED"
+                memory.update(self.customer_key(i), ACTIONS[actions[i]], status)
+
+        self.last_action[acted] = actions[acted]
+
+        return impact
+
+    def rng_keys(self):
+        """Per-row src.rng.customer_key of the ids (computed once)."""
+        if getattr(self, "_rng_keys", None) is None or len(self._rng_keys) != len(self):
+            self._rng_keys = customer_keys(self.ids)
+        return self._rng_keys
+
+    def customer_key(self, i):
+        """Minimal customer dict for StrategyMemory key lookups."""
+        return {
+            "id": self.ids[i],
+            "name": self.names[i],
+            "lifecycle_stage": self.stages[self.lifecycle_stage[i]],
+        }
+
+
+def encode_actions(actions):
+    """Turn a list of action names (or codes) into an int8 code array."""
+    if isinstance(actions, np.ndarray) and actions.dtype.kind in "iu":
+        return actions.astype(np.int8, copy=False)
+    return np.array(
+        [
+            a if isinstance(a, (int, np.integer)) else ACTION_CODES.get(a, NO_ACTION)
+            for a in actions
+        ],
+        dtype=np.int8,
+    )
+
+
+def _sequential_draws(draw, thresholds):
+    """Per-row random()/choice() pairs in simulate_time_step order."""
+    active = np.zeros(len(thresholds), dtype=bool)
+    choices = np.zeros(len(thresholds), dtype=np.int8)
+    event_codes = range(len(ACTIVITY_EVENTS))
+
+    for j, threshold in enumerate(thresholds.tolist()):
+        if draw.random() < threshold:
+            active[j] = True
+            choices[j] = draw.choice(event_codes)
+
+    return active, choices
@@ -0,0 +1,84 @@
+"""
+Bounded decision prompts.
+
+The decision prompts used to embed customer["action_history"] verbatim,
+so every simulated day made them a little longer. Here the history is
+replaced by a fixed-size summary (actions taken, counts over the kept
+window, the current streak and the last K actions), and every customer
+block is fitted to a token budget by shrinking K. Prompts put the static
+instructions first and the per-customer part last, so provider-side
+prefix caching can reuse the identical prefix across calls.
+
+Token counts are estimated as chars / 4 (as src.metrics does when the
+client reports no usage) and recorded per prompt:
+
+    prompt_tokens{part="prefix"|"context"}   histogram
+    prompt_compactions_total                 K reduced to fit the budget
+    prompt_over_budget_total                 still over budget at K = 0
+"""
+import os
+
+from src import metrics
+
+# Estimated tokens allowed for one customer's block (0 = no limit)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "400"))
+LAST_ACTIONS = (8, 4, 2, 0)  # K values tried, largest first
+
+
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def action_summary(actions, last_k=LAST_ACTIONS[0]):
+    """
+    One line describing an action history of any length, e.g.
+    "40 actions; last 32: ASK_INTEREST x3, DO_NOTHING x29; streak: DO_NOTHING x2; recent: ... -> DO_NOTHING".
+    """
+    total = getattr(actions, "appended", None)
+    kept = list(actions)
+    if total is None:
+        total = len(kept)
+    if not kept:
+        return "none yet"
+
+    counts = {}
+    for action in kept:
+        counts[action] = counts.get(action, 0) + 1
+    streak = 1
+    while streak < len(kept) and kept[-1 - streak] == kept[-1]:
+        streak += 1
+
+    window = "" if total == len(kept) else f"last {len(kept)}: "
+    parts = [
+        f"{total} actions",
+        window + ", ".join(f"{action} x{n}" for action, n in sorted(counts.items())),
+        f"streak: {kept[-1]} x{streak}",
+    ]
+    if last_k:
+        parts.append("recent: " + " -> ".join(kept[-last_k:]))
+    return "; ".join(parts)
+
+
+def fit_context(render, budget=None):
+    """
+    render(last_k) -> text for one customer; returns the largest-K
+    rendering within budget (estimated tokens).
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    for n, last_k in enumerate(LAST_ACTIONS):
+        text = render(last_k)
+        if not budget or estimate_tokens(text) <= budget:
+            if n:
+                metrics.inc("prompt_compactions_total")
+            return text
+    metrics.inc("prompt_over_budget_total")
+    return text
+
+
+def assemble(prefix, contexts):
+    """Static prefix first, then the per-customer blocks; records token counts."""
+    context = "".join(contexts)
+    if metrics.enabled:
+        metrics.observe("prompt_tokens", estimate_tokens(prefix), metrics.TOKEN_BUCKETS, part="prefix")
+        metrics.observe("prompt_tokens", estimate_tokens(context), metrics.TOKEN_BUCKETS, part="context")
+    return prefix + context
@@ -0,0 +1,338 @@
+"""
+Resilience layer around an LLM client.
+
+ResilientLLM wraps anything with invoke(messages, **kw) / ainvoke(...)
+(ChatOpenAI, StubLLM) and adds:
+
+- a deadline per call (all attempts together; the sync path waits on a
+  worker thread, so a hung request cannot stall the caller; once every
+  worker is stuck on an abandoned call, sync calls fail fast with
+  CircuitOpen instead of queueing behind them);
+- retries with jittered exponential backoff on rate limits (429, honoring
+  Retry-After) and transient errors (5xx, connection errors, timeouts);
+  other errors (bad request, auth) are raised at once;
+- optional hedging: if an attempt is still running after hedge_after
+  seconds ("auto" = rolling p95 latency) one duplicate request is sent
+  and the first reply wins;
+- a CircuitBreaker shared by all calls. After `failure_threshold`
+  consecutive failed calls it opens and calls fail fast with CircuitOpen
+  (agents then use the rules-only policy); after `cooldown` seconds one
+  probe call is let through (half-open) and its result closes or reopens
+  the breaker. Every state change is kept in breaker.transitions, counted
+  as llm_breaker_transitions_total{to=...} and, with log_path, appended
+  to a JSONL file.
+
+    llm = ResilientLLM(ChatOpenAI(max_retries=0), deadline=20, hedge_after="auto")
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+
+from src import metrics
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "InternalServerError", "ServiceUnavailableError", "TimeoutError"}
+
+
+class CircuitOpen(RuntimeError):
+    """The breaker is open: the provider is treated as down."""
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def classify(error):
+    """"rate_limit", "transient" or "fatal" for an exception from the client."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429 or type(error).__name__ == "RateLimitError":
+        return "rate_limit"
+    if (status is not None and status >= 500) or isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return "transient"
+    if type(error).__name__ in TRANSIENT_ERRORS:
+        return "transient"
+    return "fatal"
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header, if the error carries one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ─────────────────────────────────────────────
+# CIRCUIT BREAKER
+# ─────────────────────────────────────────────
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, cooldown=30.0, log_path=None, name="llm"):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.log_path = log_path
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.transitions = deque(maxlen=1000)
+        self._probe = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """May a call go out now? (Half-open lets exactly one probe through.)"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._move(HALF_OPEN, "cooldown elapsed")
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    @property
+    def available(self):
+        """False while open and cooling down (no call would be let through)."""
+        return self.state != OPEN or time.monotonic() - self.opened_at >= self.cooldown
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe = False
+            if self.state != CLOSED:
+                self._move(CLOSED, "probe succeeded")
+
+    def failure(self, reason):
+        with self._lock:
+            self.failures += 1
+            self._probe = False
+            if self.state == HALF_OPEN:
+                self._move(OPEN, f"probe failed: {reason}")
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._move(OPEN, f"{self.failures} consecutive failures, last: {reason}")
+
+    def _move(self, state, reason):
+        event = {"time": time.time(), "breaker": self.name, "from": self.state, "to": state, "reason": reason}
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        self.transitions.append(event)
+        metrics.inc("llm_breaker_transitions_total", breaker=self.name, to=state)
+        print(f"⚡ LLM circuit {self.name}: {event['from']} -> {state} ({reason})")
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(event) + "\n")
+
+
+# ─────────────────────────────────────────────
+# CLIENT WRAPPER
+# ─────────────────────────────────────────────
+class ResilientLLM:
+    def __init__(self, client, deadline=30.0, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 hedge_after=0.0, breaker=None, seed=None, max_workers=16):
+        self.client = client
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after  # seconds, "auto" (rolling p95) or 0 = off
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=256)
+        self._rng = random.Random(seed)
+        self.max_workers = max_workers  # sync path: threads, so at most this many calls in flight
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._in_flight = 0  # sync calls still running, including abandoned ones
+
+    # ─────────────────────────────
+    # POLICY
+    # ─────────────────────────────
+    def _hedge_delay(self):
+        if self.hedge_after == "auto":
+            if len(self.latencies) < 20:
+                return None
+            return sorted(self.latencies)[int(len(self.latencies) * 0.95)]
+        return self.hedge_after or None
+
+    def _backoff(self, attempt, error):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = self._rng.uniform(0, delay)  # full jitter
+        hinted = retry_after(error)
+        return min(self.backoff_max, max(delay, hinted)) if hinted else delay
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            metrics.inc("llm_calls_rejected_total", breaker=self.breaker.name)
+            raise CircuitOpen(f"LLM circuit '{self.breaker.name}' is open")
+
+    def _give_up(self, error, kind):
+        if kind == "fatal" and getattr(error, "status_code", None) in (400, 422):
+            self.breaker.success()  # The provider answered; the request itself was bad
+        else:
+            self.breaker.failure(type(error).__name__)
+        raise error
+
+    def _interrupted(self, error):
+        # Errors were already counted by _give_up. A call cancelled from outside
+        # (caller's timeout, shutdown) or interrupted is a failed call too, and a
+        # half-open probe must not stay "in flight" forever.
+        if not isinstance(error, Exception):
+            self.breaker.failure(type(error).__name__)
+
+    def _record(self, started):
+        self.latencies.append(time.monotonic() - started)
+        self.breaker.success()
+
+    # ─────────────────────────────
+    # ASYNC
+    # ─────────────────────────────
+    async def ainvoke(self, messages, **kwargs):
+        self._check_breaker()
+        try:
+            return await self._ainvoke(messages, kwargs)
+        except BaseException as e:
+            self._interrupted(e)
+            raise
+
+    async def _ainvoke(self, messages, kwargs):
+        end = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                remaining = end - started
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"LLM deadline of {self.deadline}s exceeded")
+                response = await asyncio.wait_for(self._ahedged(messages, kwargs), remaining)
+                self._record(started)
+                return response
+            except Exception as e:
+                kind = classify(e)
+                pause = self._backoff(attempt, e)
+                if kind == "fatal" or attempt == self.max_retries or time.monotonic() + pause >= end:
+                    self._give_up(e, kind)
+                metrics.inc("llm_retries_total", reason=kind)
+                await asyncio.sleep(pause)
+
+    async def _ahedged(self, messages, kwargs):
+        tasks = [asyncio.ensure_future(self.client.ainvoke(messages, **kwargs))]
+        try:
+            delay = self._hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    metrics.inc("llm_hedges_total")
+                    tasks.append(asyncio.ensure_future(self.client.ainvoke(messages, **kwargs)))
+
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            metrics.inc("llm_hedge_wins_total")
+                        return task.result()
+                if not pending:
+                    raise done.pop().exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    # ─────────────────────────────
+    # SYNC (calls run on a small thread pool so deadlines hold)
+    # ─────────────────────────────
+    def invoke(self, messages, **kwargs):
+        self._check_breaker()
+        try:
+            return self._invoke(messages, kwargs)
+        except BaseException as e:
+            self._interrupted(e)
+            raise
+
+    def _invoke(self, messages, kwargs):
+        end = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                response = self._hedged(messages, kwargs, end)
+                self._record(started)
+                return response
+            except Exception as e:
+                kind = classify(e)
+                pause = self._backoff(attempt, e)
+                if kind == "fatal" or attempt == self.max_retries or time.monotonic() + pause >= end:
+                    self._give_up(e, kind)
+                metrics.inc("llm_retries_total", reason=kind)
+                time.sleep(pause)
+
+    def _submit(self, messages, kwargs):
+        """Runs client.invoke on a worker thread; None if every worker is busy."""
+        with self._pool_lock:
+            if self._in_flight >= self.max_workers:
+                return None
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-call")
+            self._in_flight += 1
+        future = self._pool.submit(self.client.invoke, messages, **kwargs)
+        future.add_done_callback(self._call_done)
+        return future
+
+    def _call_done(self, future):
+        with self._pool_lock:
+            self._in_flight -= 1
+
+    def _hedged(self, messages, kwargs, end):
+        first = self._submit(messages, kwargs)
+        if first is None:
+            # Workers still stuck on calls whose callers gave up: waiting in the
+            # pool's queue would only burn this call's deadline too
+            metrics.inc("llm_calls_rejected_total", breaker=self.breaker.name)
+            raise CircuitOpen(f"LLM '{self.breaker.name}': all {self.max_workers} call threads busy")
+        futures = [first]
+        delay = self._hedge_delay()
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"LLM deadline of {self.deadline}s exceeded")
+            wait = min(remaining, delay) if delay is not None and len(futures) == 1 else remaining
+            done, _ = wait_futures(futures, timeout=wait, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        metrics.inc("llm_hedge_wins_total")
+                    return future.result()
+                futures.remove(future)
+                if not futures:
+                    raise future.exception()
+            if not done and len(futures) == 1 and delay is not None:
+                hedge = self._submit(messages, kwargs)  # No hedge without a free thread
+                if hedge is not None:
+                    metrics.inc("llm_hedges_total")
+                    futures.append(hedge)
+                delay = None
+
+
+def from_env(client, name="llm"):
+    """ResilientLLM configured from LLM_DEADLINE, LLM_RETRIES, LLM_HEDGE_AFTER, LLM_BREAKER_* env vars."""
+    hedge = os.getenv("LLM_HEDGE_AFTER", "0")
+    return ResilientLLM(
+        client,
+        deadline=float(os.getenv("LLM_DEADLINE", "30")),
+        max_retries=int(os.getenv("LLM_RETRIES", "3")),
+        hedge_after=hedge if hedge == "auto" else float(hedge),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+            log_path=os.getenv("LLM_BREAKER_LOG") or None,
+            name=name,
+        ),
+    )
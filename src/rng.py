@@ -0,0 +1,123 @@
+"""
+Per-customer, per-day random streams.
+
+simulate_time_step used the global `random` module, so outcomes depended
+on the order customers were processed in. Here every (root seed,
+customer id, day) triple gets its own counter-based stream: draw k is a
+pure function of (stream seed, k), computed with SplitMix64. Any
+sharding, chunking or ordering of the population therefore produces
+bit-identical draws, and the scalar path (CounterRNG, per customer dict)
+and the vectorized path (DayStreams.uniforms, NumPy) agree exactly.
+
+    streams = DayStreams(root_seed, day)
+    simulate_time_step(customer, streams.for_customer(customer["id"]))
+    population.time_step(streams)
+"""
+import hashlib
+from functools import lru_cache
+
+MASK64 = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+UNIT = 2.0 ** -53
+
+
+def splitmix64(x):
+    x = (x + GOLDEN) & MASK64
+    x = ((x ^ (x >> 30)) * MIX1) & MASK64
+    x = ((x ^ (x >> 27)) * MIX2) & MASK64
+    return x ^ (x >> 31)
+
+
+@lru_cache(maxsize=1 << 16)
+def customer_key(customer_id):
+    """Stable 64-bit key for a customer id (independent of PYTHONHASHSEED)."""
+    return int.from_bytes(hashlib.blake2b(str(customer_id).encode(), digest_size=8).digest(), "little")
+
+
+def stream_seed(root_seed, key, day):
+    return splitmix64(splitmix64((root_seed & MASK64) ^ key) ^ (day & MASK64))
+
+
+class CounterRNG:
+    """
+    random.Random-style stream for one customer and day (the subset the
+    simulation uses). Draw k is splitmix64(seed + k * GOLDEN).
+    """
+
+    __slots__ = ("seed", "counter")
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.counter = 0
+
+    def _next(self):
+        # splitmix64(seed + k * GOLDEN) for draw k, inlined
+        self.counter += 1
+        x = (self.seed + self.counter * GOLDEN) & MASK64
+        x = ((x ^ (x >> 30)) * MIX1) & MASK64
+        x = ((x ^ (x >> 27)) * MIX2) & MASK64
+        return x ^ (x >> 31)
+
+    def random(self):
+        return (self._next() >> 11) * UNIT
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def randrange(self, n):
+        return int(self.random() * n)
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+
+class DayStreams:
+    """All customers' streams for one day of one run."""
+
+    def __init__(self, root_seed, day):
+        self.root_seed = root_seed
+        self.day = day
+
+    def for_customer(self, customer_id):
+        return CounterRNG(stream_seed(self.root_seed, customer_key(customer_id), self.day))
+
+    # ─────────────────────────────
+    # VECTORIZED
+    # ─────────────────────────────
+    def seeds(self, keys):
+        """Stream seeds for a uint64 array of customer keys."""
+        import numpy as np
+
+        root = np.uint64(self.root_seed & MASK64)
+        return _splitmix64_array(_splitmix64_array(keys ^ root) ^ np.uint64(self.day & MASK64))
+
+    def uniforms(self, keys, draw, seeds=None):
+        """
+        Draw number `draw` (0, 1, ...) of every key's stream as floats in
+        [0, 1); identical to calling CounterRNG.random() draw + 1 times.
+        """
+        import numpy as np
+
+        if seeds is None:
+            seeds = self.seeds(keys)
+        z = _splitmix64_array(seeds + np.uint64((draw * GOLDEN) & MASK64))
+        return (z >> np.uint64(11)).astype(np.float64) * UNIT
+
+
+def customer_keys(customer_ids):
+    """uint64 array of customer_key() for many ids."""
+    import numpy as np
+
+    return np.fromiter((customer_key(i) for i in customer_ids), dtype=np.uint64, count=len(customer_ids))
+
+
+def _splitmix64_array(x):
+    import numpy as np
+
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(GOLDEN)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(MIX1)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(MIX2)
+        return x ^ (x >> np.uint64(31))
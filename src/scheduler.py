@@ -0,0 +1,103 @@
+"""
+Budget-aware choice of which customers get an LLM decision each day.
+
+Every active customer has an urgency score (low engagement, long
+inactivity, Churn Risk stage, repeated "not interested"). Scores live in
+a heap that is updated only for customers acted on, so picking the day's
+top K costs O(K log n) instead of a full re-rank. Under a daily call or
+token budget the top K get decision_agent's LLM reasoning; everyone else
+gets agents.rules_decision (hard rules + memory, first allowed action),
+the same rules-only policy used while the LLM circuit is open.
+
+    scheduler = DecisionScheduler(customers, call_budget=50)
+    llm_ids = scheduler.select(scheduler.budget())   # None = no budget
+    ...
+    scheduler.update(customer)                       # after each action
+"""
+import heapq
+import itertools
+
+from src.prompt_builder import PROMPT_TOKEN_BUDGET, estimate_tokens
+
+# Urgency weights (engagement gap is 0..1, the rest are capped counts)
+INACTIVITY_WEIGHT = 0.25   # per day since the last event, up to INACTIVITY_CAP
+INACTIVITY_CAP = 8
+CHURN_RISK_WEIGHT = 1.0
+NOT_INTERESTED_WEIGHT = 0.5  # per "not interested", up to 4
+RESPONSE_TOKENS = 60       # Estimated reply size of one decision
+
+
+def urgency(customer):
+    """Higher = needs attention sooner."""
+    score = (100 - customer.get("engagement_score", 0)) / 100
+    score += INACTIVITY_WEIGHT * min(customer.get("time_since_last_event", 0), INACTIVITY_CAP)
+    if customer.get("lifecycle_stage") == "Churn Risk":
+        score += CHURN_RISK_WEIGHT
+    score += NOT_INTERESTED_WEIGHT * min(customer.get("not_interested_count", 0), 4)
+    return score
+
+
+def tokens_per_decision():
+    """Upper estimate of one single-customer decision call (prompt + reply)."""
+    from src.agents import SINGLE_PREFIX
+
+    return estimate_tokens(SINGLE_PREFIX) + PROMPT_TOKEN_BUDGET + RESPONSE_TOKENS
+
+
+class DecisionScheduler:
+    """
+    Max-heap of active customers by urgency with lazy invalidation:
+    update() pushes a fresh entry and stale ones are skipped when popped.
+    """
+
+    def __init__(self, customers=(), call_budget=0, token_budget=0):
+        self.call_budget = call_budget    # LLM decisions per day (0 = unlimited)
+        self.token_budget = token_budget  # Estimated LLM tokens per day (0 = unlimited)
+        self._heap = []                   # (-urgency, seq, customer id)
+        self._current = {}                # customer id -> seq of its live entry
+        self._seq = itertools.count()
+        for customer in customers:
+            self.update(customer)
+
+    def __len__(self):
+        return len(self._current)
+
+    def update(self, customer):
+        """(Re)score one customer; churned customers leave the heap."""
+        if customer.get("status") == "Churned":
+            self.remove(customer["id"])
+            return
+        seq = next(self._seq)
+        self._current[customer["id"]] = seq
+        heapq.heappush(self._heap, (-urgency(customer), seq, customer["id"]))
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._compact()
+
+    def remove(self, customer_id):
+        self._current.pop(customer_id, None)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._current.get(entry[2]) == entry[1]]
+        heapq.heapify(self._heap)
+
+    def budget(self):
+        """LLM decisions allowed today, or None without a budget."""
+        limits = []
+        if self.call_budget:
+            limits.append(self.call_budget)
+        if self.token_budget:
+            limits.append(self.token_budget // tokens_per_decision())
+        return min(limits) if limits else None
+
+    def select(self, k):
+        """Ids of the k most urgent customers (all of them when k is None)."""
+        if k is None:
+            return set(self._current)
+        chosen = []
+        while self._heap and len(chosen) < k:
+            entry = heapq.heappop(self._heap)
+            if self._current.get(entry[2]) == entry[1]:
+                chosen.append(entry)
+        for entry in chosen:
+            heapq.heappush(self._heap, entry)
+        return {entry[2] for entry in chosen}
@@ -1,30 +1,39 @@
 import time
-from src.agents import behavior_analysis_agent
+from src import metrics
+from src.agents import behavior_analysis_agent, decision_agent
 
 def run_simulation_step(customer, memory):
     # STEP 1: OBSERVE
-    analysis = behavior_analysis_agent(customer)
+    with metrics.span("observe"):
+        analysis = behavior_analysis_agent(customer)
 
     # STEP 2: DECIDE (YOUR REAL AGENT)
-    decision = decision_agent(customer, memory)
+    with metrics.span("decide"):
+        decision = decision_agent(customer, memory)
 
-    # STEP 3: ACT + EVALUATE
-    impact = evaluate_outcome(customer, decision["action"], memory)
+    # STEP 3: ACT + EVALUATE (includes the "learn" span)
+    with metrics.span("act"):
+        impact = evaluate_outcome(customer, decision["action"], memory)
 
     return analysis, decision, impact
 
 
 import random
 
-def simulate_time_step(customer):
-    """Call this every loop to advance 'time' for the user."""
+def simulate_time_step(customer, rng=None):
+    """
+    Call this every loop to advance 'time' for the user.
+    rng: the customer's stream for the day (src.rng.DayStreams.for_customer)
+    for order-independent, reproducible runs; default is the global random module.
+    """
+    draw = random if rng is None else rng
     customer["time_since_last_event"] += 1
     
     # Behavior logic: High engagement = likely event. High 'time_since' = likely churn.
     activity_threshold = customer["engagement_score"] / 100.0
     
-    if random.random() < activity_threshold:
-        event = random.choice(["Login", "Feature Use", "Search"])
+    if draw.random() < activity_threshold:
+        event = draw.choice(["Login", "Feature Use", "Search"])
         customer["history"].append(event)
         customer["time_since_last_event"] = 0 # Reset on activity
         return f"User performed: {event}"
@@ -115,7 +124,8 @@ def evaluate_outcome(customer, action, memory=None):
     # ─────────────────────────────
     if memory is not None and action != "DO_NOTHING":
         status = "SUCCESS" if impact > 0 else "FAILED"
-        memory.update(customer, action, status)
+        with metrics.span("learn"):
+            memory.update(customer, action, status)
 
     # ─────────────────────────────
     # STATE TRACKING (CRITICAL)
@@ -0,0 +1,156 @@
+"""
+Bounded session state for the Streamlit app.
+
+StoryStore keeps the newest `capacity` decision stories in memory and,
+if given a spill path, writes every story as a JSON line so older pages
+can still be read back from disk. Stories hold a snapshot of just the
+customer fields the cards show, never the customer dict itself (whose
+history keeps growing).
+
+SidebarSummary keeps the sidebar's registry aggregates current instead
+of recomputing them on every rerun: per-persona registry lines are
+rebuilt only for keys a StrategyMemory update touched (it is a memory
+listener, like DecisionCache). Active / Churned counts come from the
+DayEngine indexes (src/day_engine.py).
+"""
+import json
+import os
+from array import array
+from collections import deque
+
+# Customer fields rendered on story cards
+CARD_FIELDS = ("id", "name", "persona", "engagement_score", "status")
+
+
+def story_card(customer):
+    """Snapshot of the customer fields a story card shows."""
+    return {field: customer.get(field) for field in CARD_FIELDS}
+
+
+def compact_story(story):
+    """A story as stored: card snapshot, thought, action, impact."""
+    customer = story["customer"]
+    if customer.keys() - set(CARD_FIELDS):
+        customer = story_card(customer)
+    return {"customer": customer, "thought": story["thought"], "action": story["action"], "impact": story["impact"]}
+
+
+# ─────────────────────────────────────────────
+# STORIES
+# ─────────────────────────────────────────────
+class StoryStore:
+    """
+    Newest-last story log with a fixed in-memory window.
+
+    len(store) counts every story ever appended; page(0) is the newest
+    page_size stories (oldest first, like the cards always rendered).
+    Pages older than the window come from the spill file, or are empty
+    when spilling is off.
+    """
+
+    def __init__(self, capacity=500, spill_path=None):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.total = 0
+        self._recent = deque(maxlen=capacity)
+        self._offsets = array("Q")  # spill file offset of every story
+        self._spill = None
+        if spill_path:
+            os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+            self._spill = open(spill_path, "wb")
+
+    def __len__(self):
+        return self.total
+
+    def append(self, story):
+        story = compact_story(story)
+        self._recent.append(story)
+        self.total += 1
+        if self._spill is not None:
+            self._offsets.append(self._spill.tell())
+            self._spill.write(json.dumps(story).encode() + b"\n")
+
+    def extend(self, stories):
+        for story in stories:
+            self.append(story)
+        self.flush()
+
+    def flush(self):
+        if self._spill is not None:
+            self._spill.flush()
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def pages(self, page_size):
+        """Number of readable pages."""
+        readable = self.total if self._spill is not None else len(self._recent)
+        return max(1, -(-readable // page_size))
+
+    def latest(self, n):
+        """The newest n stories (n <= capacity)."""
+        return list(self._recent)[-n:] if n else []
+
+    def page(self, number, page_size):
+        """Stories of page `number` (0 = newest), oldest first."""
+        stop = self.total - number * page_size
+        start = max(0, stop - page_size)
+        if stop <= 0:
+            return []
+        first_in_memory = self.total - len(self._recent)
+        if start >= first_in_memory:
+            return [self._recent[i - first_in_memory] for i in range(start, stop)]
+        if self._spill is None:
+            return [self._recent[i - first_in_memory] for i in range(max(start, first_in_memory), stop)]
+
+        self.flush()
+        stories = []
+        with open(self.spill_path, "rb") as f:
+            f.seek(self._offsets[start])
+            for _ in range(start, stop):
+                stories.append(json.loads(f.readline()))
+        return stories
+
+
+# ─────────────────────────────────────────────
+# SIDEBAR AGGREGATES
+# ─────────────────────────────────────────────
+class SidebarSummary:
+    """
+    Incrementally maintained registry summary. Register with
+    memory.add_listener(summary).
+    """
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.personas = set()
+        self.entries = 0         # (key, action) pairs in the registry
+        self._lines = {}         # registry key -> (header, [action lines], entry count)
+        self._dirty = set(memory.registry)
+
+    def invalidate(self, registry_key):
+        """StrategyMemory listener: this key's strategies changed."""
+        self._dirty.add(registry_key)
+
+    def registry_lines(self, format_action):
+        """
+        {key: (header, [line per action])}, refreshing only keys updated
+        since the last call. format_action(action, stats) -> markdown line.
+        """
+        for key in self._dirty:
+            strategies = self.memory.strategies(key)
+            previous = self._lines.pop(key, None)
+            if previous is not None:
+                self.entries -= previous[2]
+            if not strategies:
+                continue
+            stage, _, persona = key.partition("_")
+            header = f"**{persona}** ({stage})" if persona else f"**{key}**"
+            lines = [format_action(action, stats) for action, stats in strategies.items()]
+            self._lines[key] = (header, lines, len(lines))
+            self.entries += len(lines)
+            self.personas.add(key.split("_")[-1])
+        self._dirty.clear()
+        return {key: (header, lines) for key, (header, lines, _) in self._lines.items()}
@@ -0,0 +1,195 @@
+"""
+Structured decision replies.
+
+Requests carry a JSON-schema response_format whose "action" is an enum
+of the customer's allowed actions, so providers that support structured
+outputs can only answer with a valid decision. Replies are still decoded
+defensively, since not every endpoint honors the schema:
+
+1. json.loads on the reply as is;
+2. a local repair pass: markdown fences, prose around the JSON, trailing
+   commas, smart quotes, and action names off by case or separators
+   ("send discount" -> SEND_DISCOUNT);
+3. if that fails, the caller can send repair_prompt(), a short re-ask
+   quoting the unusable reply (DECISION_REPAIR_ATTEMPTS, default 1).
+
+Every decoded reply is counted as
+decision_decode_total{outcome="ok"|"repaired"|"parse_failure"|"invalid_action"}.
+"""
+import json
+import os
+import re
+
+from src import metrics
+
+# "json_schema" (action enum enforced), "json_object" (any JSON), or "off"
+STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "json_schema")
+REPAIR_ATTEMPTS = int(os.getenv("DECISION_REPAIR_ATTEMPTS", "1"))
+
+DIVIDER = "━━━━━━━━━━━━━━━━━━━━━━"
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+ACTION_FIELD = re.compile(r'"action"\s*:\s*"([^"]*)"')
+THOUGHT_FIELD = re.compile(r'"thought"\s*:\s*"((?:[^"\\]|\\.)*)"')
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+class DecodeError(ValueError):
+    """A reply that could not be turned into a usable decision."""
+
+    def __init__(self, reason, message, action=None):
+        super().__init__(message)
+        self.reason = reason  # "parse_failure" | "invalid_action"
+        self.action = action
+
+
+# ─────────────────────────────────────────────
+# SCHEMAS (request side)
+# ─────────────────────────────────────────────
+def decision_schema(allowed_actions):
+    return {
+        "type": "object",
+        "properties": {
+            "thought": {"type": "string"},
+            "action": {"type": "string", "enum": list(allowed_actions)},
+        },
+        "required": ["thought", "action"],
+        "additionalProperties": False,
+    }
+
+
+def batch_schema(allowed_by_id):
+    """Batched replies: {"decisions": [...]}; per-customer actions are checked on decode."""
+    actions = sorted({a for allowed in allowed_by_id.values() for a in allowed})
+    entry = decision_schema(actions)
+    entry["properties"] = {"customer_id": {"type": "string", "enum": list(allowed_by_id)}, **entry["properties"]}
+    entry["required"] = ["customer_id", "thought", "action"]
+    return {
+        "type": "object",
+        "properties": {"decisions": {"type": "array", "items": entry}},
+        "required": ["decisions"],
+        "additionalProperties": False,
+    }
+
+
+def invoke_options(schema, name="decision"):
+    """Keyword arguments for llm.invoke / ainvoke under STRUCTURED_OUTPUT."""
+    if STRUCTURED_OUTPUT == "json_schema":
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}}
+    if STRUCTURED_OUTPUT == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+# ─────────────────────────────────────────────
+# DECODING (reply side)
+# ─────────────────────────────────────────────
+def _loads(content, opening="{["):
+    """(value, repaired) for the JSON in content; raises DecodeError."""
+    content = content or ""
+    try:
+        return json.loads(content), False
+    except ValueError:
+        pass
+
+    text = content.translate(SMART_QUOTES).replace("```json", "").replace("```", "")
+    starts = [i for i in (text.find(c) for c in opening) if i >= 0]
+    if starts:
+        start = min(starts)
+        end = max(text.rfind("}"), text.rfind("]")) + 1
+        candidate = TRAILING_COMMA.sub(r"\1", text[start:end])
+        try:
+            return json.loads(candidate), True
+        except ValueError:
+            pass
+    raise DecodeError("parse_failure", f"Reply is not JSON: {content[:80]!r}")
+
+
+def normalize_action(action, allowed_actions):
+    """The allowed action `action` names, tolerating case / separators; else None."""
+    if action in allowed_actions:
+        return action
+    if not isinstance(action, str):
+        return None
+    key = re.sub(r"[\s\-]+", "_", action.strip().strip("'\"`")).upper()
+    return key if key in allowed_actions else None
+
+
+def decode_decision(content, allowed_actions):
+    """Decision dict from one reply, repairing what can be repaired; raises DecodeError."""
+    try:
+        result, repaired = _loads(content, "{")
+        if isinstance(result, list) and len(result) == 1:
+            result = result[0]
+        if not isinstance(result, dict):
+            raise DecodeError("parse_failure", "Reply is not a JSON object")
+    except DecodeError:
+        # Last resort: pull the fields out of almost-JSON
+        match = ACTION_FIELD.search(content or "")
+        if match is None:
+            metrics.inc("decision_decode_total", outcome="parse_failure")
+            raise
+        thought = THOUGHT_FIELD.search(content)
+        result, repaired = {"action": match.group(1), "thought": thought.group(1) if thought else ""}, True
+
+    raw_action = result.get("action")
+    action = normalize_action(raw_action, allowed_actions)
+    if action is None:
+        metrics.inc("decision_decode_total", outcome="invalid_action")
+        raise DecodeError("invalid_action", f"Action '{raw_action}' is not allowed", raw_action)
+
+    repaired = repaired or action != raw_action
+    metrics.inc("decision_decode_total", outcome="repaired" if repaired else "ok")
+    return {
+        "thought": result.get("thought") or "No explicit reasoning provided.",
+        "action": action
+    }
+
+
+def decode_batch(content, allowed_by_id):
+    """
+    {customer_id: decision} from a batched reply. Entries that are
+    missing, unknown, duplicated or not allowed are left out.
+    """
+    try:
+        result, repaired = _loads(content)
+    except DecodeError:
+        metrics.inc("decision_decode_total", outcome="parse_failure")
+        return {}
+    if isinstance(result, dict):
+        result = result.get("decisions", [])
+
+    decisions = {}
+    for entry in result if isinstance(result, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        customer_id = str(entry.get("customer_id"))
+        if customer_id in decisions or customer_id not in allowed_by_id:
+            continue
+        action = normalize_action(entry.get("action"), allowed_by_id[customer_id])
+        if action is None:
+            metrics.inc("decision_decode_total", outcome="invalid_action")
+            continue
+        metrics.inc("decision_decode_total", outcome="repaired" if repaired or action != entry.get("action") else "ok")
+        decisions[customer_id] = {
+            "thought": entry.get("thought") or "No explicit reasoning provided.",
+            "action": action
+        }
+    return decisions
+
+
+def repair_prompt(content, error, allowed_actions):
+    """Short re-ask after an unusable reply (much smaller than the original prompt)."""
+    return f"""
+Your previous reply could not be used: {error}.
+
+Previous reply:
+{(content or "")[:600]}
+
+Answer again with ONLY a JSON object {{"thought": "...", "action": "..."}},
+choosing the action from:
+
+{DIVIDER}
+AVAILABLE ACTIONS
+{DIVIDER}
+{list(allowed_actions)}
+"""
@@ -0,0 +1,88 @@
+"""
+Offline stand-in for the ChatOpenAI client used by decision_agent.
+
+StubLLM answers every prompt with valid decision JSON picked from the
+actions the prompt allows (single-customer or batched prompts), after a
+configurable delay. Install it with src.agents.set_llm(StubLLM(...)) to
+run benchmarks and tests without network access or API cost.
+"""
+import ast
+import asyncio
+import json
+import random
+import re
+import time
+
+AVAILABLE_BLOCK = re.compile(r"AVAILABLE ACTIONS\n━+\n(\[.*?\])")
+CUSTOMER_BLOCK = re.compile(r"CUSTOMER (\S+)\n.*?Available Actions: (\[.*?\])", re.S)
+
+
+def choose_reply(prompt, rng=random):
+    """Decision JSON for a decision_agent prompt ({"decisions": [...]} for batched prompts)."""
+    if '"customer_id"' in prompt:
+        return json.dumps({"decisions": [
+            {
+                "customer_id": customer_id,
+                "thought": "Stub decision.",
+                "action": rng.choice(ast.literal_eval(allowed)),
+            }
+            for customer_id, allowed in CUSTOMER_BLOCK.findall(prompt)
+        ]})
+
+    match = AVAILABLE_BLOCK.search(prompt)
+    allowed = ast.literal_eval(match.group(1)) if match else ["DO_NOTHING"]
+    return json.dumps({"thought": "Stub decision.", "action": rng.choice(allowed)})
+
+
+def malform(content, rng=random):
+    """A broken version of a good reply: repairable formatting noise, or no JSON at all."""
+    if rng.random() < 0.5:
+        data = json.loads(content)
+        for entry in data.get("decisions", [data]):
+            entry["action"] = entry["action"].lower().replace("_", " ")
+        return "Sure! Here is my decision:\n```json\n" + json.dumps(data, indent=2)[:-1] + ",\n}\n```"
+    return "I would reach out to this customer with something helpful."
+
+
+class StubResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """
+    latency: base seconds per call; jitter: extra uniform [0, jitter) seconds;
+    malformed_rate: fraction of replies passed through malform().
+    Calls are counted in self.calls. Extra invoke() keyword arguments
+    (response_format, ...) are accepted and ignored.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0, malformed_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def _delay(self):
+        return self.latency + (self.rng.random() * self.jitter if self.jitter else 0.0)
+
+    def _reply(self, messages):
+        content = choose_reply(messages[-1].content, self.rng)
+        if self.malformed_rate and self.rng.random() < self.malformed_rate:
+            content = malform(content, self.rng)
+        return StubResponse(content)
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._reply(messages)
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._reply(messages)
@@ -1,6 +1,14 @@
 import sys
 import os
 import json
+import asyncio
+import copy
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from unittest.mock import MagicMock, patch
 
 # Add src to path
@@ -16,20 +24,56 @@ sys.modules["langchain.schema"] = MagicMock()
 sys.modules["langchain_google_genai"] = MagicMock()
 sys.modules["dotenv"] = MagicMock()
 
-# Mock ChatGoogleGenerativeAI before importing agent
 import src.agents
 
-# Configure the existing mock llm
+# Swap the shared LLM client for a mock
 mock_response = MagicMock()
 mock_response.content = json.dumps({
     "thought": "User is at risk, sending discount.",
     "action": "SEND_DISCOUNT",
     "params": {}
 })
-src.agents.llm.invoke.return_value = mock_response
+mock_llm = MagicMock()
+mock_llm.invoke.return_value = mock_response
+src.agents.set_llm(mock_llm)
 
-from src.agents import decision_agent
-from src.simulation import simulate_user_behavior, evaluate_agent_action
+# Cold import of the core modules must stay fast (no LLM client / langchain_openai)
+IMPORT_BUDGET_SECONDS = 1.0
+
+from src.agents import decision_agent, run_decision_batch
+from src.stub_llm import StubLLM, StubResponse
+from src.resilience import CircuitBreaker, ResilientLLM
+from src.simulation import simulate_user_behavior, evaluate_agent_action, simulate_time_step, evaluate_outcome
+from src.memory_store import CompactStrategyMemory
+from src.durable_memory import DurableStrategyMemory
+from src.population import ACTIONS, Population
+from src.rng import DayStreams
+from data.customer import personas
+from src.day_engine import DayEngine, state_key
+from src.agents import rules_decision
+from src.scheduler import DecisionScheduler, tokens_per_decision, urgency
+from src.prompt_builder import LAST_ACTIONS, action_summary, estimate_tokens, fit_context
+from src.agents import SINGLE_PREFIX, build_prompt
+from src.story_store import SidebarSummary, StoryStore
+from src.day_worker import DayWorker, simulate_day
+from src import monte_carlo
+from src.features import CATEGORIES, FeatureTracker, customer_features, score_population
+from src.agents import behavior_analysis_agent, behavior_analysis_batch
+from src.event_log import EventLog, part_path, read_events
+from src.customer_stream import read_chunks, row_to_customer, write_customers
+from src import metrics
+import urllib.error
+import urllib.request
+from src import llm_router
+from src.mock_llm_server import serve
+from src.stub_llm import choose_reply
+import pickle
+from src.history import EventHistory, HistoryArchive, bound_history, events_since, history_mark
+from src import batch_runner
+from src.agents import _group_by_id
+from src.decision_cache import DecisionCache
+from src.memory_store import StrategyMemory
+from src.agents import decision_agent_batch, plan_decision
 
 def test_simulation_exports():
     print("Testing simulation exports...")
@@ -40,9 +84,15 @@ def test_simulation_exports():
 def test_decision_agent():
     print("Testing decision_agent...")
     customer = {
+        "id": "T001",
         "name": "Test User",
         "persona": "Student",
         "history": ["Login", "Inactive"],
+        "action_history": ["DO_NOTHING"],
+        "engagement_score": 30,
+        "lifecycle_stage": "Churn Risk",
+        "segment": "Price-Sensitive",
+        "discount_count": 0,
         "time_since_last_event": 5,
         "status": "At Risk",
         "last_action": "DO_NOTHING"
@@ -52,16 +102,1024 @@ def test_decision_agent():
     mock_memory.get_forbidden_actions.return_value = []
     mock_memory.get_success_hints.return_value = ""
     
-    action = decision_agent(customer, mock_memory)
+    decision = decision_agent(customer, mock_memory)
+    action = decision["action"]
     
-    print(f"Agent returned: {action}")
+    print(f"Agent returned: {decision}")
     assert action == "SEND_DISCOUNT", f"Expected SEND_DISCOUNT, got {action}"
     print("PASS: Decision agent works.")
 
+def test_import_budget():
+    print("Testing import time...")
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import src.agents, src.simulation, src.memory_store\n"
+        "print(time.perf_counter() - start, 'langchain_openai' in sys.modules)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    elapsed, client_imported = result.stdout.split()
+    
+    print(f"Import took {float(elapsed):.3f}s")
+    assert client_imported == "False", "langchain_openai was imported at module import time"
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS, f"Import took {elapsed}s (budget {IMPORT_BUDGET_SECONDS}s)"
+    print("PASS: Import time within budget.")
+
+def test_compact_memory_64_actions():
+    print("Testing CompactStrategyMemory with 64 actions...")
+    memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    customer = {"lifecycle_stage": "Churn Risk", "name": "Test User"}
+    actions = [f"ACTION_{i}" for i in range(64)]
+    for action in actions:
+        memory.update(customer, action, "FAILED")
+    
+    assert memory.get_forbidden_actions(customer) == actions, "Forbidden mask lost an action"
+    try:
+        memory.update(customer, "ACTION_64", "FAILED")
+        raise AssertionError("65th action was accepted")
+    except ValueError:
+        pass
+    print("PASS: All 64 action bits round-trip.")
+
+def test_durable_memory_replay():
+    print("Testing DurableStrategyMemory replay...")
+    path = tempfile.mkdtemp()
+    customer = {"lifecycle_stage": "Churn Risk", "name": "Test User"}
+    
+    # Not closed: what a crashed process leaves behind
+    memory = DurableStrategyMemory(path, keep_logs=False, verbose=False)
+    memory.update(customer, "SEND_DISCOUNT", "FAILED")
+    memory.update(customer, "SEND_TUTORIAL", "SUCCESS")
+    expected = memory.registry
+    assert DurableStrategyMemory(path, verbose=False).registry == expected, "Unclosed log did not replay"
+    
+    # Torn record at the end of the log is dropped, later appends survive
+    log_path = os.path.join(path, f"updates.{memory.generation}.log")
+    with open(log_path, "ab") as f:
+        f.write(b"\x03\x00\x00")
+    reloaded = DurableStrategyMemory(path, verbose=False)
+    assert reloaded.registry == expected, "Truncated tail changed the registry"
+    reloaded.update(customer, "ASK_INTEREST", "SUCCESS")
+    expected = reloaded.registry
+    assert DurableStrategyMemory(path, verbose=False).registry == expected, "Append after a torn tail was lost"
+    
+    # Registry replaced wholesale (RESET + definitions), again without close()
+    reset = {"Active_Student": {"DO_NOTHING": {"SUCCESS": 2, "FAILED": 0}}}
+    reloaded.registry = reset
+    assert DurableStrategyMemory(path, verbose=False).registry == reset, "Registry reset did not replay"
+    reloaded.registry = {}  # A lone RESET record, no update after it
+    assert DurableStrategyMemory(path, verbose=False).registry == {}, "Reset to empty did not replay"
+    print("PASS: Durable memory replays torn and reset logs.")
+
+def make_customers(copies):
+    customers = []
+    for n in range(copies):
+        for persona in personas:
+            customer = copy.deepcopy(persona)
+            customer["id"] = f"{persona['id']}-{n}"
+            customer["engagement_score"] = (persona["engagement_score"] + 17 * n) % 101
+            customers.append(customer)
+    return customers
+
+def simulate_shard(customers, seed, day):
+    """One day of simulate_time_step for a shard (runs in a worker process)."""
+    streams = DayStreams(seed, day)
+    for customer in customers:
+        simulate_time_step(customer, streams.for_customer(customer["id"]))
+    return customers
+
+def test_day_streams_workers():
+    print("Testing DayStreams with 1 vs N workers...")
+    single, sharded = make_customers(20), make_customers(20)
+    with ProcessPoolExecutor(max_workers=3) as pool:
+        for day in range(1, 6):
+            single = simulate_shard(single, 7, day)
+            shards = [sharded[i::3] for i in range(3)]  # Interleaved, a different order
+            results = pool.map(simulate_shard, shards, [7] * 3, [day] * 3)
+            by_id = {c["id"]: c for shard in results for c in shard}
+            sharded = [by_id[c["id"]] for c in sharded]
+    
+    assert single == sharded, "Sharded run drew different outcomes"
+    print("PASS: DayStreams outcomes do not depend on sharding.")
+
+def test_population_matches_dicts():
+    print("Testing Population against the per-dict path...")
+    dicts, rows = make_customers(20), make_customers(20)
+    dict_memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    row_memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    for day in range(1, 8):
+        streams = DayStreams(3, day)
+        actions = [
+            None if c["status"] == "Churned" else ACTIONS[(i + day) % len(ACTIONS)]
+            for i, c in enumerate(dicts)
+        ]
+        for customer, action in zip(dicts, actions):
+            if action is not None:
+                simulate_time_step(customer, streams.for_customer(customer["id"]))
+                evaluate_outcome(customer, action, dict_memory)
+        
+        population = Population.from_customers(rows)
+        population.time_step(streams)
+        population.apply_actions(actions, row_memory)
+        population.write_back(rows)
+    
+    fields = ["engagement_score", "time_since_last_event", "discount_count",
+              "not_interested_count", "status", "lifecycle_stage", "last_action"]
+    for a, b in zip(dicts, rows):
+        assert [a[f] for f in fields] == [b[f] for f in fields], f"{a['id']} differs"
+    assert dict_memory.registry == row_memory.registry, "Learned memory differs"
+    print("PASS: Population matches simulate_time_step + evaluate_outcome.")
+
+def test_batched_decisions():
+    print("Testing batched decisions...")
+    stub = StubLLM(seed=1)
+    src.agents.set_llm(stub)
+    try:
+        customers = make_customers(2)
+        memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+        for day in range(2):  # Batches keep working after the first day
+            decisions = run_decision_batch([(c, memory) for c in customers], batch_size=5)
+            fallbacks = [d for d in decisions if "fallback" in d]
+            assert not fallbacks, f"Batched replies fell back: {fallbacks[0]}"
+    finally:
+        src.agents.set_llm(mock_llm)
+    
+    assert stub.calls == 4, f"Expected 2 batched calls per day, got {stub.calls} in total"
+    print("PASS: Batched {\"decisions\": [...]} replies decode.")
+
+class HungLLM:
+    """A provider that never answers."""
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(3600)
+
+def test_breaker_transitions():
+    print("Testing circuit breaker transitions...")
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05, name="test")
+    breaker.failure("boom")
+    assert breaker.state == "closed" and breaker.allow(), "Opened before the threshold"
+    breaker.failure("boom")
+    assert breaker.state == "open" and not breaker.allow(), "Did not open at the threshold"
+    
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == "half_open", "No probe after the cooldown"
+    assert not breaker.allow(), "Half-open let a second call through"
+    breaker.failure("probe")
+    assert breaker.state == "open", "Failed probe did not reopen"
+    
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.failures == 0, "Probe success did not close"
+    moves = [(t["from"], t["to"]) for t in breaker.transitions]
+    assert moves == [("closed", "open"), ("open", "half_open"), ("half_open", "open"),
+                     ("open", "half_open"), ("half_open", "closed")], moves
+    print("PASS: closed -> open -> half_open -> open / closed.")
+
+def test_hung_provider():
+    print("Testing a hung provider...")
+    client = ResilientLLM(HungLLM(), deadline=0.1, max_retries=0,
+                          breaker=CircuitBreaker(failure_threshold=3, cooldown=60, name="hung"))
+    src.agents.set_llm(client)
+    try:
+        # Caller's timeout equal to the deadline: the deadline must still fire first
+        customers = make_customers(1)
+        memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+        decisions = run_decision_batch([(c, memory) for c in customers], max_concurrency=1, timeout=0.1)
+    finally:
+        src.agents.set_llm(mock_llm)
+    
+    reasons = [d["fallback"] for d in decisions]
+    assert client.breaker.state == "open", f"Breaker {client.breaker.state} after {len(reasons)} timeouts"
+    assert reasons.count("circuit_open") == len(reasons) - 3, reasons
+    
+    # Cancelled from outside (shorter caller timeout) also counts as a failure
+    client = ResilientLLM(HungLLM(), deadline=10, max_retries=0,
+                          breaker=CircuitBreaker(failure_threshold=2, cooldown=60, name="hung"))
+    for _ in range(2):
+        try:
+            asyncio.run(asyncio.wait_for(client.ainvoke([]), 0.05))
+        except asyncio.TimeoutError:
+            pass
+    assert client.breaker.state == "open", "Cancelled calls did not count as failures"
+    print("PASS: Hung provider opens the breaker.")
+
+def test_cancelled_probe():
+    print("Testing a cancelled half-open probe...")
+    client = ResilientLLM(HungLLM(), deadline=10, max_retries=0,
+                          breaker=CircuitBreaker(failure_threshold=1, cooldown=0.05, name="probe"))
+    client.breaker.failure("boom")
+    time.sleep(0.06)
+    try:
+        asyncio.run(asyncio.wait_for(client.ainvoke([]), 0.05))  # The probe
+    except asyncio.TimeoutError:
+        pass
+    
+    assert client.breaker.state == "open", f"Breaker stuck in {client.breaker.state}"
+    time.sleep(0.06)
+    assert client.breaker.allow(), "No new probe after the cooldown"
+    print("PASS: Cancelled probe reopens the breaker.")
+
+class EchoLLM(StubLLM):
+    """StubLLM whose thought is the prompt's Name line; tracks calls in flight."""
+    def __init__(self, latency=0.0):
+        super().__init__(latency=latency)
+        self.in_flight = self.peak = 0
+    
+    def _reply(self, messages):
+        reply = json.loads(super()._reply(messages).content)
+        reply["thought"] = messages[-1].content.split("Name: ", 1)[1].split("\n", 1)[0]
+        return StubResponse(json.dumps(reply))
+    
+    async def ainvoke(self, messages, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().ainvoke(messages, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+def test_decision_batch_concurrency():
+    print("Testing decision_agent_batch fan-out...")
+    customers = make_customers(4)
+    for i, customer in enumerate(customers):
+        customer["name"] = f"C{i} {customer['name']}"  # Unique, same persona
+    memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    echo = EchoLLM(latency=0.01)
+    src.agents.set_llm(echo)
+    try:
+        decisions = asyncio.run(decision_agent_batch([(c, memory) for c in customers], max_concurrency=3))
+    finally:
+        src.agents.set_llm(mock_llm)
+    
+    assert echo.peak == 3, f"Expected 3 calls in flight at most (and at some point), got {echo.peak}"
+    for customer, decision in zip(customers, decisions):
+        ruled, allowed, _ = plan_decision(customer, memory)
+        if ruled is None:
+            assert decision["thought"] == customer["name"], "Decisions came back out of order"
+            assert decision["action"] in allowed, decision
+    print("PASS: Bounded concurrency, decisions in input order.")
+
+def test_decision_cache():
+    print("Testing DecisionCache...")
+    memory = StrategyMemory()
+    cache = DecisionCache(max_size=2, ttl=60)
+    memory.add_listener(cache)
+    customer = make_customers(1)[0]
+    allowed = ["SEND_TUTORIAL", "ASK_INTEREST"]
+    signature = cache.signature(customer, memory, allowed)
+    key = memory._get_key(customer)
+    decision = {"thought": "t", "action": "SEND_TUTORIAL"}
+    
+    cache.put(signature, decision, key)
+    assert cache.get(signature, key) == decision and cache.hits == 1
+    memory.update(customer, "SEND_TUTORIAL", "SUCCESS")  # Learning drops the entry
+    assert cache.get(signature, key) is None and cache.invalidations == 1
+    assert cache.signature(customer, memory, allowed) != signature, "Hints are not part of the signature"
+    
+    # LRU and TTL evictions also unlink the registry key
+    for n in range(5):
+        cache.put(("state", n), decision, f"key_{n}")
+    assert len(cache) == 2 and cache.evictions == 3
+    assert set(cache._by_registry_key) == {"key_3", "key_4"}, cache._by_registry_key
+    cache.ttl = -1
+    cache.put(("state", 5), decision, "key_5")
+    assert cache.get(("state", 5)) is None and "key_5" not in cache._by_registry_key
+    print("PASS: Cache hits, invalidation and eviction bookkeeping.")
+
+class DroppingLLM(StubLLM):
+    """StubLLM whose batched replies leave out the first customer."""
+    def __init__(self):
+        super().__init__(seed=2)
+        self.prompts = []
+    
+    def _reply(self, messages):
+        self.prompts.append("batch" if '"customer_id"' in messages[-1].content else "single")
+        reply = json.loads(super()._reply(messages).content)
+        if "decisions" in reply:
+            reply["decisions"] = reply["decisions"][1:]
+        return StubResponse(json.dumps(reply))
+
+def test_batch_retries_missing():
+    print("Testing batched prompts with missing entries...")
+    customers = make_customers(2)  # 10 customers
+    memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    dropping = DroppingLLM()
+    src.agents.set_llm(dropping)
+    try:
+        decisions = run_decision_batch([(c, memory) for c in customers], batch_size=4)
+    finally:
+        src.agents.set_llm(mock_llm)
+    
+    assert not [d for d in decisions if "fallback" in d], "Missing entries were not retried"
+    assert dropping.prompts.count("batch") == 3, dropping.prompts      # 4 + 4 + 2
+    assert dropping.prompts.count("single") == 3, dropping.prompts     # One dropped per batch
+    
+    # A customer id never appears twice in one request
+    pairs = [({"id": i % 3}, None) for i in range(6)]
+    groups = _group_by_id(pairs, range(6), 5)
+    assert groups == [[0, 1, 2], [3, 4, 5]], groups
+    print("PASS: Missing batch entries are retried one by one.")
+
+def test_batch_runner():
+    print("Testing the batch runner...")
+    # snapshot / diff / merge: a worker's learnings carried back to the parent
+    parent, worker = StrategyMemory(), StrategyMemory()
+    customer = make_customers(1)[0]
+    parent.update(customer, "SEND_TUTORIAL", "FAILED")
+    worker.registry = parent.snapshot()
+    baseline = worker.snapshot()
+    worker.update(customer, "SEND_TUTORIAL", "SUCCESS")
+    worker.update(customer, "ASK_INTEREST", "FAILED")
+    parent.merge(worker.diff(baseline))
+    assert parent.registry == worker.registry, "Merged delta differs from the worker's registry"
+    
+    stub = StubLLM(seed=3)
+    src.agents.set_llm(stub)
+    try:
+        for workers in (1, 2):
+            out = tempfile.mkdtemp()
+            memory = batch_runner.run(make_customers(2), 3, out, workers=workers, seed=5,
+                                      options={"compact_memory": True})
+            rows = [json.loads(line) for day in (1, 2, 3)
+                    for line in open(os.path.join(out, f"day_{day:03d}.jsonl"))]
+            summaries = [json.loads(line) for line in open(os.path.join(out, "summary.jsonl"))]
+            assert [s["day"] for s in summaries] == [1, 2, 3]
+            assert sum(s["decisions"] for s in summaries) == len(rows)
+            assert summaries[0]["decisions"] == 10 and not any(r["fallback"] for r in rows)
+            
+            # Every non-idle action was learned once, whichever worker ran it
+            learned = sum(v for s in memory.registry.values() for a in s.values() for v in a.values())
+            assert learned == sum(r["action"] != "DO_NOTHING" for r in rows), f"{workers} workers"
+            assert json.load(open(os.path.join(out, "memory.json"))) == memory.registry
+            assert len(json.load(open(os.path.join(out, "customers.json")))) == 10
+    finally:
+        src.agents.set_llm(mock_llm)
+    print("PASS: Batch runner writes days and merges worker learnings.")
+
+def test_compact_memory_merge_keys():
+    print("Testing CompactStrategyMemory keys with underscores...")
+    customer = {"lifecycle_stage": "AT_RISK", "name": "Jo Mary_Ann"}  # Persona "Mary_Ann"
+    parent = CompactStrategyMemory(keep_logs=False, verbose=False)
+    parent.update(customer, "SEND_DISCOUNT", "FAILED")
+    
+    # What run_shard_day does: worker starts from the parent's snapshot, sends back a diff
+    worker = CompactStrategyMemory(keep_logs=False, verbose=False)
+    worker.registry = parent.snapshot()
+    baseline = worker.snapshot()
+    assert worker.get_forbidden_actions(customer) == ["SEND_DISCOUNT"], "Snapshot key not found by customer"
+    worker.update(customer, "SEND_TUTORIAL", "SUCCESS")
+    assert len(worker._key_names) == 1, f"Key split into {worker._key_names}"
+    
+    parent.merge(worker.diff(baseline))
+    assert len(parent._key_names) == 1, f"Key split into {parent._key_names}"
+    assert parent.strategies("AT_RISK_Mary_Ann") == {
+        "SEND_DISCOUNT": {"SUCCESS": 0, "FAILED": 1},
+        "SEND_TUTORIAL": {"SUCCESS": 1, "FAILED": 0},
+    }, parent.registry
+    
+    # The plain dict view still round-trips through the registry setter
+    copy_memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    copy_memory.registry = parent.registry
+    assert copy_memory.registry == parent.registry
+    print("PASS: (stage, persona) pairs survive snapshot / diff / merge.")
+
+def test_durable_memory_snapshot():
+    print("Testing DurableStrategyMemory snapshots...")
+    path = tempfile.mkdtemp()
+    memory = DurableStrategyMemory(path, snapshot_every=5, keep_logs=False, verbose=False)
+    for n, customer in enumerate(make_customers(3)):
+        memory.update(customer, ACTIONS[n % 3], "SUCCESS" if n % 2 else "FAILED")
+    memory.close()
+    
+    assert memory.generation == 3, f"Expected 3 snapshots of 5 updates, got {memory.generation}"
+    expected = ["meta.json"] + [
+        f"{name}.3.{ext}" for name, ext in [("snapshot", "npy"), ("stages", "txt"), ("personas", "txt"),
+                                            ("keys", "txt"), ("actions", "txt"), ("updates", "log")]
+    ]
+    assert sorted(os.listdir(path)) == sorted(expected), "Old generations were not removed"
+    
+    reloaded = DurableStrategyMemory(path, verbose=False)
+    assert reloaded.registry == memory.registry, "Snapshot reload differs"
+    customer = make_customers(1)[0]
+    assert reloaded.get_forbidden_actions(customer) == memory.get_forbidden_actions(customer)
+    reloaded.update(customer, "ASK_INTEREST", "FAILED")  # Arrays loaded from the snapshot stay writable
+    print("PASS: Snapshot generations reload.")
+
+def test_event_history():
+    print("Testing bounded EventHistory...")
+    archive = HistoryArchive(os.path.join(tempfile.mkdtemp(), "archive.tsv"), buffer_size=2)
+    events = [ACTIONS[n % 4] for n in range(10)] + ["Login", "Some New Event"]
+    history = EventHistory(events[:3], capacity=5, archive=archive, owner="T1")
+    mark = history_mark(history)
+    history.extend(events[3:])
+    
+    assert len(history) == 5 and history == events[-5:], list(history)
+    assert history[-3:] == events[-3:] and history[0] == events[-5] and history[-1] == "Some New Event"
+    assert "Login" in history and "Account Created" not in history
+    assert events_since(history, mark) == events[-5:], "events_since is capped at the window"
+    assert [e for _, e in archive.read("T1")] == events[:-5], "Spilled events missing from the archive"
+    
+    copied = pickle.loads(pickle.dumps(history))
+    assert copied == history and copied.capacity == 5
+    customer = bound_history({"id": "T2", "history": list(events), "action_history": []}, window=4)
+    assert customer["history"] == events[-4:] and isinstance(customer["action_history"], EventHistory)
+    print("PASS: Ring buffer reads like a list and spills to the archive.")
+
+def test_benchmark_suite():
+    print("Testing the offline benchmark...")
+    # The stub only ever picks an action the prompt allows
+    customer = make_customers(1)[0]
+    memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    _, allowed, forbidden = plan_decision(customer, memory)
+    prompt = src.agents.build_prompt(customer, memory, forbidden, allowed)
+    for seed in range(20):
+        reply = json.loads(choose_reply(prompt, random.Random(seed)))
+        assert reply["action"] in allowed, reply
+    
+    out = os.path.join(tempfile.mkdtemp(), "bench.json")
+    subprocess.run(
+        [sys.executable, "benchmark.py", "--sizes", "5", "200", "--decision-sample", "50", "--out", out],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    )
+    results = json.load(open(out))["results"]
+    stages = {(r["stage"], r["population"]) for r in results}
+    for stage in ("simulate_time_step", "decision_agent", "decision_agent_batch", "Population.time_step"):
+        assert {(stage, 5), (stage, 200)} <= stages, f"{stage} missing from the benchmark"
+    assert all(r["throughput_per_s"] > 0 for r in results)
+    print("PASS: Benchmark runs offline and records every stage.")
+
+def post_chat(port, content):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/v1/chat/completions",
+        data=json.dumps({"model": "mock-gpt", "messages": [{"role": "user", "content": content}]}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    return urllib.request.urlopen(request, timeout=5)
+
+def test_mock_llm_server():
+    print("Testing the mock LLM server...")
+    server = serve(port=0, seed=4)
+    port = server.server_address[1]
+    try:
+        # The real OpenAI client, pointed at the mock
+        with patch.dict(os.environ, {"LLM_BASE_URL": f"http://127.0.0.1:{port}/v1", "OPENAI_API_KEY": "mock"}):
+            src.agents.set_llm(llm_router.build_client("openai", "mock-gpt", max_retries=0))
+        customers = make_customers(2)
+        memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+        decisions = run_decision_batch([(c, memory) for c in customers], batch_size=3)
+        assert not [d for d in decisions if "fallback" in d], "Mock replies were not usable"
+        assert server.stats["ok"] == server.stats["requests"] == 4, server.stats  # 3 + 3 + 3 + 1
+    finally:
+        src.agents.set_llm(mock_llm)
+        server.shutdown()
+        server.server_close()
+    
+    for options, status in (({"error_rate": 1.0}, 500), ({"rate_limit_rate": 1.0}, 429)):
+        server = serve(port=0, **options)
+        try:
+            post_chat(server.server_address[1], "hi")
+            raise AssertionError(f"Expected HTTP {status}")
+        except urllib.error.HTTPError as e:
+            assert e.code == status, e.code
+            assert status != 429 or e.headers["Retry-After"] == "1"
+        finally:
+            server.shutdown()
+            server.server_close()
+    print("PASS: Mock server answers the OpenAI client and injects faults.")
+
+def test_metrics_export():
+    print("Testing metrics spans and export...")
+    assert metrics.span("decide") is metrics.span("act"), "Disabled spans should be one shared no-op"
+    metrics.enable()
+    metrics.reset()
+    try:
+        with metrics.span("decide"):
+            time.sleep(0.002)
+        stub = StubLLM(seed=5)
+        src.agents.set_llm(stub)
+        decision_agent(make_customers(1)[0], CompactStrategyMemory(keep_logs=False, verbose=False))
+        metrics.record_fallback("exception")
+        text = metrics.export_text()
+        
+        assert "# TYPE stage_seconds histogram" in text
+        assert 'stage_seconds_bucket{stage="decide",le="0.001"} 0' in text
+        assert 'stage_seconds_bucket{stage="decide",le="+Inf"} 1' in text
+        assert 'stage_seconds_count{stage="decide"} 1' in text
+        assert 'llm_calls_total{mode="single"} 1' in text
+        assert 'decision_fallbacks_total{reason="exception"} 1' in text
+        
+        path = os.path.join(tempfile.mkdtemp(), "metrics.prom")
+        metrics.write_file(path)
+        assert open(path).read() == text
+        server = metrics.serve(0)
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5).read()
+        assert body.decode() == text
+    finally:
+        src.agents.set_llm(mock_llm)
+        metrics.enable(False)
+        metrics.reset()
+    
+    metrics.inc("llm_calls_total", mode="single")
+    assert metrics.export_text() == "\n", "Disabled metrics recorded a value"
+    print("PASS: Spans, LLM counters and Prometheus export.")
+
+class PromptSeededLLM(StubLLM):
+    """StubLLM whose choice depends only on the prompt, not on call order."""
+    def _reply(self, messages):
+        prompt = messages[-1].content
+        return StubResponse(choose_reply(prompt, random.Random(prompt)))
+
+def test_customer_stream():
+    print("Testing streaming customer tables...")
+    try:
+        row_to_customer({"id": "X1", "persona": "Sam"})
+        raise AssertionError("A row without a name was accepted")
+    except ValueError:
+        pass
+    
+    # Only the required columns: everything else gets a default and runs
+    out = tempfile.mkdtemp()
+    minimal = os.path.join(out, "minimal.csv")
+    with open(minimal, "w") as f:
+        f.write("id,name\nM1,Minimal Sam\nM2,Minimal Clara\n")
+    customers = [c for chunk in read_chunks(minimal) for c in chunk]
+    assert customers[0]["lifecycle_stage"] == "Onboarding" and customers[0]["history"] == []
+    
+    src.agents.set_llm(PromptSeededLLM())
+    try:
+        memory = batch_runner.run_streaming(minimal, 2, os.path.join(out, "minimal"))
+        assert set(memory.registry) <= {"Onboarding_Sam", "Onboarding_Clara"}, memory.registry
+        
+        # CSV and Parquet round trip, and chunking does not change results
+        for ext in ("csv", "parquet"):
+            table = os.path.join(out, f"customers.{ext}")
+            assert write_customers(table, make_customers(3), chunk_size=4) == 15
+            read_back = [c for chunk in read_chunks(table, chunk_size=4) for c in chunk]
+            assert [len(chunk) for chunk in read_chunks(table, chunk_size=4)] == [4, 4, 4, 3]
+            assert [c["id"] for c in read_back] == [c["id"] for c in make_customers(3)]
+            assert read_back[0]["sensitivity"] == make_customers(1)[0]["sensitivity"]
+            
+            registries = []
+            for chunk_size in (4, 100):
+                run_dir = os.path.join(out, f"{ext}-{chunk_size}")
+                memory = batch_runner.run_streaming(table, 2, run_dir, seed=5, chunk_size=chunk_size)
+                registries.append(memory.registry)
+                state = [c for chunk in read_chunks(os.path.join(run_dir, f"customers.{ext}")) for c in chunk]
+                assert len(state) == 15
+            assert registries[0] == registries[1], f"{ext}: chunk size changed the learnings"
+    finally:
+        src.agents.set_llm(mock_llm)
+    print("PASS: CSV / Parquet tables stream, round trip and need only id and name.")
+
+def test_event_log():
+    print("Testing the Parquet event log...")
+    import pyarrow.dataset as ds
+    
+    root = os.path.join(tempfile.mkdtemp(), "events")
+    customer = make_customers(1)[0]
+    expected = []
+    for day in (1, 2):
+        for part in (0, 1):
+            with EventLog(part_path(root, day, part), batch_size=3) as log:
+                events = ["Login", "Search", "Feature Use", "Event Log Test Event"][: 2 + part + day - 1]
+                log.record(day, customer, events, "SEND_TUTORIAL", 5)
+            expected += [(day, event) for event in events]
+            assert log.rows == len(events)
+    assert os.path.exists(part_path(root, 2, 1)) and not os.path.exists(part_path(root, 2, 1) + ".tmp")
+    
+    table = read_events(root)
+    assert table.column_names == ["day", "customer_id", "event_code", "action", "impact", "engagement_after", "event"]
+    rows = table.to_pylist()
+    assert sorted((r["day"], r["event"]) for r in rows) == sorted(expected)
+    assert {(r["customer_id"], r["action"], r["impact"]) for r in rows} == {(customer["id"], "SEND_TUTORIAL", 5)}
+    
+    later = read_events(root, columns=["day", "event"], filter=ds.field("day") >= 2)
+    assert later.column_names == ["day", "event"]
+    assert sorted(later.to_pylist(), key=lambda r: r["event"]) == sorted(
+        ({"day": d, "event": e} for d, e in expected if d >= 2), key=lambda r: r["event"])
+    assert read_events(root, filter=ds.field("day") > 9).num_rows == 0
+    
+    # batch_runner writes a day partition per day, with parts per shard
+    src.agents.set_llm(StubLLM(seed=2))
+    try:
+        out = tempfile.mkdtemp()
+        event_dir = os.path.join(out, "events")
+        customers = make_customers(2)
+        batch_runner.run(customers, 2, out, workers=2, seed=4, options={"event_dir": event_dir})
+        logged = read_events(event_dir, columns=["customer_id", "event"]).to_pylist()
+        assert logged and {r["customer_id"] for r in logged} <= {c["id"] for c in customers}
+        assert sorted(os.listdir(event_dir)) == ["day=001", "day=002"]
+    finally:
+        src.agents.set_llm(mock_llm)
+    print("PASS: Event parts round trip, filter and decode their event codes.")
+
+def test_incremental_features():
+    print("Testing incremental behavior features...")
+    rng = random.Random(15)
+    names = [e for events in CATEGORIES.values() for e in events] + ["Unrelated Event"]
+    customers = [bound_history(c, window=8) for c in make_customers(3)]
+    full = {c["id"]: list(c["history"]) for c in customers}
+    for customer in customers:
+        customer_features(customer)  # Seeded from the window, then kept current
+    
+    def recount(events, window):
+        recent = events[-window:]
+        return {category: sum(e in members for e in recent) for category, members in CATEGORIES.items()}
+    
+    for step in range(60):
+        for customer in customers:
+            event = rng.choice(names)
+            customer["history"].append(event)
+            full[customer["id"]].append(event)
+        if step % 20 != 19:
+            continue
+        
+        scored = score_population(customers)
+        analyses = behavior_analysis_batch(customers)
+        for i, customer in enumerate(customers):
+            tracker = customer_features(customer)
+            events = full[customer["id"]]
+            for k, window in enumerate(tracker.windows):
+                expected = recount(events, window)
+                assert {c: tracker.count(c, window) for c in CATEGORIES} == expected, (customer["id"], window)
+                assert scored["counts"][i, k].tolist() == [expected[c] for c in CATEGORIES]
+                assert abs(scored["rates"][i, k, 0] - expected["activity"] / min(window, len(events))) < 1e-12
+            
+            # The original rule: pricing page in the last 3 events, else inactivity
+            last3 = events[-3:]
+            status = ("Upsell Opportunity" if "Visited Pricing Page" in last3
+                      else "At Risk" if "Inactive" in last3 else "Healthy")
+            assert behavior_analysis_agent(customer)["status"] == status
+            assert analyses[i]["status"] == status and scored["status"][i] == status
+    
+    # Plain list histories get a fresh tracker over their latest events
+    plain = make_customers(1)[0]
+    plain["history"] = full[customers[0]["id"]]
+    assert customer_features(plain).counts == customer_features(customers[0]).counts
+    assert FeatureTracker().snapshot()["activity_rate_30"] == 0.0
+    print("PASS: Incremental and vectorized features match a full recount.")
+
+def test_monte_carlo():
+    print("Testing Monte Carlo policy evaluation...")
+    values = [random.Random(17).random() for _ in range(5)] + [0.25, 0.75, 0.5]
+    stats = monte_carlo.RunningStats()
+    for v in values:
+        stats.add(v)
+    mean = sum(values) / len(values)
+    std = (sum((v - mean) ** 2 for v in values) / (len(values) - 1)) ** 0.5
+    assert abs(stats.mean - mean) < 1e-12 and abs(stats.std - std) < 1e-12
+    assert abs(stats.half_width() - monte_carlo.T95[len(values) - 2] * std / len(values) ** 0.5) < 1e-12
+    
+    try:
+        monte_carlo.resolve_policy("no-such-policy")
+        raise AssertionError("An unknown policy name was accepted")
+    except ValueError:
+        pass
+    assert monte_carlo.resolve_policy("src.monte_carlo:random_policy") is monte_carlo.random_policy
+    
+    # Replica seeds, not the worker count, decide the results
+    customers = make_customers(2)
+    reports = [monte_carlo.evaluate_policy(customers, "random", days=4, max_replicas=6, min_replicas=6,
+                                           workers=workers, seed=3) for workers in (1, 2)]
+    assert reports[0] == reports[1], "Worker count changed the report"
+    assert reports[0]["replicas"] == 6 and not reports[0]["stopped_early"]
+    assert len(reports[0]["engagement_trajectory"]["mean"]) == 4
+    assert set(reports[0]["segments"]) == {c["segment"] for c in customers}
+    churn = reports[0]["metrics"]["churn_rate"]
+    assert churn["ci_low"] <= churn["mean"] <= churn["ci_high"]
+    a = monte_carlo.run_replica(customers, 4, "random", 3, 0)
+    b = monte_carlo.run_replica(customers, 4, "random", 3, 1)
+    assert a == monte_carlo.run_replica(customers, 4, "random", 3, 0) and a != b
+    
+    # A loose tolerance stops at min_replicas
+    report = monte_carlo.evaluate_policy(customers, "rules", days=3, max_replicas=50, min_replicas=3,
+                                         tolerance=1e9, seed=3)
+    assert report["replicas"] == 3 and report["stopped_early"]
+    print("PASS: Replicas are reproducible, aggregated and stop early once converged.")
+
+def test_day_worker_cancel():
+    print("Testing DayWorker progress and cancellation...")
+    config = {"concurrency": 4, "timeout": 5.0, "batch_size": 1, "seed": 18}
+    src.agents.set_llm(PromptSeededLLM(latency=0.02))
+    try:
+        customers = make_customers(2)
+        memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+        worker = DayWorker(customers, memory, 1, config, chunk_size=3).start()
+        worker.join(30)
+        messages = worker.drain()
+        assert messages[0] == ("progress", 0, 10) and messages[-1] == ("done", 10)
+        progress = [m[1] for m in messages if m[0] == "progress"]
+        assert progress == sorted(progress) and progress[-1] == 10
+        assert sum(m[0] == "story" for m in messages) == 10
+        
+        # Inline simulate_day gives the same day as the worker thread
+        inline = make_customers(2)
+        stories = list(simulate_day(inline, CompactStrategyMemory(keep_logs=False, verbose=False), 1,
+                                    config, chunk_size=3))
+        assert [c["history"] for c in inline] == [c["history"] for c in customers]
+        assert len(stories) == 10
+        
+        # Cancel after the first story: the current chunk finishes, later chunks never start
+        customers = make_customers(2)
+        before = copy.deepcopy(customers)
+        worker = DayWorker(customers, CompactStrategyMemory(keep_logs=False, verbose=False), 1, config,
+                           chunk_size=3).start()
+        while worker.queue.get(timeout=10)[0] != "story":
+            pass
+        worker.cancel()
+        worker.join(30)
+        assert not worker.is_alive()
+        kind, done = worker.drain()[-1]
+        assert kind == "cancelled" and 1 <= done < 10, (kind, done)
+        assert done % 3 == 0, "A chunk was left half done"
+        assert customers[done:] == before[done:], "Customers after the cancelled chunk were touched"
+    finally:
+        src.agents.set_llm(mock_llm)
+    print("PASS: DayWorker streams progress and cancels between chunks.")
+
+def test_story_store():
+    print("Testing StoryStore pagination and SidebarSummary...")
+    customer = make_customers(1)[0]
+    stories = [{"customer": dict(customer, engagement_score=n), "thought": f"t{n}", "action": "DO_NOTHING",
+                "impact": n, "behavior": "idle"} for n in range(12)]
+    
+    path = os.path.join(tempfile.mkdtemp(), "stories.jsonl")
+    spilled, bounded = StoryStore(capacity=5, spill_path=path), StoryStore(capacity=5)
+    spilled.extend(stories)
+    bounded.extend(stories)
+    assert len(spilled) == len(bounded) == 12
+    assert set(spilled.page(0, 4)[0]["customer"]) == {"id", "name", "persona", "engagement_score", "status"}
+    assert "behavior" not in spilled.page(0, 4)[0], "Stories keep only the card fields"
+    
+    impacts = lambda page: [s["impact"] for s in page]
+    assert spilled.pages(4) == 3 and bounded.pages(4) == 2
+    assert impacts(spilled.page(0, 4)) == impacts(bounded.page(0, 4)) == [8, 9, 10, 11]
+    assert impacts(spilled.page(1, 4)) == [4, 5, 6, 7]  # Straddles the window and the spill file
+    assert impacts(spilled.page(2, 4)) == [0, 1, 2, 3]
+    assert impacts(bounded.page(1, 4)) == [7], "Evicted stories without a spill file"
+    assert spilled.page(3, 4) == [] and impacts(spilled.latest(2)) == [10, 11]
+    spilled.close()
+    
+    # Registry lines are rebuilt only for keys memory updates touched
+    memory = StrategyMemory()
+    summary = SidebarSummary(memory)
+    memory.add_listener(summary)
+    formatted = []
+    fmt = lambda action, stats: formatted.append(action) or f"{action}: {stats['SUCCESS']}/{stats['FAILED']}"
+    assert summary.registry_lines(fmt) == {} and summary.entries == 0
+    
+    clara = next(c for c in make_customers(1) if c["name"].endswith("Clara"))
+    memory.update(customer, "SEND_TUTORIAL", "FAILED")
+    memory.update(clara, "ASK_INTEREST", "SUCCESS")
+    memory.update(clara, "SEND_DISCOUNT", "SUCCESS")
+    lines = summary.registry_lines(fmt)
+    assert summary.entries == 3 and len(formatted) == 3
+    assert set(lines) == set(memory.registry)
+    
+    formatted.clear()
+    memory.update(clara, "ASK_INTEREST", "FAILED")
+    lines = summary.registry_lines(fmt)
+    assert sorted(formatted) == ["ASK_INTEREST", "SEND_DISCOUNT"], "An untouched key was rebuilt"
+    assert summary.entries == 3 and "ASK_INTEREST: 1/1" in lines[memory._get_key(clara)][1]
+    assert summary.personas == {k.split("_")[-1] for k in memory.registry}
+    print("PASS: Story pages read back from memory and disk; sidebar lines refresh per key.")
+
+def test_prompt_budget():
+    print("Testing bounded decision prompts...")
+    assert action_summary([]) == "none yet"
+    actions = ["ASK_INTEREST", "DO_NOTHING", "DO_NOTHING"]
+    assert action_summary(actions, 2) == ("3 actions; ASK_INTEREST x1, DO_NOTHING x2; "
+                                          "streak: DO_NOTHING x2; recent: DO_NOTHING -> DO_NOTHING")
+    window = EventHistory(["SEND_TUTORIAL"] * 40 + actions, capacity=4)
+    assert action_summary(window, 0) == ("43 actions; last 4: ASK_INTEREST x1, DO_NOTHING x2, SEND_TUTORIAL x1; "
+                                         "streak: DO_NOTHING x2")
+    
+    # fit_context picks the largest K within budget and counts compactions
+    render = lambda last_k: "x" * (40 * last_k + 20)
+    metrics.enable()
+    metrics.reset()
+    try:
+        assert fit_context(render, budget=0) == render(LAST_ACTIONS[0]), "0 means no limit"
+        assert fit_context(render, budget=estimate_tokens(render(4))) == render(4)
+        assert fit_context(render, budget=1) == render(0)
+        text = metrics.export_text()
+        assert "prompt_compactions_total 1" in text and "prompt_over_budget_total 1" in text
+    finally:
+        metrics.enable(False)
+        metrics.reset()
+    
+    # Prompt size no longer grows with the action history
+    memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    sizes = []
+    for days in (5, 50, 5000):
+        customer = make_customers(1)[0]
+        customer["action_history"] = [random.Random(days).choice(ACTIONS) for _ in range(days)]
+        prompt = build_prompt(customer, memory, [], ["SEND_TUTORIAL", "DO_NOTHING"])
+        assert prompt.startswith(SINGLE_PREFIX), "The static prefix must come first"
+        sizes.append(estimate_tokens(prompt) - estimate_tokens(SINGLE_PREFIX))
+    assert max(sizes) - min(sizes) < 20, sizes
+    print("PASS: Action histories are summarized and prompts fit the token budget.")
+
+class BlockingLLM:
+    """A sync provider that hangs until released."""
+    def __init__(self):
+        self.release = threading.Event()
+    
+    def invoke(self, messages, **kwargs):
+        self.release.wait(10)
+        return StubResponse('{"action": "DO_NOTHING"}')
+
+def test_sync_pool_saturation():
+    print("Testing abandoned sync calls...")
+    from src.resilience import CircuitOpen, DeadlineExceeded
+    
+    client = BlockingLLM()
+    llm = ResilientLLM(client, deadline=0.05, max_retries=0, max_workers=2,
+                       breaker=CircuitBreaker(failure_threshold=100, name="blocked"))
+    for _ in range(2):
+        try:
+            llm.invoke([])
+            raise AssertionError("A hung call returned")
+        except DeadlineExceeded:
+            pass
+    
+    # Both threads hold abandoned calls: fail fast instead of queueing
+    started = time.monotonic()
+    try:
+        llm.invoke([])
+        raise AssertionError("A call was queued behind hung workers")
+    except CircuitOpen:
+        pass
+    assert time.monotonic() - started < 0.04, "Saturated pool did not fail fast"
+    
+    client.release.set()
+    deadline = time.monotonic() + 5
+    while llm._in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert llm.invoke([]).content == '{"action": "DO_NOTHING"}', "Freed threads were not reused"
+    print("PASS: Abandoned sync calls cannot exhaust the worker pool.")
+
+def test_router_waits_and_options():
+    print("Testing LLMRouter slot waits and provider options...")
+    # Google clients never see the OpenAI-only response_format
+    google = llm_router.build_client("google", "gemini-2.0-flash", max_retries=0)
+    google.invoke(["hi"], response_format={"type": "json_object"}, stop=["\n"])
+    assert google.client.invoke.call_args.kwargs == {"stop": ["\n"]}, google.client.invoke.call_args
+    google.client.ainvoke = MagicMock(side_effect=lambda messages, **kwargs: asyncio.sleep(0, kwargs))
+    assert asyncio.run(google.ainvoke(["hi"], response_format={"type": "json_object"})) == {}
+    
+    stub = StubLLM(latency=0.05)
+    router = llm_router.LLMRouter([llm_router.Backend("one", stub, max_concurrency=1)])
+    attempts = []
+    try_acquire = router._try_acquire
+    router._try_acquire = lambda exclude: attempts.append(1) or try_acquire(exclude)
+    
+    async def calls():
+        return await asyncio.gather(*[router.ainvoke([StubResponse("hi")]) for _ in range(4)])
+    
+    assert len(asyncio.run(calls())) == 4 and stub.calls == 4
+    assert len(attempts) <= 10, f"{len(attempts)} slot checks: waiters are polling"
+    
+    # A slot freed by a sync call on another thread wakes an async waiter
+    attempts.clear()
+    holder = threading.Thread(target=router.invoke, args=([StubResponse("hi")],))
+    holder.start()
+    while not router.backends[0].in_flight:
+        time.sleep(0.001)
+    asyncio.run(router.ainvoke([StubResponse("hi")]))
+    holder.join()
+    assert len(attempts) <= 3 and router.backends[0].in_flight == 0, len(attempts)
+    print("PASS: Router waiters wake on release; google gets no response_format.")
+
+def test_decision_scheduler():
+    print("Testing the LLM budget scheduler...")
+    customers = make_customers(3)
+    by_id = {c["id"]: c for c in customers}
+    scheduler = DecisionScheduler(customers)
+    assert scheduler.budget() is None and scheduler.select(None) == set(by_id)
+    
+    def top(k):
+        return sorted((urgency(c) for c in by_id.values() if c["status"] != "Churned"), reverse=True)[:k]
+    assert sorted((urgency(by_id[i]) for i in scheduler.select(4)), reverse=True) == top(4)
+    assert scheduler.select(4) == scheduler.select(4), "select() must not consume the heap"
+    
+    # Re-scored customers move; stale heap entries are skipped and compacted away
+    calm = min(customers, key=urgency)
+    calm.update(engagement_score=0, lifecycle_stage="Churn Risk", time_since_last_event=9)
+    scheduler.update(calm)
+    assert calm["id"] in scheduler.select(1)
+    for _ in range(200):
+        scheduler.update(calm)
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 65 and scheduler.select(1) == {calm["id"]}
+    
+    calm["status"] = "Churned"
+    scheduler.update(calm)
+    assert len(scheduler) == 14 and calm["id"] not in scheduler.select(15)
+    assert sorted((urgency(by_id[i]) for i in scheduler.select(4)), reverse=True) == top(4)
+    
+    # The tighter of the call and token budgets wins
+    assert DecisionScheduler(call_budget=5).budget() == 5
+    assert DecisionScheduler(call_budget=5, token_budget=3 * tokens_per_decision()).budget() == 3
+    
+    # A budgeted day makes at most budget() LLM calls (hard rules may decide some of the top K)
+    stub = StubLLM(seed=24)
+    src.agents.set_llm(stub)
+    try:
+        customers = make_customers(3)
+        scheduler = DecisionScheduler(customers, call_budget=3)
+        config = {"concurrency": 4, "timeout": 5.0, "batch_size": 1, "seed": 24}
+        stories = list(simulate_day(customers, CompactStrategyMemory(keep_logs=False, verbose=False), 1,
+                                    config, scheduler=scheduler))
+        assert len(stories) == 15 and 0 < stub.calls <= 3, stub.calls
+    finally:
+        src.agents.set_llm(mock_llm)
+    print("PASS: Scheduler picks the most urgent customers within the daily budget.")
+
+def test_day_engine_quiet_path():
+    print("Testing DayEngine bulk quiescent days...")
+    bulk, single = make_customers(6), make_customers(6)
+    bulk_memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    single_memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+    engine = DayEngine(bulk)
+    for day in range(1, 9):
+        streams = DayStreams(25, day)
+        quiet = list(engine.active.values())
+        before = {c["id"]: state_key(c) for c in quiet}
+        engine.advance_quiet(quiet, bulk_memory, streams, day=day)
+        
+        # Per customer: time step, rules decisions on the morning's memory, then act + learn
+        active = [c for c in single if c["status"] != "Churned"]
+        for customer in active:
+            simulate_time_step(customer, streams.for_customer(customer["id"]))
+        actions = [rules_decision(customer, single_memory)["action"] for customer in active]
+        for customer, action in zip(active, actions):
+            evaluate_outcome(customer, action, single_memory)
+        
+        assert bulk == single, f"Day {day}: bulk step differs from the per-customer path"
+        assert bulk_memory.registry == single_memory.registry, f"Day {day}: learned memory differs"
+        changed = {c["id"] for c in quiet if c["status"] != "Churned" and state_key(c) != before[c["id"]]}
+        assert changed <= engine.dirty, f"Day {day}: a customer that crossed a threshold is not dirty"
+        assert set(engine.churned) == {c["id"] for c in bulk if c["status"] == "Churned"}
+        assert not set(engine.active) & set(engine.churned)
+    
+    # Without a budget, clean customers still take the bulk path; dirty ones get the LLM
+    stub = StubLLM(seed=25)
+    src.agents.set_llm(stub)
+    try:
+        customers = make_customers(4)
+        engine = DayEngine(customers)
+        memory = CompactStrategyMemory(keep_logs=False, verbose=False)
+        config = {"concurrency": 4, "timeout": 5.0, "batch_size": 1, "seed": 25}
+        quiet_days = 0
+        for day in range(1, 5):
+            active, dirty = len(engine.active), len(engine.dirty)
+            stories = list(simulate_day(customers, memory, day, config, engine=engine))
+            assert len(stories) == dirty and len(stories) + engine.last_quiet == active, \
+                f"Day {day}: {len(stories)} stories, {engine.last_quiet} quiet, {dirty} dirty of {active}"
+            quiet_days += engine.last_quiet > 0
+        assert quiet_days, "No day advanced quiescent customers in bulk"
+    finally:
+        src.agents.set_llm(mock_llm)
+    print("PASS: Bulk quiescent days match the per-customer path; no budget needed.")
+
 if __name__ == "__main__":
     try:
         test_simulation_exports()
         test_decision_agent()
+        test_import_budget()
+        test_compact_memory_64_actions()
+        test_durable_memory_replay()
+        test_day_streams_workers()
+        test_population_matches_dicts()
+        test_batched_decisions()
+        test_breaker_transitions()
+        test_hung_provider()
+        test_cancelled_probe()
+        test_decision_batch_concurrency()
+        test_decision_cache()
+        test_batch_retries_missing()
+        test_batch_runner()
+        test_compact_memory_merge_keys()
+        test_durable_memory_snapshot()
+        test_event_history()
+        test_benchmark_suite()
+        test_mock_llm_server()
+        test_metrics_export()
+        test_customer_stream()
+        test_event_log()
+        test_incremental_features()
+        test_monte_carlo()
+        test_day_worker_cancel()
+        test_story_store()
+        test_prompt_budget()
+        test_sync_pool_saturation()
+        test_router_waits_and_options()
+        test_decision_scheduler()
+        test_day_engine_quiet_path()
         print("ALL TESTS PASSED")
     except Exception as e:
         print(f"TEST FAILED: {e}")